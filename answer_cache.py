@@ -0,0 +1,163 @@
+"""
+answer_cache.py - Cache Jawaban LLM untuk Pertanyaan yang Mirip
+===============================================================
+Pertanyaan yang sama sering datang dengan kata-kata berbeda ("apa isi pdf
+tersebut", "isi pdf itu apa ya"). Jika konteks yang ditemukan sama, jawaban
+LLM sebelumnya dipakai lagi tanpa generate ulang.
+
+- Key: model + sidik jari (sha256) teks konteks yang dikirim ke LLM, lalu
+  di antara entri dengan key itu dicari pertanyaan dengan kemiripan
+  embedding (cosine) >= ANSWER_CACHE_SIMILARITY
+- Disimpan di SQLite (ANSWER_CACHE_PATH), jadi bertahan setelah restart
+  dan dipakai bersama oleh CLI & web UI
+- Entri lebih tua dari ANSWER_CACHE_TTL_HOURS tidak dipakai; jika lebih
+  dari ANSWER_CACHE_MAX_ENTRIES, entri yang paling lama tidak dipakai dibuang
+- Chunk yang berubah: teks konteks ikut berubah sehingga sidik jari tidak
+  cocok lagi. Selain itu entri yang memakai chunk yang dihapus/di-update
+  langsung dibuang (lihat vector_search.record_deleted / record_updated),
+  dan reset/import database mengosongkan cache
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from config import (
+    ANSWER_CACHE_ENABLED, ANSWER_CACHE_PATH, ANSWER_CACHE_SIMILARITY,
+    ANSWER_CACHE_TTL_HOURS, ANSWER_CACHE_MAX_ENTRIES
+)
+
+_lock = threading.Lock()
+_local = threading.local()
+_stats = {"hits": 0, "misses": 0}
+
+
+def _connect():
+    """Koneksi SQLite per thread (dibuka sekali, dipakai ulang)."""
+    db = getattr(_local, "db", None)
+    if db is None:
+        db = sqlite3.connect(str(ANSWER_CACHE_PATH), timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA foreign_keys=ON")
+        db.execute("CREATE TABLE IF NOT EXISTS answers ("
+                   "id INTEGER PRIMARY KEY, fingerprint TEXT NOT NULL, model TEXT NOT NULL, "
+                   "question TEXT, vector BLOB NOT NULL, answer TEXT NOT NULL, "
+                   "created REAL NOT NULL, last_used REAL NOT NULL, hits INTEGER DEFAULT 0)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_answers_key ON answers(fingerprint, model)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_answers_used ON answers(last_used)")
+        # Chunk yang dipakai sebagai konteks tiap jawaban (untuk invalidasi)
+        db.execute("CREATE TABLE IF NOT EXISTS answer_chunks ("
+                   "chunk_id TEXT NOT NULL, "
+                   "answer_id INTEGER NOT NULL REFERENCES answers(id) ON DELETE CASCADE, "
+                   "PRIMARY KEY (chunk_id, answer_id)) WITHOUT ROWID")
+        db.commit()
+        _local.db = db
+    return db
+
+
+def fingerprint(context: str) -> str:
+    """Sidik jari teks konteks (persis seperti yang dikirim ke LLM)."""
+    return hashlib.sha256((context or "").encode("utf-8")).hexdigest()
+
+
+def _unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / (np.linalg.norm(vector) + 1e-12)
+
+
+def _cacheable(answer: str) -> bool:
+    text = (answer or "").strip()
+    return bool(text) and not text.startswith(("[ERROR]", "⏳", "[No response]"))
+
+
+def lookup(question_vector, context: str, model: str) -> str:
+    """Jawaban tersimpan untuk pertanyaan yang mirip dengan konteks sama, atau None."""
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    query = _unit(question_vector)
+    oldest = time.time() - ANSWER_CACHE_TTL_HOURS * 3600
+    with _lock:
+        db = _connect()
+        rows = db.execute(
+            "SELECT id, vector, answer FROM answers "
+            "WHERE fingerprint = ? AND model = ? AND created >= ?",
+            (fingerprint(context), model, oldest)
+        ).fetchall()
+        best_id, best_answer, best_score = None, None, ANSWER_CACHE_SIMILARITY
+        if rows:
+            matrix = np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob, _ in rows])
+            scores = matrix @ query
+            i = int(np.argmax(scores))
+            if scores[i] >= best_score:
+                best_id, best_answer, best_score = rows[i][0], rows[i][2], float(scores[i])
+        if best_id is None:
+            _stats["misses"] += 1
+            return None
+        _stats["hits"] += 1
+        with db:
+            db.execute("UPDATE answers SET last_used = ?, hits = hits + 1 WHERE id = ?",
+                       (time.time(), best_id))
+    print(f">>> [ANSWER CACHE] Hit (kemiripan {best_score:.3f}), LLM dilewati")
+    return best_answer
+
+
+def store(question: str, question_vector, context: str, model: str, answer: str,
+          chunk_ids: list = None):
+    """Simpan jawaban (jawaban error / kosong / antrian penuh tidak disimpan)."""
+    if not ANSWER_CACHE_ENABLED or not _cacheable(answer):
+        return
+    now = time.time()
+    with _lock, _connect() as db:
+        cursor = db.execute(
+            "INSERT INTO answers (fingerprint, model, question, vector, answer, created, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (fingerprint(context), model, question, _unit(question_vector).tobytes(),
+             answer, now, now)
+        )
+        if chunk_ids:
+            db.executemany("INSERT OR IGNORE INTO answer_chunks VALUES (?, ?)",
+                           [(chunk_id, cursor.lastrowid) for chunk_id in set(chunk_ids)])
+        db.execute("DELETE FROM answers WHERE created < ?",
+                   (now - ANSWER_CACHE_TTL_HOURS * 3600,))
+        db.execute("DELETE FROM answers WHERE id IN (SELECT id FROM answers "
+                   "ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (ANSWER_CACHE_MAX_ENTRIES,))
+
+
+def invalidate_chunks(chunk_ids: list) -> int:
+    """Buang jawaban yang konteksnya memakai chunk ini. Returns jumlah entri dibuang."""
+    if not chunk_ids:
+        return 0
+    removed = 0
+    ids = list(chunk_ids)
+    with _lock, _connect() as db:
+        for i in range(0, len(ids), 500):
+            batch = ids[i:i + 500]
+            marks = ",".join("?" * len(batch))
+            removed += db.execute(
+                f"DELETE FROM answers WHERE id IN "
+                f"(SELECT answer_id FROM answer_chunks WHERE chunk_id IN ({marks}))", batch
+            ).rowcount
+    if removed:
+        print(f">>> [ANSWER CACHE] {removed} jawaban dibuang (chunk berubah)")
+    return removed
+
+
+def clear():
+    with _lock, _connect() as db:
+        db.execute("DELETE FROM answers")
+
+
+def answer_cache_stats() -> dict:
+    """Statistik cache jawaban (hit/miss proses ini, entri di disk)."""
+    with _lock:
+        total = _stats["hits"] + _stats["misses"]
+        entries = _connect().execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        return {
+            "hits": _stats["hits"],
+            "misses": _stats["misses"],
+            "hit_rate": _stats["hits"] / total if total else 0.0,
+            "entries": entries,
+            "max_entries": ANSWER_CACHE_MAX_ENTRIES,
+        }
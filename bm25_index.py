@@ -0,0 +1,207 @@
+"""
+bm25_index.py - Index Leksikal BM25 (Inverted Index di SQLite)
+==============================================================
+Pelengkap pencarian semantik: nama model, versi, ID dan istilah persis
+(mis. "llama3.1", "gpt-4o") sering meleset di embedding tapi cocok di BM25.
+
+- Disimpan di BM25_INDEX_PATH, di-update inkremental setiap dokumen
+  ditambah/dihapus (lihat vector_search.record_added / record_deleted)
+- Jika jumlah dokumen tidak sama dengan collection (mis. database lama
+  atau hasil import), index dibangun ulang otomatis dari ChromaDB
+- Query hanya membaca posting list term yang ada di pertanyaan; term yang
+  muncul di lebih dari BM25_MAX_DF_RATIO dokumen (mirip stopword) dilewati
+"""
+import json
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+from config import BM25_INDEX_PATH, BM25_K1, BM25_B, BM25_MAX_DF_RATIO
+from vector_search import matches_where, collection_version
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[._:/-][a-z0-9]+)*")
+_PART = re.compile(r"[a-z0-9]+")
+_PAGE_SIZE = 5000
+
+_lock = threading.Lock()
+_local = threading.local()
+_synced_version = None
+
+
+def tokenize(text: str) -> list:
+    """Token lowercase; identifier majemuk ("llama3.1:8b") juga dipecah per bagian."""
+    tokens = []
+    for match in _TOKEN.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        parts = _PART.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+def _connect():
+    """Koneksi SQLite per thread (dibuka sekali, dipakai ulang)."""
+    db = getattr(_local, "db", None)
+    if db is None:
+        db = sqlite3.connect(str(BM25_INDEX_PATH), timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("CREATE TABLE IF NOT EXISTS docs ("
+                   "id TEXT PRIMARY KEY, length INTEGER NOT NULL, metadata TEXT)")
+        db.execute("CREATE TABLE IF NOT EXISTS postings ("
+                   "term TEXT NOT NULL, doc_id TEXT NOT NULL, tf INTEGER NOT NULL, "
+                   "PRIMARY KEY (term, doc_id)) WITHOUT ROWID")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings(doc_id)")
+        # Jumlah dokumen & total panjang, di-update bersama docs agar query tidak scan
+        db.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER)")
+        db.execute("INSERT OR IGNORE INTO stats VALUES ('n_docs', 0), ('total_len', 0)")
+        db.commit()
+        _local.db = db
+    return db
+
+
+def _adjust_stats(db, n_docs: int, total_len: int):
+    db.execute("UPDATE stats SET value = value + ? WHERE name = 'n_docs'", (n_docs,))
+    db.execute("UPDATE stats SET value = value + ? WHERE name = 'total_len'", (total_len,))
+
+
+def _delete(db, ids: list):
+    for i in range(0, len(ids), 500):
+        batch = ids[i:i + 500]
+        marks = ",".join("?" * len(batch))
+        n, total = db.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs WHERE id IN ({marks})", batch
+        ).fetchone()
+        db.execute(f"DELETE FROM postings WHERE doc_id IN ({marks})", batch)
+        db.execute(f"DELETE FROM docs WHERE id IN ({marks})", batch)
+        _adjust_stats(db, -n, -total)
+
+
+def add_documents(ids: list, documents: list, metadatas: list = None):
+    """Index dokumen baru (ID yang sudah ada ditimpa)."""
+    if not ids:
+        return
+    metadatas = metadatas or [None] * len(ids)
+    with _lock, _connect() as db:
+        _delete(db, list(ids))
+        doc_rows, posting_rows = [], []
+        for doc_id, doc, meta in zip(ids, documents, metadatas):
+            counts = Counter(tokenize(doc or ""))
+            doc_rows.append((doc_id, sum(counts.values()), json.dumps(meta or {})))
+            posting_rows += [(term, doc_id, tf) for term, tf in counts.items()]
+        db.executemany("INSERT INTO docs VALUES (?, ?, ?)", doc_rows)
+        db.executemany("INSERT INTO postings VALUES (?, ?, ?)", posting_rows)
+        _adjust_stats(db, len(doc_rows), sum(row[1] for row in doc_rows))
+
+
+def remove_documents(ids: list):
+    if not ids:
+        return
+    with _lock, _connect() as db:
+        _delete(db, list(ids))
+
+
+def update_metadatas(ids: list, metadatas: list):
+    if not ids:
+        return
+    with _lock, _connect() as db:
+        db.executemany("UPDATE docs SET metadata = ? WHERE id = ?",
+                       [(json.dumps(m or {}), i) for i, m in zip(ids, metadatas)])
+
+
+def clear():
+    global _synced_version
+    with _lock, _connect() as db:
+        db.execute("DELETE FROM postings")
+        db.execute("DELETE FROM docs")
+        db.execute("UPDATE stats SET value = 0")
+        _synced_version = None
+
+
+def _stats(db) -> tuple:
+    values = dict(db.execute("SELECT name, value FROM stats"))
+    return values.get("n_docs", 0), values.get("total_len", 0)
+
+
+def document_count() -> int:
+    return _stats(_connect())[0]
+
+
+def rebuild(collection):
+    """Bangun ulang seluruh index dari isi collection."""
+    clear()
+    count = collection.count()
+    for offset in range(0, count, _PAGE_SIZE):
+        page = collection.get(include=["documents", "metadatas"],
+                              limit=_PAGE_SIZE, offset=offset)
+        add_documents(page["ids"], page["documents"], page["metadatas"])
+    print(f">>> [BM25] Index dibangun ulang: {count} dokumen")
+
+
+def ensure_synced(collection):
+    """Cek (sekali per versi collection) apakah index masih lengkap."""
+    global _synced_version
+    version = collection_version()
+    if _synced_version == version:
+        return
+    if document_count() != collection.count():
+        rebuild(collection)
+    _synced_version = version
+
+
+def search(query: str, n_results: int, where: dict = None) -> list:
+    """Cari dokumen dengan skor BM25. Returns list (id, skor) terurut."""
+    terms = set(tokenize(query))
+    if not terms:
+        return []
+    db = _connect()
+    n_docs, total_len = _stats(db)
+    if not n_docs:
+        return []
+    avg_len = total_len / n_docs or 1.0
+
+    dfs = {}
+    for term in terms:
+        df = db.execute("SELECT COUNT(*) FROM postings WHERE term = ?", (term,)).fetchone()[0]
+        if df:
+            dfs[term] = df
+    if not dfs:
+        return []
+    # Term yang terlalu umum tidak membedakan dokumen; jika semua term umum,
+    # serahkan ke pencarian vektor saja
+    specific = {t: df for t, df in dfs.items() if df <= n_docs * BM25_MAX_DF_RATIO}
+    if not specific and n_docs >= 20:
+        return []
+    specific = specific or dfs
+
+    scores = {}
+    for term, df in specific.items():
+        idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+        rows = db.execute(
+            "SELECT p.doc_id, p.tf, d.length FROM postings p "
+            "JOIN docs d ON d.id = p.doc_id WHERE p.term = ?", (term,)
+        )
+        for doc_id, tf, length in rows:
+            norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_len)
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    if not where:
+        return ranked[:n_results]
+
+    # Filter metadata bertahap dari peringkat teratas sampai cukup
+    results = []
+    for i in range(0, len(ranked), 200):
+        batch = ranked[i:i + 200]
+        marks = ",".join("?" * len(batch))
+        metas = dict(db.execute(f"SELECT id, metadata FROM docs WHERE id IN ({marks})",
+                                [doc_id for doc_id, _ in batch]))
+        for doc_id, score in batch:
+            if matches_where(json.loads(metas.get(doc_id) or "{}"), where):
+                results.append((doc_id, score))
+                if len(results) >= n_results:
+                    return results
+    return results
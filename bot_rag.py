@@ -1,25 +1,22 @@
 import chromadb
-from chromadb.utils import embedding_functions
 from pathlib import Path
-import requests
 from config import (
-    OLLAMA_API_URL, OLLAMA_MODEL, CHROMA_DB_PATH, EMBEDDING_MODEL, RAG_TOP_K
+    OLLAMA_API_URL, CHROMA_DB_PATH, RAG_TOP_K
 )
+from embeddings import get_embedding_function
+from vector_search import query_collection, record_added
+from sharded_collection import open_collection
+from llm_client import generate as llm_generate
 
 print(f"\n[DEBUG] Ollama URL: {OLLAMA_API_URL}")
 print(f"[DEBUG] ChromaDB Path: {CHROMA_DB_PATH.absolute()}")
 
 #CHROMADB SETUP
 print("[INFO] Loading embedding model...")
-embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-    model_name=EMBEDDING_MODEL
-)
+embedding_fn = get_embedding_function()
 
 chroma_client = chromadb.PersistentClient(path=str(CHROMA_DB_PATH))
-collection = chroma_client.get_or_create_collection(
-    name="agent_memory",
-    embedding_function=embedding_fn
-)
+collection = open_collection(chroma_client, embedding_fn)
 
 print(f"[INFO] Database berisi {collection.count()} dokumen.\n")
 
@@ -31,11 +28,13 @@ def simpan(teks: str) -> str:
         return "[ERROR] Teks kosong!"
     
     doc_id = f"doc_{collection.count() + 1}"
+    metadata = {"source": "user"}
     collection.add(
         documents=[teks],
         ids=[doc_id],
-        metadatas=[{"source": "user"}]
+        metadatas=[metadata]
     )
+    record_added([doc_id], [teks], [metadata])
     print(f">>> [SAVED] ID: {doc_id}")
     return f"Berhasil disimpan! (ID: {doc_id}, Total: {collection.count()} dokumen)"
 
@@ -44,8 +43,8 @@ def cari(query: str, top_k: int = 3) -> str:
     if collection.count() == 0:
         return ""
     
-    results = collection.query(
-        query_texts=[query],
+    results = query_collection(
+        collection, embedding_fn, query,
         n_results=min(top_k, collection.count())
     )
     
@@ -77,16 +76,7 @@ def tanya_llm(prompt: str, context: str = "") -> str:
         full_prompt = f"{context}\n\nBerdasarkan informasi di atas, jawab pertanyaan ini:\n{prompt}"
     
     try:
-        response = requests.post(
-            f"{OLLAMA_API_URL}/api/generate",
-            json={
-                "model": OLLAMA_MODEL,
-                "prompt": full_prompt,
-                "stream": False
-            },
-            timeout=120
-        )
-        return response.json().get("response", "[ERROR] Tidak ada respons")
+        return llm_generate(full_prompt) or "[ERROR] Tidak ada respons"
     except Exception as e:
         return f"[ERROR] Gagal menghubungi LLM: {e}"
 
@@ -9,14 +9,32 @@ Menggabungkan:
 5. PDF Document Loading untuk knowledge base
 """
 import chromadb
-from chromadb.utils import embedding_functions
 from pathlib import Path
 import requests
 from datetime import datetime
 import os
+import re
 from config import (
-    OLLAMA_API_URL, OLLAMA_MODEL, CHROMA_DB_PATH, EMBEDDING_MODEL, RAG_TOP_K,
-    SILVERBULLET_URL, BROWSER_HEADLESS, BROWSER_SLOW_MO, CODING_OUTPUT_DIR
+    OLLAMA_API_URL, OLLAMA_MODEL, CHROMA_DB_PATH, RAG_TOP_K,
+    SILVERBULLET_URL, BROWSER_HEADLESS, BROWSER_SLOW_MO, CODING_OUTPUT_DIR,
+    COLLECTION_SHARDING, COLLECTION_SHARDS, LLM_STREAM, ANSWER_CACHE_ENABLED, LLM_CHAT_MODE
+)
+from pdf_ingest import (
+    extract_pdf_pages, sync_pdf_chunks, load_manifest, is_unchanged,
+    clear_manifest, ingest_folder, format_ingest_summary, head_text,
+    add_chunks_batched
+)
+from chunker import iter_chunk_spans
+from embeddings import get_embedding_function
+from vector_search import record_added, record_deleted, record_replaced, query_cache_stats
+from answer_cache import lookup as cached_answer, store as store_answer, answer_cache_stats
+from context_packer import retrieve_passages
+from sharded_collection import open_collection, reset_collection
+from retrieval import RequestContext, fan_out, search_graph_context
+import warmup
+from llm_client import (
+    generate as llm_generate, stream_generate, format_stats, llm_stats, LLMError, LLMBusy,
+    ChatSession
 )
 
 #Path untuk documents
@@ -42,78 +60,65 @@ except ImportError as e:
     NEO4J_AVAILABLE = False
     print(f"[WARN] Neo4j module not available: {e}")
 
+# Worker ekstraksi PDF (forkserver/spawn) meng-import ulang script ini sebagai
+# "__mp_main__"; model, ChromaDB & warm-up hanya dimuat di proses utama
+IS_PDF_WORKER = __name__ == "__mp_main__"
+
 #CHROMADB SETUP
-print("[INFO] Loading embedding model...")
-embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-    model_name=EMBEDDING_MODEL
-)
+if not IS_PDF_WORKER:
+    print("[INFO] Loading embedding model...")
+    embedding_fn = get_embedding_function(background=True)
 
-chroma_client = chromadb.PersistentClient(path=str(CHROMA_DB_PATH))
-collection = chroma_client.get_or_create_collection(
-    name="agent_memory",
-    embedding_function=embedding_fn
-)
+    chroma_client = chromadb.PersistentClient(path=str(CHROMA_DB_PATH))
+    collection = open_collection(chroma_client, embedding_fn)
 
-print(f"[INFO] Database berisi {collection.count()} dokumen.")
+    print(f"[INFO] Database berisi {collection.count()} dokumen.")
 
 # --- MODEL WARM-UP ---
 
 def warmup_model(max_retries: int = 3) -> bool:
-    """Pre-load Ollama model dengan mengirim request sederhana."""
+    """Pre-load Ollama model dengan mengirim request sederhana.
+
+    Dijalankan di background (warmup.start("llm", ...)), jadi log dibuat
+    satu baris per kejadian agar tidak memotong prompt input.
+    """
     import time
     
-    print(f"\n[INFO] Warming up model '{OLLAMA_MODEL}'...")
-    print(f"[INFO] Koneksi ke: {OLLAMA_API_URL}")
+    print(f">>> [WARMUP] Memuat model '{OLLAMA_MODEL}' di {OLLAMA_API_URL} (background)...")
     
     for attempt in range(1, max_retries + 1):
         try:
-            print(f"[WARMUP] Attempt {attempt}/{max_retries}...", end=" ", flush=True)
-            
-            response = requests.post(
-                f"{OLLAMA_API_URL}/api/generate",
-                json={
-                    "model": OLLAMA_MODEL,
-                    "prompt": "Hi",
-                    "stream": False
-                },
-                timeout=120 
-            )
-            
-            if response.status_code == 200:
-                print("OK ✓")
-                print(f"[INFO] Model '{OLLAMA_MODEL}' siap digunakan!\n")
-                return True
-            elif response.status_code == 404:
-                print(f"GAGAL")
-                print(f"[ERROR] Model '{OLLAMA_MODEL}' tidak ditemukan!")
-                print(f"[ERROR] Jalankan: ollama pull {OLLAMA_MODEL}")
+            llm_generate("Hi", timeout=120)
+            print(f">>> [WARMUP] Model '{OLLAMA_MODEL}' siap digunakan!")
+            return True
+        
+        except LLMError as e:
+            if e.status_code == 404:
+                print(f">>> [WARMUP] [ERROR] Model '{OLLAMA_MODEL}' tidak ditemukan! "
+                      f"Jalankan: ollama pull {OLLAMA_MODEL}")
                 return False
-            else:
-                print(f"Error {response.status_code}")
-                if attempt < max_retries:
-                    print(f"[WARMUP] Retry dalam 5 detik...")
-                    time.sleep(5)
+            print(f">>> [WARMUP] Attempt {attempt}/{max_retries}: error {e.status_code or e}")
+            if attempt < max_retries:
+                time.sleep(5)
                     
         except requests.exceptions.ConnectionError:
-            print("Connection Error")
-            print(f"[ERROR] Tidak bisa konek ke Ollama di {OLLAMA_API_URL}")
-            print(f"[ERROR] Pastikan Ollama berjalan: ollama serve")
+            print(f">>> [WARMUP] Attempt {attempt}/{max_retries}: tidak bisa konek ke Ollama di "
+                  f"{OLLAMA_API_URL} (pastikan Ollama berjalan: ollama serve)")
             if attempt < max_retries:
-                print(f"[WARMUP] Retry dalam 5 detik...")
                 time.sleep(5)
                 
         except requests.exceptions.Timeout:
-            print("Timeout")
+            print(f">>> [WARMUP] Attempt {attempt}/{max_retries}: timeout, model mungkin masih loading")
             if attempt < max_retries:
-                print(f"[WARMUP] Model mungkin masih loading, retry...")
                 time.sleep(3)
     
-    print(f"\n[WARN] Gagal warm-up model setelah {max_retries} percobaan.")
-    print(f"[WARN] Bot tetap berjalan, tapi LLM mungkin lambat saat pertama kali.\n")
+    print(f">>> [WARMUP] [WARN] Gagal warm-up model setelah {max_retries} percobaan. "
+          f"Bot tetap berjalan, tapi LLM mungkin lambat saat pertama kali.")
     return False
 
-# Warm-up saat startup
-_model_ready = warmup_model()
+# Warm-up di background: import/startup tidak menunggu model (cek dengan 'status model')
+if not IS_PDF_WORKER:
+    warmup.start("llm", warmup_model)
 
 # --- FUNGSI UTILITAS ---
 
@@ -124,20 +129,18 @@ def slugify(text: str) -> str:
     """Ubah teks jadi nama file yang aman."""
     return "".join(c if c.isalnum() or c in " -_" else "" for c in text).strip().replace(" ", "_")[:50]
 
-def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> list:
-    """Pecah teks panjang jadi chunks yang lebih kecil."""
-    words = text.split()
-    chunks = []
-    
-    for i in range(0, len(words), chunk_size - overlap):
-        chunk = " ".join(words[i:i + chunk_size])
-        if chunk.strip():
-            chunks.append(chunk)
-    
-    return chunks if chunks else [text]
-
 #FUNGSI PDF
 
+def cari_file_pdf(filepath: str):
+    """Cari path PDF (langsung atau di folder documents/). None jika tidak ada."""
+    path = Path(filepath)
+    if not path.exists():
+        # Coba cari di folder documents/
+        path = DOCS_PATH / filepath
+        if not path.exists():
+            return None
+    return path
+
 def load_pdf(filepath: str) -> dict:
     """Ekstrak teks dari PDF."""
     try:
@@ -145,23 +148,17 @@ def load_pdf(filepath: str) -> dict:
     except ImportError:
         return {"error": "pypdf tidak terinstall. Jalankan: pip install pypdf"}
     
-    path = Path(filepath)
-    if not path.exists():
-        # Coba cari di folder documents/
-        path = DOCS_PATH / filepath
-        if not path.exists():
-            return {"error": f"File tidak ditemukan: {filepath}"}
+    path = cari_file_pdf(filepath)
+    if path is None:
+        return {"error": f"File tidak ditemukan: {filepath}"}
     
     try:
-        reader = PdfReader(str(path))
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() or ""
+        page_texts = extract_pdf_pages(path)
         
         return {
             "filename": path.name,
-            "pages": len(reader.pages),
-            "text": text.strip(),
+            "pages": len(page_texts),
+            "page_texts": page_texts,
             "path": str(path.absolute())
         }
     except Exception as e:
@@ -169,67 +166,84 @@ def load_pdf(filepath: str) -> dict:
 
 def simpan_pdf_ke_memory(filepath: str) -> str:
     """Load PDF dan simpan semua chunks ke ChromaDB + ekstrak entitas ke Neo4j."""
+    #File tidak berubah sejak ingest terakhir -> tidak perlu dibaca ulang
+    path = cari_file_pdf(filepath)
+    if path is not None:
+        manifest = load_manifest()
+        if is_unchanged(path, manifest):
+            return f"PDF '{path.name}' tidak berubah sejak terakhir dimuat ({manifest[path.name]['chunks']} chunks). Dilewati."
+    
     result = load_pdf(filepath)
     
     if "error" in result:
         return result["error"]
     
-    text = result["text"]
-    if not text:
+    page_texts = result["page_texts"]
+    if not any(page.strip() for page in page_texts):
         return "[ERROR] PDF kosong atau tidak bisa dibaca teksnya."
     
-    #Pecah jadi chunks
-    chunks = chunk_text(text, chunk_size=400, overlap=50)
+    #Pecah jadi chunks (batas kalimat, budget token embedding)
+    chunks = list(iter_chunk_spans(page_texts))
     
-    saved_count = 0
-    for i, chunk in enumerate(chunks):
-        doc_id = f"pdf_{result['filename']}_{i+1}"
-        
-        #Cek apakah sudah ada
-        existing = collection.get(ids=[doc_id])
-        if existing['ids']:
-            continue  #Skip jika sudah ada
-        
-        collection.add(
-            documents=[chunk],
-            ids=[doc_id],
-            metadatas=[{
-                "source": "pdf",
-                "filename": result['filename'],
-                "chunk": i + 1,
-                "total_chunks": len(chunks),
-                "timestamp": timestamp()
-            }]
-        )
-        saved_count += 1
+    #Sinkron berdasarkan hash chunk: embed yang berubah saja, hapus yang basi
+    stats = sync_pdf_chunks(collection, Path(result['path']), chunks)
+    saved_count = stats["added"]
     
     print(f">>> [PDF] Loaded: {result['filename']} ({result['pages']} pages, {len(chunks)} chunks)")
     
-    #Auto-extract entities ke Neo4j
+    #Auto-extract entities ke Neo4j (hanya jika ada chunk baru)
     entity_result = ""
-    if NEO4J_AVAILABLE:
-        try:
-            print(f">>> [NEO4J] Extracting entities from PDF...")
-            graph = get_graph()
-            if graph.connect():
-                # Ekstrak entitas dari summary text (max 3000 chars)
-                extracted = extract_entities_with_llm(text[:3000])
-                entity_result = save_entities_to_graph(graph, extracted)
-                print(f">>> [NEO4J] {entity_result}")
-        except Exception as e:
-            print(f">>> [NEO4J] Entity extraction failed: {e}")
-            entity_result = f"(Entity extraction gagal: {e})"
+    if NEO4J_AVAILABLE and saved_count:
+        entity_result = ekstrak_entitas_ke_graph(head_text(page_texts))
     
     output = f"PDF '{result['filename']}' berhasil dimuat!\\n"
     output += f"- {result['pages']} halaman\\n"
     output += f"- {len(chunks)} chunks disimpan ke ChromaDB\\n"
     output += f"- {saved_count} chunks baru (sisanya sudah ada)"
+    if stats["deleted"]:
+        output += f"\\n- {stats['deleted']} chunks lama dihapus (isi PDF berubah)"
+    if saved_count:
+        output += f"\\n- Kecepatan: {stats['chunks_per_sec']:.1f} chunks/detik"
     
     if entity_result:
         output += f"\\n- Knowledge Graph: {entity_result}"
     
     return output
 
+def ekstrak_entitas_ke_graph(text: str) -> str:
+    """Ekstrak entitas dari teks PDF ke Neo4j (pakai LLM)."""
+    try:
+        print(f">>> [NEO4J] Extracting entities from PDF...")
+        graph = get_graph()
+        if graph.connect():
+            # Ekstrak entitas dari summary text (max 3000 chars)
+            warmup.wait("llm")
+            extracted = extract_entities_with_llm(text[:3000])
+            entity_result = save_entities_to_graph(graph, extracted)
+            print(f">>> [NEO4J] {entity_result}")
+            return entity_result
+    except Exception as e:
+        print(f">>> [NEO4J] Entity extraction failed: {e}")
+        return f"(Entity extraction gagal: {e})"
+    return ""
+
+def simpan_semua_pdf() -> str:
+    """Load semua PDF di folder documents/ sekaligus (pipeline)."""
+    pdfs = list(DOCS_PATH.glob("*.pdf"))
+    if not pdfs:
+        return f"Folder {DOCS_PATH}/ masih kosong. Taruh file PDF di sana."
+    
+    def progress(done, total, filename):
+        print(f">>> [PDF] ({done}/{total}) {filename}")
+    
+    summary = ingest_folder(
+        collection, DOCS_PATH,
+        embedding_fn=embedding_fn,
+        entity_fn=ekstrak_entitas_ke_graph if NEO4J_AVAILABLE else None,
+        progress=progress
+    )
+    return format_ingest_summary(summary)
+
 def list_pdf_files() -> str:
     """List semua PDF di folder documents/."""
     pdfs = list(DOCS_PATH.glob("*.pdf"))
@@ -248,74 +262,149 @@ def simpan_memory(teks: str) -> str:
         return "[ERROR] Teks kosong!"
     
     doc_id = f"doc_{collection.count() + 1}"
+    metadata = {"source": "user", "timestamp": timestamp()}
     collection.add(
         documents=[teks],
         ids=[doc_id],
-        metadatas=[{"source": "user", "timestamp": timestamp()}]
+        metadatas=[metadata]
     )
+    record_added([doc_id], [teks], [metadata])
     print(f">>> [CHROMA] Saved: {doc_id}")
     return doc_id
 
-def cari_memory(query: str, top_k: int = RAG_TOP_K) -> str:
-    """Cari di ChromaDB (semua dokumen)."""
-    if collection.count() == 0:
-        return ""
-    
-    results = collection.query(
-        query_texts=[query],
-        n_results=min(top_k, collection.count())
-    )
-    
-    if not results['documents'][0]:
+def cari_memory(query: str, top_k: int = RAG_TOP_K, ctx: RequestContext = None) -> str:
+    """Cari di ChromaDB (semua dokumen). Jika ctx diberikan, embedding & passage dibagi via ctx."""
+    passages = retrieve_passages(collection, embedding_fn, query, top_k,
+                                 query_vector=ctx.vector if ctx else None)
+    if ctx is not None:
+        ctx.passages = passages
+    return format_memory(passages)
+
+def format_memory(passages: list) -> str:
+    """Teks konteks dari passage hasil retrieve_passages."""
+    if not passages:
         return ""
     
     output = "KONTEKS DARI MEMORY:\n"
-    for doc in results['documents'][0]:
-        output += f"- {doc}\n"
+    for passage in passages:
+        output += f"- {passage['text']}\n"
     
-    print(f">>> [CHROMA] Found {len(results['documents'][0])} docs")
+    print(f">>> [CHROMA] Found {len(passages)} docs")
     return output
 
-def cari_pdf_only(query: str, top_k: int = 5) -> str:
-    """Cari HANYA di dokumen PDF."""
-    if collection.count() == 0:
-        return ""
+def parse_pdf_scope(text: str) -> tuple:
+    """Ambil nama file PDF & rentang halaman dari pertanyaan.
+    
+    Contoh: 'llm-fight.pdf halaman 3-5 apa isinya?'
+        -> ('llm-fight.pdf', (3, 5), 'apa isinya?')
+    """
+    filename = None
+    known = {p.name for p in DOCS_PATH.glob("*.pdf")} | set(load_manifest())
+    for name in sorted(known, key=len, reverse=True):
+        idx = text.lower().find(name.lower())
+        if idx >= 0:
+            filename = name
+            text = text[:idx] + text[idx + len(name):]
+            break
+    
+    page_range = None
+    match = re.search(
+        r"\b(?:halaman|hal\.?|page|pages)\s*(\d+)(?:\s*(?:-|sampai|s/d|to)\s*(\d+))?",
+        text, re.IGNORECASE
+    )
+    if match:
+        first = int(match.group(1))
+        last = int(match.group(2) or first)
+        page_range = (min(first, last), max(first, last))
+        text = text[:match.start()] + text[match.end():]
     
+    return filename, page_range, " ".join(text.split())
+
+def pdf_where(filename: str = None, page_range: tuple = None) -> dict:
+    """Filter Chroma untuk chunk PDF (opsional per file & rentang halaman)."""
+    conditions = [{"source": "pdf"}]
+    if filename:
+        conditions.append({"filename": filename})
+    if page_range:
+        # Chunk beririsan dengan rentang: page_end >= awal DAN page_start <= akhir
+        conditions.append({"page_end": {"$gte": page_range[0]}})
+        conditions.append({"page_start": {"$lte": page_range[1]}})
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+def cari_pdf_only(query: str, top_k: int = 5, filename: str = None,
+                  page_range: tuple = None, ctx: RequestContext = None) -> str:
+    """Cari HANYA di dokumen PDF (opsional dibatasi file & rentang halaman).
+
+    Jika ctx diberikan, embedding & passage dibagi via ctx (seperti cari_memory).
+    """
     try:
-        results = collection.query(
-            query_texts=[query],
-            n_results=top_k,
-            where={"source": "pdf"}
+        passages = retrieve_passages(
+            collection, embedding_fn, query, top_k,
+            where=pdf_where(filename, page_range),
+            query_vector=ctx.vector if ctx else None
         )
+        if ctx is not None:
+            ctx.passages = passages
         
-        if not results['documents'][0]:
+        if not passages:
             return ""
         
         output = "KONTEKS DARI PDF:\n"
-        for i, doc in enumerate(results['documents'][0]):
-            meta = results['metadatas'][0][i] if results['metadatas'][0] else {}
-            filename = meta.get('filename', 'unknown')
-            output += f"\n[{filename}]:\n{doc}\n"
+        for passage in passages:
+            meta = passage['metadata']
+            label = meta.get('filename', 'unknown')
+            if meta.get('page_start'):
+                pages = f"{meta['page_start']}" if meta['page_start'] == meta['page_end'] else f"{meta['page_start']}-{meta['page_end']}"
+                label += f" hal. {pages}"
+            output += f"\n[{label}]:\n{passage['text']}\n"
         
-        print(f">>> [PDF SEARCH] Found {len(results['documents'][0])} chunks")
+        print(f">>> [PDF SEARCH] Found {len(passages)} chunks")
         return output
     except Exception as e:
         print(f">>> [PDF SEARCH] Error: {e}")
         return ""
 
-def reset_database() -> str:
-    """Hapus semua dokumen dari ChromaDB."""
+def reset_database(shard: str = None) -> str:
+    """Hapus semua dokumen dari ChromaDB (atau hanya satu shard, mis. 'pdf')."""
     global collection
     try:
-        chroma_client.delete_collection("agent_memory")
-        collection = chroma_client.get_or_create_collection(
-            name="agent_memory",
-            embedding_function=embedding_fn
-        )
+        # Reset satu shard: hanya id di shard itu yang dibuang dari BM25 & cache jawaban
+        removed = collection.shards[shard].get(include=[])["ids"] if shard else None
+        collection = reset_collection(chroma_client, embedding_fn, shard)
+        if shard in (None, "pdf"):
+            clear_manifest()
+        if removed is None:
+            record_replaced()
+        elif removed:
+            record_deleted(removed)
+        if shard:
+            return f"[OK] Shard '{shard}' di-reset. Shard lain tidak berubah."
         return "[OK] Database di-reset. Semua dokumen dihapus."
     except Exception as e:
         return f"[ERROR] Gagal reset: {e}"
 
+def cache_stats() -> str:
+    """Statistik cache query, cache embedding, cache jawaban & panggilan LLM."""
+    stats = query_cache_stats()
+    output = (f"CACHE QUERY: {stats['hits']} hit, {stats['misses']} miss "
+              f"(hit rate {stats['hit_rate']:.0%}), {stats['size']}/{stats['max_size']} entri, "
+              f"versi collection {stats['version']}")
+    embed_cache = getattr(embedding_fn, "cache", None)
+    if embed_cache is not None:
+        stats = embed_cache.stats()
+        output += (f"\nCACHE EMBEDDING: {stats['hits']} hit, {stats['misses']} miss "
+                   f"(hit rate {stats['hit_rate']:.0%}), {stats['entries']} entri di disk")
+    stats = answer_cache_stats()
+    output += (f"\nCACHE JAWABAN: {stats['hits']} hit, {stats['misses']} miss "
+               f"(hit rate {stats['hit_rate']:.0%}), {stats['entries']}/{stats['max_entries']} entri")
+    stats = llm_stats()
+    output += (f"\nLLM: {stats['requests']} request, {stats['errors']} error, "
+               f"rata-rata {stats['avg_ms'] / 1000:.1f}s (token pertama {stats['avg_ttft_ms'] / 1000:.1f}s), "
+               f"{stats['coalesced']} digabung dengan request identik, "
+               f"antrian {stats['active']}/{stats['max_concurrent']} berjalan, "
+               f"{stats['waiting']}/{stats['max_queue']} menunggu")
+    return output
+
 def export_database(filename: str = None) -> str:
     """Export ChromaDB ke file ZIP untuk dibagikan."""
     import shutil
@@ -377,10 +466,8 @@ def import_database(filepath: str) -> str:
         
         # Reload ChromaDB
         chroma_client = chromadb.PersistentClient(path=str(CHROMA_DB_PATH))
-        collection = chroma_client.get_or_create_collection(
-            name="agent_memory",
-            embedding_function=embedding_fn
-        )
+        collection = open_collection(chroma_client, embedding_fn)
+        record_replaced()
         
         return f"[OK] Database berhasil diimpor!\nDokumen: {collection.count()}\nBackup tersimpan di: {backup_path}"
     except Exception as e:
@@ -444,31 +531,24 @@ def import_json(filepath: str) -> str:
         if 'documents' not in data:
             return "[ERROR] Format JSON tidak valid. Harus ada key 'documents'."
         
-        imported_count = 0
-        skipped_count = 0
-        
+        ids, documents, metadatas = [], [], []
+        seen = set()
+        empty_count = 0
         for doc in data['documents']:
-            doc_id = doc.get('id', f"imported_{imported_count + 1}")
+            doc_id = doc.get('id', f"imported_{len(ids) + 1}")
             content = doc.get('content', '')
-            metadata = doc.get('metadata', {})
-            
-            if not content:
-                skipped_count += 1
-                continue
-            
-            # Cek apakah ID sudah ada
-            existing = collection.get(ids=[doc_id])
-            if existing['ids']:
-                skipped_count += 1
+            if not content or doc_id in seen:
+                empty_count += 1
                 continue
-            
-            # Tambahkan ke database (akan di-embed otomatis)
-            collection.add(
-                documents=[content],
-                ids=[doc_id],
-                metadatas=[metadata]
-            )
-            imported_count += 1
+            seen.add(doc_id)
+            ids.append(doc_id)
+            documents.append(content)
+            metadatas.append(doc.get('metadata', {}))
+        
+        # Batch add: ID yang sudah ada dilewati, teks yang pernah di-embed diambil dari cache
+        stats = add_chunks_batched(collection, ids, documents, metadatas)
+        imported_count = stats['added']
+        skipped_count = stats['skipped'] + empty_count
         
         return f"[OK] Import JSON berhasil!\nDiimpor: {imported_count} dokumen\nDilewati (sudah ada): {skipped_count}\nTotal sekarang: {collection.count()}"
     except Exception as e:
@@ -580,10 +660,8 @@ def import_all(folder_path: str) -> str:
             
             # Reload ChromaDB
             chroma_client = chromadb.PersistentClient(path=str(CHROMA_DB_PATH))
-            collection = chroma_client.get_or_create_collection(
-                name="agent_memory",
-                embedding_function=embedding_fn
-            )
+            collection = open_collection(chroma_client, embedding_fn)
+            record_replaced()
             
             results.append(f"✓ ChromaDB: {collection.count()} dokumen diimpor")
         except Exception as e:
@@ -740,31 +818,52 @@ def tulis_visual_di_silverbullet(judul: str, isi: str) -> str:
 
 # --- FUNGSI LLM ---
 
-def tanya_llm(prompt: str, context: str = "") -> str:
-    """Kirim ke Ollama LLM."""
+# Riwayat percakapan CLI (dipakai jika LLM_CHAT_MODE aktif)
+chat_session = ChatSession()
+
+def tanya_llm(prompt: str, context: str = "", stream: bool = LLM_STREAM,
+              ctx: RequestContext = None) -> str:
+    """Kirim ke Ollama LLM. stream=True: token dicetak ke console begitu datang.
+
+    Jawaban untuk pertanyaan mirip dengan konteks yang sama diambil dari
+    answer_cache (ctx: embedding pertanyaan & passage yang sudah dihitung).
+    Di mode percakapan (LLM_CHAT_MODE) riwayat ikut dikirim lewat chat_session;
+    cache jawaban hanya dipakai untuk giliran tanpa riwayat.
+    """
     full_prompt = prompt
     if context:
         full_prompt = f"{context}\n\nBerdasarkan informasi di atas, jawab:\n{prompt}"
     
+    if not ANSWER_CACHE_ENABLED or (LLM_CHAT_MODE and chat_session.turns()):
+        return _tanya_llm(full_prompt, stream)
+    ctx = ctx or RequestContext(prompt, embedding_fn)
+    cached = cached_answer(ctx.vector, context, OLLAMA_MODEL)
+    if cached is not None:
+        if LLM_CHAT_MODE:
+            chat_session.record(full_prompt, cached)
+        return cached
+    answer = _tanya_llm(full_prompt, stream)
+    store_answer(prompt, ctx.vector, context, OLLAMA_MODEL, answer,
+                 [p["id"] for p in ctx.passages])
+    return answer
+
+def _tanya_llm(full_prompt: str, stream: bool) -> str:
     print(f">>> [LLM] Model: {OLLAMA_MODEL}")
-    print(f">>> [LLM] URL: {OLLAMA_API_URL}/api/generate")
+    print(f">>> [LLM] URL: {OLLAMA_API_URL}/api/{'chat' if LLM_CHAT_MODE else 'generate'}")
+    
+    if stream:
+        return _tanya_llm_stream(full_prompt)
     
+    stats = {}
     try:
-        response = requests.post(
-            f"{OLLAMA_API_URL}/api/generate",
-            json={"model": OLLAMA_MODEL, "prompt": full_prompt, "stream": False},
-            timeout=180
-        )
-        
-        if response.status_code != 200:
-            return f"[ERROR] Ollama status {response.status_code}: {response.text[:200]}"
-        
-        data = response.json()
-        answer = data.get("response", "")
+        if LLM_CHAT_MODE:
+            answer = chat_session.ask(full_prompt, stats=stats, on_queue=_print_queue_position)
+        else:
+            answer = llm_generate(full_prompt, on_queue=_print_queue_position)
+        if stats:
+            print(f">>> [LLM] {format_stats(stats)}")
         
         if not answer:
-            # Debug: tampilkan response mentah
-            print(f">>> [LLM DEBUG] Raw response: {data}")
             return f"[ERROR] Response kosong. Cek apakah model '{OLLAMA_MODEL}' sudah ter-download. Jalankan: ollama pull {OLLAMA_MODEL}"
         
         return answer
@@ -773,8 +872,63 @@ def tanya_llm(prompt: str, context: str = "") -> str:
         return f"[ERROR] Timeout! Model '{OLLAMA_MODEL}' mungkin terlalu lambat atau belum siap."
     except requests.exceptions.ConnectionError:
         return f"[ERROR] Tidak bisa konek ke Ollama di {OLLAMA_API_URL}. Pastikan Ollama berjalan!"
+    except LLMBusy as e:
+        return _busy_message(e)
+    except LLMError as e:
+        return f"[ERROR] {e}"
+    except Exception as e:
+        return f"[ERROR] LLM: {e}"
+
+def _print_queue_position(position: int):
+    print(f">>> [LLM] Menunggu giliran (antrian ke-{position})...")
+
+def _busy_message(error: LLMBusy) -> str:
+    return f"⏳ Server sedang sibuk (antrian penuh, posisi {error.position}). Coba lagi sebentar."
+
+# Jawaban terakhir yang sudah dicetak saat streaming (agar main loop tidak mencetak ulang)
+_streamed_answer = ""
+
+def _tanya_llm_stream(full_prompt: str) -> str:
+    """Stream jawaban Ollama ke console. Returns jawaban lengkap / pesan [ERROR]."""
+    global _streamed_answer
+    stats = {}
+    parts = []
+    try:
+        if LLM_CHAT_MODE:
+            tokens = chat_session.stream(full_prompt, stats=stats, on_queue=_print_queue_position)
+        else:
+            tokens = stream_generate(full_prompt, stats=stats, on_queue=_print_queue_position)
+        first = next(tokens, "")  # Tunggu giliran antrian sebelum mulai mencetak
+        print("\nAgent: " + first, end="", flush=True)
+        parts.append(first)
+        for token in tokens:
+            parts.append(token)
+            print(token, end="", flush=True)
+        print()
+    except requests.exceptions.Timeout:
+        print()
+        return f"[ERROR] Timeout! Model '{OLLAMA_MODEL}' mungkin terlalu lambat atau belum siap."
+    except requests.exceptions.ConnectionError:
+        print()
+        return f"[ERROR] Tidak bisa konek ke Ollama di {OLLAMA_API_URL}. Pastikan Ollama berjalan!"
+    except LLMBusy as e:
+        return _busy_message(e)
     except Exception as e:
+        print()
         return f"[ERROR] LLM: {e}"
+    
+    answer = "".join(parts)
+    if not answer:
+        return f"[ERROR] Response kosong. Cek apakah model '{OLLAMA_MODEL}' sudah ter-download. Jalankan: ollama pull {OLLAMA_MODEL}"
+    print(f">>> [LLM] {format_stats(stats)}")
+    _streamed_answer = answer
+    return answer
+
+def take_streamed_answer() -> str:
+    """Ambil (dan reset) jawaban yang sudah tercetak lewat streaming."""
+    global _streamed_answer
+    answer, _streamed_answer = _streamed_answer, ""
+    return answer
 
 # --- AUTO-RAG + SILVERBULLET LOGIC ---
 
@@ -822,6 +976,18 @@ def detect_intent(user_input: str) -> str:
     if any(kw in lower for kw in ["import db", "impor db", "impor database", "import database", "restore db"]):
         return "IMPORT_DB"
     
+    # Intent: STATISTIK CACHE
+    if any(kw in lower for kw in ["cache stats", "statistik cache"]):
+        return "CACHE_STATS"
+    
+    # Intent: STATUS MODEL (pemanasan di background)
+    if any(kw in lower for kw in ["status model", "model status", "cek model"]):
+        return "MODEL_STATUS"
+    
+    # Intent: RESET PERCAKAPAN (riwayat mode chat)
+    if any(kw in lower for kw in ["reset chat", "hapus riwayat", "percakapan baru"]):
+        return "RESET_CHAT"
+    
     # Intent: RESET DATABASE
     if any(kw in lower for kw in ["reset database", "hapus semua", "clear db", "reset db"]):
         return "RESET_DB"
@@ -861,11 +1027,18 @@ def detect_intent(user_input: str) -> str:
     # Default: TANYA
     return "ASK"
 
+# Intent yang memanggil LLM (ekstraksi entitas saat LOAD_PDF menunggu sendiri)
+LLM_INTENTS = {"ASK", "ASK_PDF", "ASK_VISUAL"}
+
 def process_input(user_input: str) -> str:
     """Proses input dengan hybrid logic."""
     intent = detect_intent(user_input)
     print(f">>> [INTENT] {intent}")
     
+    # Hanya intent yang memanggil LLM menunggu warm-up; perintah lain langsung jalan
+    if intent in LLM_INTENTS:
+        warmup.wait("llm")
+    
     # === KNOWLEDGE GRAPH COMMANDS ===
     
     if intent == "SHOW_GRAPH":
@@ -1015,7 +1188,23 @@ def process_input(user_input: str) -> str:
         return import_database(cleaned)
     
     elif intent == "RESET_DB":
-        return reset_database()
+        # 'reset db pdf' -> hanya shard PDF
+        words = user_input.lower().split()
+        shard = next((s for s in COLLECTION_SHARDS if s in words), None)
+        if shard and not COLLECTION_SHARDING:
+            return "[ERROR] Reset per shard butuh COLLECTION_SHARDING=true"
+        return reset_database(shard)
+    
+    elif intent == "CACHE_STATS":
+        return cache_stats()
+    
+    elif intent == "MODEL_STATUS":
+        return warmup.format_status()
+    
+    elif intent == "RESET_CHAT":
+        turns = chat_session.turns()
+        chat_session.reset()
+        return f"Riwayat percakapan dihapus ({turns} giliran)."
     
     elif intent == "ASK_PDF":
         # Tanya HANYA dari PDF
@@ -1024,14 +1213,28 @@ def process_input(user_input: str) -> str:
             cleaned = cleaned.lower().replace(kw, "").strip()
         
         if not cleaned:
-            return "Format: 'tanya pdf [pertanyaan Anda]'"
+            return "Format: 'tanya pdf [pertanyaan Anda]'\nAtau: 'tanya pdf [file.pdf] halaman 3-5 [pertanyaan]'"
         
-        context = cari_pdf_only(cleaned)
+        # Opsional: batasi ke file & rentang halaman tertentu
+        filename, page_range, question = parse_pdf_scope(cleaned)
+        if not question:
+            question = "Apa isi bagian dokumen ini?"
+        
+        warmup.wait("embedding")  # Jangan habiskan waktu pencarian untuk memuat model
+        ctx = RequestContext(question, embedding_fn)
+        context = cari_pdf_only(question, filename=filename, page_range=page_range, ctx=ctx)
         if not context:
+            if filename or page_range:
+                return "Tidak ada chunk PDF yang cocok dengan file/halaman tersebut."
             return "Tidak ada dokumen PDF di database. Gunakan 'load pdf [file.pdf]' dulu."
         
-        answer = tanya_llm(cleaned, context)
-        return f"{answer}\n\n---\n*Sumber: Dokumen PDF*"
+        answer = tanya_llm(question, context, ctx=ctx)
+        sumber = "Dokumen PDF"
+        if filename:
+            sumber += f" {filename}"
+        if page_range:
+            sumber += f" halaman {page_range[0]}-{page_range[1]}"
+        return f"{answer}\n\n---\n*Sumber: {sumber}*"
     
     elif intent == "ASK_VISUAL":
         # Tanya dengan output visual ke browser (HANYA dari PDF)
@@ -1043,11 +1246,13 @@ def process_input(user_input: str) -> str:
             return "Format: 'tanya visual [pertanyaan Anda]'"
         
         # Cari konteks HANYA dari PDF
-        context = cari_pdf_only(cleaned)
+        warmup.wait("embedding")
+        ctx = RequestContext(cleaned, embedding_fn)
+        context = cari_pdf_only(cleaned, ctx=ctx)
         if not context:
-            context = cari_memory(cleaned)  # Fallback ke semua memory
+            context = cari_memory(cleaned, ctx=ctx)  # Fallback ke semua memory
         
-        answer = tanya_llm(cleaned, context)
+        answer = tanya_llm(cleaned, context, ctx=ctx)
         
         # Generate judul
         judul = "QA_" + slugify(cleaned[:25])
@@ -1066,11 +1271,13 @@ def process_input(user_input: str) -> str:
         for kw in ["load pdf", "baca pdf", "muat pdf", "import pdf"]:
             cleaned = cleaned.lower().replace(kw, "").strip()
         
-        if cleaned:
+        if cleaned in ["all", "semua"]:
+            return simpan_semua_pdf()
+        elif cleaned:
             return simpan_pdf_ke_memory(cleaned)
         else:
             # List available PDFs
-            return f"Nama file PDF tidak disebutkan.\n\n{list_pdf_files()}\n\nGunakan: 'load pdf [namafile.pdf]'"
+            return f"Nama file PDF tidak disebutkan.\n\n{list_pdf_files()}\n\nGunakan: 'load pdf [namafile.pdf]' atau 'load pdf all'"
     
     elif intent == "LIST_PDF":
         return list_pdf_files()
@@ -1118,20 +1325,22 @@ def process_input(user_input: str) -> str:
         return f"{memory_list}\n\n{notes_list}"
     
     else:  # ASK - Hybrid Search (ChromaDB + Neo4j)
-        # 1. Cari konteks dari ChromaDB (semantic search)
-        context = cari_memory(user_input)
-        
-        # 2. Cari konteks dari Neo4j (knowledge graph)
-        graph_context = ""
+        # 1-2. Cari konteks dari ChromaDB (semantic) dan Neo4j (graph) secara paralel.
+        # Model embedding harus siap dulu agar memuatnya tidak memakan deadline chroma
+        warmup.wait("embedding")
+        ctx = RequestContext(user_input, embedding_fn)
+        tasks = {"chroma": lambda: retrieve_passages(collection, embedding_fn, user_input,
+                                                     RAG_TOP_K, query_vector=ctx.vector)}
         if NEO4J_AVAILABLE:
-            try:
-                graph = get_graph()
-                if graph.connect():
-                    graph_context = graph.search_graph(user_input)
-                    if graph_context:
-                        print(f">>> [HYBRID] Graph context found!")
-            except Exception as e:
-                print(f">>> [HYBRID] Graph search error: {e}")
+            tasks["graph"] = lambda: search_graph_context(user_input)
+        found = fan_out(tasks)
+        # Passage hanya dari hasil yang tiba sebelum deadline; task chroma yang
+        # telat tetap berjalan di pool, tapi tidak menyentuh ctx
+        ctx.passages = found["chroma"] or []
+        context = format_memory(ctx.passages)
+        graph_context = found.get("graph", "")
+        if graph_context:
+            print(f">>> [HYBRID] Graph context found!")
         
         # 3. Gabungkan konteks
         full_context = ""
@@ -1144,27 +1353,19 @@ def process_input(user_input: str) -> str:
             print(f">>> [HYBRID] ChromaDB: {'✓' if context else '✗'} | Neo4j: {'✓' if graph_context else '✗'}")
         
         # 4. Tanya LLM dengan konteks gabungan
-        answer = tanya_llm(user_input, full_context)
+        answer = tanya_llm(user_input, full_context, ctx=ctx)
         
-        # Jika jawaban berasal dari PDF, simpan ke SilverBullet
-        if context and "KONTEKS DARI MEMORY" in context:
-            # Cek apakah konteks dari PDF
-            pdf_results = collection.query(
-                query_texts=[user_input],
-                n_results=1,
-                where={"source": "pdf"}
-            )
+        # Jika jawaban berasal dari PDF (metadata passage yang dipakai), simpan ke SilverBullet
+        if context and ctx.has_source("pdf"):
+            # Generate judul dari pertanyaan
+            judul = "Hasil_" + slugify(user_input[:30])
+            sumber = "PDF"
+            if graph_context:
+                sumber += " + Knowledge Graph"
+            isi = f"**Pertanyaan:** {user_input}\n\n**Jawaban:**\n{answer}\n\n**Sumber:** {sumber}"
             
-            if pdf_results['ids'][0]:  # Ada hasil dari PDF
-                # Generate judul dari pertanyaan
-                judul = "Hasil_" + slugify(user_input[:30])
-                sumber = "PDF"
-                if graph_context:
-                    sumber += " + Knowledge Graph"
-                isi = f"**Pertanyaan:** {user_input}\n\n**Jawaban:**\n{answer}\n\n**Sumber:** {sumber}"
-                
-                simpan_ke_silverbullet(judul, isi)
-                return f"{answer}\n\n---\n*Jawaban juga disimpan di SilverBullet: {judul}.md*"
+            simpan_ke_silverbullet(judul, isi)
+            return f"{answer}\n\n---\n*Jawaban juga disimpan di SilverBullet: {judul}.md*"
         
         return answer
 
@@ -1190,12 +1391,16 @@ def main():
             print("Neo4j: Error connecting")
     else:
         print("Neo4j: Module not available")
+    states = ", ".join(f"{name} {info['state']}" for name, info in warmup.status().items())
+    print(f"Model: {states} (warm-up di background, cek: 'status model')")
     
     print("\n=== PERINTAH ===")
     print("\n📄 PDF & Memori:")
     print("  - 'Load pdf [file]'       -> Muat PDF + ekstrak entitas")
+    print("  - 'Load pdf all'          -> Muat semua PDF di documents/")
     print("  - 'List pdf'              -> Daftar file PDF")
     print("  - 'Tanya pdf [?]'         -> Tanya HANYA dari PDF")
+    print("  - 'Tanya pdf [file] halaman 3-5 [?]' -> Batasi file & halaman")
     print("  - 'Tampilkan semua'       -> List memori & notes")
     
     print("\n🔗 Knowledge Graph:")
@@ -1209,6 +1414,9 @@ def main():
     print("  - 'Import all [folder]'   -> Restore dari backup")
     print("  - 'Export db'             -> Ekspor ChromaDB saja (ZIP)")
     print("  - 'Import db [file]'      -> Impor ChromaDB saja")
+    print("  - 'Cache stats'           -> Statistik cache query & embedding")
+    print("  - 'Reset chat'            -> Mulai percakapan baru (hapus riwayat)")
+    print("  - 'Status model'          -> Cek apakah LLM & embedding sudah siap")
     
     print("\n🖥️ SilverBullet:")
     print("  - 'Tanya visual [?]'      -> Tanya & ketik di browser")
@@ -1228,7 +1436,12 @@ def main():
                 break
             
             response = process_input(user_input)
-            print(f"\nAgent: {response}\n")
+            streamed = take_streamed_answer()
+            if streamed and response.startswith(streamed):
+                # Jawaban sudah tercetak saat streaming; cetak tambahannya saja
+                print(f"{response[len(streamed):]}\n")
+            else:
+                print(f"\nAgent: {response}\n")
             
         except KeyboardInterrupt:
             print("\nBye!")
@@ -0,0 +1,226 @@
+"""
+chunker.py - Chunker Teks Berbasis Kalimat & Token
+==================================================
+Satu chunker untuk semua script (bot_super.py, web_ui.py, pdf_ingest.py).
+- Memecah di batas kalimat/paragraf, bukan di tengah kalimat
+- Ukuran chunk diukur dengan tokenizer model embedding (EMBEDDING_MODEL),
+  sehingga chunk tidak melebihi batas token model (256 untuk MiniLM)
+  dan tidak terpotong diam-diam saat di-embed
+- Berbentuk generator: input boleh berupa iterable (mis. teks per halaman),
+  dokumen besar tidak perlu digabung jadi satu string
+- Tiap chunk membawa nomor halaman + offset karakter asalnya
+"""
+import re
+import threading
+from bisect import bisect_right
+
+from config import EMBEDDING_MODEL, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS
+
+# Paragraf = dipisah baris kosong
+_PARA_BREAK = re.compile(r"\n\s*\n")
+# Akhir kalimat = tanda baca + spasi + awal kalimat baru (huruf besar/angka/kutip)
+_SENT_END = re.compile(r"[.!?]+[\"')\]]*\s+(?=[\"'(\[]?[A-Z0-9])")
+_WORD = re.compile(r"\w+|[^\w\s]")
+
+_tokenizer = None
+_tokenizer_loaded = False
+_tokenizer_lock = threading.Lock()
+
+
+def chunker_signature() -> str:
+    """Identitas konfigurasi chunker (disimpan di manifest ingestion)."""
+    return f"sentence-v2:{EMBEDDING_MODEL}:{CHUNK_MAX_TOKENS}:{CHUNK_OVERLAP_TOKENS}"
+
+
+def get_tokenizer():
+    """Tokenizer model embedding (lazy). None jika transformers tidak tersedia."""
+    global _tokenizer, _tokenizer_loaded
+    if _tokenizer_loaded:
+        return _tokenizer
+    with _tokenizer_lock:
+        if not _tokenizer_loaded:
+            try:
+                from transformers import AutoTokenizer
+                name = EMBEDDING_MODEL
+                if "/" not in name:
+                    name = f"sentence-transformers/{name}"
+                _tokenizer = AutoTokenizer.from_pretrained(name)
+            except Exception as e:
+                print(f">>> [CHUNKER] Tokenizer tidak tersedia ({e}), pakai estimasi token")
+                _tokenizer = None
+            _tokenizer_loaded = True
+    return _tokenizer
+
+
+def count_tokens(text: str) -> int:
+    """Jumlah token teks menurut tokenizer embedding (tanpa token spesial)."""
+    tokenizer = get_tokenizer()
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, add_special_tokens=False))
+    # Estimasi kasar WordPiece: kata panjang dipecah jadi beberapa sub-token
+    return sum(1 + len(w) // 8 for w in _WORD.findall(text))
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def iter_sentences(source):
+    """Yield (kalimat_mentah, akhir_paragraf, posisi_awal) dari string/iterable.
+
+    posisi_awal adalah offset karakter di teks gabungan (antar potongan
+    dipisah satu "\n"). Buffer hanya menyimpan sisa kalimat yang belum
+    selesai, bukan seluruh dokumen.
+    """
+    if isinstance(source, str):
+        source = [source]
+
+    buf = ""
+    buf_start = 0  # offset global karakter pertama buf
+    for piece in source:
+        buf += piece + "\n"
+
+        pos = 0
+        for match in _PARA_BREAK.finditer(buf):
+            yield from _sentence_spans(buf, pos, match.start(), buf_start, True)
+            pos = match.end()
+
+        # Keluarkan kalimat yang sudah lengkap dari paragraf yang belum selesai
+        last_end = pos
+        for match in _SENT_END.finditer(buf, pos):
+            yield from _sentence_spans(buf, last_end, match.end(), buf_start, False)
+            last_end = match.end()
+        buf_start += last_end
+        buf = buf[last_end:]
+
+    yield from _sentence_spans(buf, 0, len(buf), buf_start, True)
+
+
+def _sentence_spans(buf: str, start: int, end: int, base: int, para_end: bool):
+    """Pecah buf[start:end] jadi kalimat (teks mentah tanpa spasi tepi)."""
+    bounds = []
+    last = start
+    for match in _SENT_END.finditer(buf, start, end):
+        bounds.append((last, match.end()))
+        last = match.end()
+    bounds.append((last, end))
+
+    spans = []
+    for s, e in bounds:
+        raw = buf[s:e]
+        stripped = raw.strip()
+        if stripped:
+            offset = s + (len(raw) - len(raw.lstrip()))
+            spans.append((stripped, base + offset))
+    for i, (raw, offset) in enumerate(spans):
+        yield raw, para_end and i == len(spans) - 1, offset
+
+
+def _split_long(raw: str, offset: int, max_tokens: int):
+    """Pecah kalimat yang melebihi budget menjadi potongan per kata.
+
+    Yield (teks, jumlah_token, posisi_awal, posisi_akhir).
+    """
+    text = _normalize(raw)
+    n = count_tokens(text)
+    if n <= max_tokens:
+        yield text, n, offset, offset + len(raw)
+        return
+
+    words, total, w_start, w_end = [], 0, offset, offset
+    for match in re.finditer(r"\S+", raw):
+        word = match.group()
+        wn = count_tokens(word)
+        if words and total + wn > max_tokens:
+            yield " ".join(words), total, w_start, w_end
+            words, total = [], 0
+        if not words:
+            w_start = offset + match.start()
+        words.append(word)
+        total += wn
+        w_end = offset + match.end()
+    if words:
+        yield " ".join(words), total, w_start, w_end
+
+
+def _join(parts: list) -> str:
+    out = ""
+    for part in parts:
+        out += part["text"] + ("\n\n" if part["para_end"] else " ")
+    return out.strip()
+
+
+def _overlap_tail(parts: list, overlap_tokens: int) -> list:
+    """Ambil kalimat terakhir (total <= overlap_tokens) untuk awal chunk berikutnya."""
+    tail, total = [], 0
+    for part in reversed(parts[1:]):
+        if total + part["tokens"] > overlap_tokens:
+            break
+        tail.insert(0, dict(part, para_end=False))
+        total += part["tokens"]
+    return tail
+
+
+def iter_chunk_spans(source, max_tokens: int = CHUNK_MAX_TOKENS,
+                     overlap_tokens: int = CHUNK_OVERLAP_TOKENS):
+    """Generator chunk teks berbasis kalimat dengan budget token + posisi.
+
+    Args:
+        source: string atau iterable string (mis. teks per halaman PDF)
+        max_tokens: batas token per chunk (tokenizer embedding)
+        overlap_tokens: kalimat terakhir yang diulang di chunk berikutnya
+
+    Yield dict: text, tokens, page_start, page_end (mulai 1), char_start
+    (offset di halaman page_start) dan char_end (offset di halaman page_end).
+
+    Chunk ditutup lebih awal di akhir paragraf jika sudah >= setengah
+    budget, supaya satu chunk tidak mencampur dua paragraf tanpa perlu.
+    """
+    if isinstance(source, str):
+        source = [source]
+    page_starts = []  # offset global awal tiap halaman
+
+    def pages():
+        offset = 0
+        for piece in source:
+            page_starts.append(offset)
+            offset += len(piece) + 1
+            yield piece
+
+    def locate(offset: int) -> tuple:
+        page = bisect_right(page_starts, offset) - 1
+        return page + 1, offset - page_starts[page]
+
+    def emit(parts: list) -> dict:
+        page_start, char_start = locate(parts[0]["start"])
+        page_end, char_end = locate(max(parts[-1]["end"] - 1, parts[-1]["start"]))
+        return {
+            "text": _join(parts),
+            "tokens": sum(p["tokens"] for p in parts),
+            "page_start": page_start,
+            "page_end": page_end,
+            "char_start": char_start,
+            "char_end": char_end + 1,
+        }
+
+    current, total = [], 0
+    for raw, para_end, offset in iter_sentences(pages()):
+        for text, n, start, end in _split_long(raw, offset, max_tokens):
+            if current and total + n > max_tokens:
+                yield emit(current)
+                current = _overlap_tail(current, overlap_tokens)
+                total = sum(p["tokens"] for p in current)
+                if total + n > max_tokens:
+                    current, total = [], 0
+            current.append({"text": text, "tokens": n, "para_end": False,
+                            "start": start, "end": end})
+            total += n
+
+        if para_end and current:
+            current[-1]["para_end"] = True
+            if total >= max_tokens // 2:
+                yield emit(current)
+                current, total = [], 0
+
+    if current:
+        yield emit(current)
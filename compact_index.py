@@ -0,0 +1,420 @@
+"""
+compact_index.py - Index Vektor Ringkas (Kuantisasi + PCA)
+==========================================================
+Mode penyimpanan opsional (VECTOR_SEARCH_MODE = "compact"):
+- Embedding dari collection `agent_memory` disalin ke satu file .npz
+- Opsional direduksi dimensinya dengan PCA yang di-fit pada korpus
+- Dikuantisasi ke float16 atau int8 (skala per dimensi)
+- Pencarian brute-force di vektor ringkas, lalu (opsional) kandidat
+  teratas di-rescore dengan embedding float32 asli dari ChromaDB
+
+ChromaDB tetap menjadi sumber data; index ini dibangun ulang otomatis
+di background jika versi collection (vector_search.collection_version)
+berubah. Selama pembangunan ulang, query dilayani ChromaDB (HNSW) biasa.
+
+CLI:
+    python compact_index.py build           # bangun ulang index
+    python compact_index.py report [n]      # recall & latency vs collection
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from config import (
+    COMPACT_INDEX_PATH, COMPACT_QUANTIZATION, COMPACT_PCA_DIM,
+    COMPACT_RESCORE, COMPACT_RESCORE_FACTOR, EMBEDDING_MODEL
+)
+from vector_search import collection_version, matches_where
+
+_PAGE_SIZE = 5000  # Baris per collection.get saat membangun index
+_SCAN_BLOCK = 16384  # Baris yang di-dekuantisasi sekaligus saat mencari
+
+
+class CompactIndex:
+    """Vektor terkuantisasi (+ PCA opsional) untuk seluruh collection."""
+
+    def __init__(self, ids, metadatas, codes, scale, mean, components, norms,
+                 quantization, version, pca_dim: int = 0, embedding_model: str = None):
+        self.ids = list(ids)
+        self.metadatas = list(metadatas)
+        self.codes = codes              # (N, D') int8 / float16
+        self.scale = scale              # (D',) float32, hanya untuk int8
+        self.mean = mean                # (D,) float32 atau None (tanpa PCA)
+        self.components = components    # (D, D') float32 atau None
+        self.norms = norms              # (N,) ||x'||^2 hasil dekuantisasi
+        self.quantization = quantization
+        self.version = version          # versi collection saat dibangun
+        self.pca_dim = pca_dim          # COMPACT_PCA_DIM saat dibangun
+        self.embedding_model = embedding_model  # EMBEDDING_MODEL saat dibangun
+        self.columns = _metadata_columns(self.metadatas)  # Untuk filter where tanpa loop Python
+
+    # ------------------------------------------------------------------
+    # Build / save / load
+    # ------------------------------------------------------------------
+    @classmethod
+    def build(cls, collection, quantization: str = COMPACT_QUANTIZATION,
+              pca_dim: int = COMPACT_PCA_DIM):
+        """Salin embedding dari collection lalu fit PCA + kuantisasi."""
+        start = time.perf_counter()
+        version = collection_version()
+        count = collection.count()
+        ids, metadatas, vectors = [], [], []
+        for offset in range(0, count, _PAGE_SIZE):
+            page = collection.get(include=["embeddings", "metadatas"],
+                                  limit=_PAGE_SIZE, offset=offset)
+            ids += page["ids"]
+            metadatas += [m or {} for m in page["metadatas"]]
+            vectors.append(np.asarray(page["embeddings"], dtype=np.float32))
+        if not ids:
+            return None
+        full = np.vstack(vectors)
+
+        mean, components = None, None
+        if 0 < pca_dim < full.shape[1]:
+            mean = full.mean(axis=0)
+            centered = full - mean
+            # Eigen-dekomposisi kovarians (D x D) jauh lebih murah dari SVD N x D
+            eigvals, eigvecs = np.linalg.eigh(centered.T @ centered)
+            components = eigvecs[:, np.argsort(eigvals)[::-1][:pca_dim]].astype(np.float32)
+            full = centered @ components
+
+        codes, scale = cls._quantize(full, quantization)
+        index = cls(ids, metadatas, codes, scale, mean, components, None,
+                    quantization, version, pca_dim, EMBEDDING_MODEL)
+        index.norms = np.concatenate([
+            np.einsum("ij,ij->i", block, block) for block in index._blocks()
+        ])
+        print(f">>> [COMPACT] Index {quantization}"
+              f"{f' + PCA {components.shape[1]}' if components is not None else ''}: "
+              f"{len(ids)} vektor, {index.nbytes() / 1024 / 1024:.1f} MB "
+              f"({time.perf_counter() - start:.2f}s)")
+        return index
+
+    @staticmethod
+    def _quantize(vectors: np.ndarray, quantization: str):
+        if quantization == "int8":
+            scale = np.abs(vectors).max(axis=0) / 127
+            scale[scale == 0] = 1.0
+            codes = np.clip(np.round(vectors / scale), -127, 127).astype(np.int8)
+            return codes, scale.astype(np.float32)
+        if quantization == "float16":
+            return vectors.astype(np.float16), None
+        raise ValueError(f"Kuantisasi tidak dikenal: {quantization}")
+
+    def save(self, path=COMPACT_INDEX_PATH):
+        tmp = path.with_name(path.name + ".tmp")
+        arrays = {
+            "codes": self.codes,
+            "norms": self.norms,
+            "ids": np.array(json.dumps(self.ids)),
+            "metadatas": np.array(json.dumps(self.metadatas)),
+            "info": np.array(json.dumps({"quantization": self.quantization,
+                                         "version": self.version,
+                                         "pca_dim": self.pca_dim,
+                                         "embedding_model": self.embedding_model})),
+        }
+        if self.scale is not None:
+            arrays["scale"] = self.scale
+        if self.components is not None:
+            arrays["mean"] = self.mean
+            arrays["components"] = self.components
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=COMPACT_INDEX_PATH):
+        with np.load(path) as data:
+            info = json.loads(str(data["info"]))
+            return cls(
+                ids=json.loads(str(data["ids"])),
+                metadatas=json.loads(str(data["metadatas"])),
+                codes=data["codes"],
+                scale=data["scale"] if "scale" in data else None,
+                mean=data["mean"] if "mean" in data else None,
+                components=data["components"] if "components" in data else None,
+                norms=data["norms"],
+                quantization=info["quantization"],
+                version=info.get("version", -1),
+                pca_dim=info.get("pca_dim"),
+                embedding_model=info.get("embedding_model"),
+            )
+
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.norms.nbytes
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+    def _blocks(self):
+        """Yield blok vektor float32 hasil dekuantisasi."""
+        for i in range(0, len(self.codes), _SCAN_BLOCK):
+            block = self.codes[i:i + _SCAN_BLOCK].astype(np.float32)
+            if self.scale is not None:
+                block *= self.scale
+            yield block
+
+    def project(self, vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        if self.components is not None:
+            vector = (vector - self.mean) @ self.components
+        return vector
+
+    def where_mask(self, where: dict) -> np.ndarray:
+        """Filter `where` gaya ChromaDB sebagai mask boolean (N,), dihitung per kolom."""
+        mask = np.ones(len(self.ids), dtype=bool)
+        for key, cond in where.items():
+            if key == "$and":
+                for sub in cond:
+                    mask &= self.where_mask(sub)
+            elif key == "$or":
+                mask &= np.logical_or.reduce([self.where_mask(sub) for sub in cond])
+            else:
+                for op, target in (cond.items() if isinstance(cond, dict) else [("$eq", cond)]):
+                    mask &= self._column_mask(key, op, target)
+        return mask
+
+    def _column_mask(self, key: str, op: str, target) -> np.ndarray:
+        n = len(self.ids)
+        if key not in self.columns:  # Field tidak ada di metadata mana pun (nilai None)
+            return np.full(n, matches_where({}, {key: {op: target}}))
+        values, numbers = self.columns[key]
+        if op == "$eq":
+            return values == target
+        if op == "$ne":
+            return values != target
+        if op in ("$in", "$nin"):
+            hit = np.logical_or.reduce([values == t for t in target]) if target else np.zeros(n, bool)
+            return hit if op == "$in" else ~hit
+        if numbers is not None and isinstance(target, (int, float)):
+            # NaN (field kosong) selalu False, sama seperti matches_where
+            return {"$gt": np.greater, "$gte": np.greater_equal,
+                    "$lt": np.less, "$lte": np.less_equal}[op](numbers, target)
+        return np.fromiter((matches_where({key: v}, {key: {op: target}}) for v in values),
+                           dtype=bool, count=n)
+
+    def search(self, query_vector, n_results: int, where: dict = None,
+               collection=None, rescore: bool = COMPACT_RESCORE) -> tuple:
+        """Cari n_results terdekat. Returns (ids, distances) terurut.
+
+        Jarak = L2 kuadrat (sama dengan default ChromaDB). Jika rescore dan
+        collection diberikan, kandidat teratas dihitung ulang dengan
+        embedding float32 asli.
+        """
+        q = self.project(query_vector)
+        # ||q - x||^2 = ||q||^2 - 2 q.x + ||x||^2 ; q.(c*s) = (q*s).c untuk int8
+        q_scaled = q * self.scale if self.scale is not None else q
+        dots = np.concatenate([
+            self.codes[i:i + _SCAN_BLOCK].astype(np.float32) @ q_scaled
+            for i in range(0, len(self.codes), _SCAN_BLOCK)
+        ])
+        distances = float(q @ q) - 2 * dots + self.norms
+
+        if where:
+            distances = np.where(self.where_mask(where), distances, np.inf)
+
+        n_candidates = n_results * COMPACT_RESCORE_FACTOR if rescore and collection is not None else n_results
+        n_candidates = min(n_candidates, len(distances))
+        if n_candidates == 0:
+            return [], []
+        top = np.argpartition(distances, n_candidates - 1)[:n_candidates]
+        top = top[np.isfinite(distances[top])]
+        top = top[np.argsort(distances[top])]
+        ids = [self.ids[i] for i in top]
+
+        if rescore and collection is not None and ids:
+            stored = collection.get(ids=ids, include=["embeddings"])
+            full = np.asarray(stored["embeddings"], dtype=np.float32)
+            diff = full - np.asarray(query_vector, dtype=np.float32)
+            exact = dict(zip(stored["ids"], np.einsum("ij,ij->i", diff, diff)))
+            ids = sorted(exact, key=exact.get)[:n_results]
+            return ids, [float(exact[i]) for i in ids]
+
+        return ids[:n_results], [float(distances[i]) for i in top[:n_results]]
+
+
+def _metadata_columns(metadatas: list) -> dict:
+    """{field: (nilai object array, float64 array atau None)} dari list metadata.
+
+    Kolom float (NaN = kosong) hanya dibuat jika semua nilai field itu angka;
+    dipakai untuk filter $gt/$gte/$lt/$lte (mis. page_start / page_end).
+    """
+    columns = {}
+    for key in {key for meta in metadatas for key in meta}:
+        raw = [meta.get(key) for meta in metadatas]
+        values = np.empty(len(raw), dtype=object)
+        values[:] = raw
+        numbers = None
+        if all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool))
+               for v in raw):
+            numbers = np.array([np.nan if v is None else v for v in raw], dtype=np.float64)
+        columns[key] = (values, numbers)
+    return columns
+
+
+_index = None
+_index_lock = threading.Lock()
+_rebuilding = None  # Thread pembangunan ulang di background (None = tidak ada)
+
+
+def _load_saved(version):
+    """Index dari disk jika masih sesuai versi collection & config, atau None."""
+    if not COMPACT_INDEX_PATH.exists():
+        return None
+    try:
+        loaded = CompactIndex.load()
+        if (loaded.version == version and loaded.quantization == COMPACT_QUANTIZATION
+                and loaded.pca_dim == COMPACT_PCA_DIM
+                and loaded.embedding_model == EMBEDDING_MODEL):
+            return loaded
+    except Exception as e:
+        print(f">>> [COMPACT] Gagal load index ({e}), bangun ulang")
+    return None
+
+
+def _rebuild(collection):
+    global _index, _rebuilding
+    try:
+        index = CompactIndex.build(collection)
+        if index is not None:
+            index.save()
+        with _index_lock:
+            _index = index
+    except Exception as e:
+        print(f">>> [COMPACT] Gagal bangun ulang index: {e}")
+    finally:
+        with _index_lock:
+            _rebuilding = None
+
+
+def get_compact_index(collection, wait: bool = True):
+    """Index ringkas yang sesuai isi collection (load/bangun ulang bila perlu).
+
+    wait=False (dipakai jalur query): jika index basi, pembangunan ulang
+    dijalankan di background dan langsung mengembalikan None, sehingga
+    pemanggil memakai query ChromaDB (HNSW) sampai index baru siap.
+    """
+    global _index, _rebuilding
+    with _index_lock:
+        version = collection_version()
+        if _index is not None and _index.version == version:
+            return _index
+        rebuilding = _rebuilding
+        if rebuilding is None:
+            loaded = _load_saved(version)
+            if loaded is not None:
+                _index = loaded
+                return _index
+            if wait:
+                _index = CompactIndex.build(collection)
+                if _index is not None:
+                    _index.save()
+                return _index
+            print(">>> [COMPACT] Index basi, dibangun ulang di background (sementara pakai HNSW)")
+            _rebuilding = threading.Thread(target=_rebuild, args=(collection,),
+                                           daemon=True, name="compact-rebuild")
+            _rebuilding.start()
+            return None
+    if wait:
+        rebuilding.join()
+        return get_compact_index(collection, wait)
+    return None
+
+
+def query_compact(collection, embedding_fn, query: str, n_results: int,
+                  where: dict = None, include_embeddings: bool = False, query_vector=None):
+    """Seperti collection.query (1 query), tapi lewat index ringkas.
+
+    Returns dict format ChromaDB, atau None jika index tidak tersedia atau
+    sedang dibangun ulang (pemanggil kembali ke collection.query).
+    """
+    index = get_compact_index(collection, wait=False)
+    if index is None:
+        return None
+    if query_vector is None:
+        query_vector = embedding_fn([query])[0]
+    ids, distances = index.search(query_vector, n_results, where, collection)
+    if (collection.metadata or {}).get("hnsw:space", "l2") != "l2":
+        # Samakan skala dengan ChromaDB: embedding ternormalisasi -> 1 - cos = L2^2 / 2
+        distances = [d / 2 for d in distances]
+    keys = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+    if not ids:
+        return {"ids": [[]], "distances": [[]], **{key: [[]] for key in keys}}
+    stored = collection.get(ids=ids, include=keys)
+    position = {doc_id: i for i, doc_id in enumerate(stored["ids"])}
+    found = [(doc_id, d) for doc_id, d in zip(ids, distances) if doc_id in position]
+    results = {"ids": [[doc_id for doc_id, _ in found]],
+               "distances": [[d for _, d in found]]}
+    for key in keys:
+        results[key] = [[stored[key][position[doc_id]] for doc_id, _ in found]]
+    return results
+
+
+def recall_report(collection, embedding_fn, queries: list = None, n_queries: int = 50,
+                  k: int = 5) -> str:
+    """Bandingkan index ringkas dengan collection.query (HNSW float32)."""
+    if queries is None:
+        sample = collection.get(include=["documents"], limit=n_queries)
+        queries = [" ".join(doc.split()[:30]) for doc in sample["documents"] if doc]
+    if not queries:
+        return "[ERROR] Collection kosong, tidak ada query untuk dibandingkan."
+
+    index = get_compact_index(collection)
+    k = min(k, collection.count())
+    rows = []
+    for label, rescore in (("compact", False), ("compact+rescore", True)):
+        recalls, base_ms, compact_ms = [], [], []
+        for query in queries:
+            query_vector = embedding_fn([query])[0]
+            t0 = time.perf_counter()
+            base = collection.query(query_embeddings=[query_vector], n_results=k)["ids"][0]
+            t1 = time.perf_counter()
+            ids, _ = index.search(query_vector, k, collection=collection, rescore=rescore)
+            t2 = time.perf_counter()
+            recalls.append(len(set(base) & set(ids)) / max(1, len(base)))
+            base_ms.append((t1 - t0) * 1000)
+            compact_ms.append((t2 - t1) * 1000)
+        rows.append((label, np.mean(recalls), np.mean(base_ms), np.percentile(base_ms, 95),
+                     np.mean(compact_ms), np.percentile(compact_ms, 95)))
+
+    dim = index.codes.shape[1]
+    full_mb = len(index.ids) * (index.components.shape[0] if index.components is not None else dim) * 4 / 1024 / 1024
+    output = (f"RECALL/LATENCY REPORT ({len(queries)} query, k={k}, {len(index.ids)} vektor)\n"
+              f"Index: {index.quantization}, dim {dim}, {index.nbytes() / 1024 / 1024:.1f} MB "
+              f"(float32 penuh: {full_mb:.1f} MB)\n")
+    for label, recall, b_mean, b_p95, c_mean, c_p95 in rows:
+        output += (f"- {label:<16} recall@{k}: {recall:.3f} | collection {b_mean:.1f}ms "
+                   f"(p95 {b_p95:.1f}) | compact {c_mean:.1f}ms (p95 {c_p95:.1f})\n")
+    return output
+
+
+def main():
+    import chromadb
+    from config import CHROMA_DB_PATH
+    from embeddings import get_embedding_function
+    from sharded_collection import open_collection
+
+    embedding_fn = get_embedding_function()
+    client = chromadb.PersistentClient(path=str(CHROMA_DB_PATH))
+    collection = open_collection(client, embedding_fn)
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    if command == "build":
+        index = CompactIndex.build(collection)
+        if index is not None:
+            index.save()
+            print(f"[OK] Index disimpan: {COMPACT_INDEX_PATH}")
+        else:
+            print("[ERROR] Collection kosong.")
+    elif command == "report":
+        n = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+        print(recall_report(collection, embedding_fn, n_queries=n))
+    else:
+        print(__doc__)
+
+
+if __name__ == "__main__":
+    main()
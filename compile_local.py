@@ -43,7 +43,22 @@ def compile_project():
         "bot_silverbullet.py",
         "bot_rag.py",
         "bot_super.py",
-        "neo4j_graph.py"
+        "neo4j_graph.py",
+        "pdf_ingest.py",
+        "chunker.py",
+        "embeddings.py",
+        "embedding_server.py",
+        "compact_index.py",
+        "vector_search.py",
+        "bm25_index.py",
+        "reranker.py",
+        "retrieval.py",
+        "context_packer.py",
+        "sharded_collection.py",
+        "hnsw_sweep.py",
+        "llm_client.py",
+        "answer_cache.py",
+        "warmup.py"
     ]
     
     import py_compile
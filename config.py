@@ -13,6 +13,31 @@ OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1:8b")
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434/v1")  # Untuk AutoGen (OpenAI-compatible)
 OLLAMA_API_URL = os.getenv("OLLAMA_API_URL", "http://localhost:11434")  # Untuk API native Ollama
 
+# Jawaban LLM ditampilkan sambil ditulis (stream NDJSON Ollama) di CLI & web UI
+LLM_STREAM = os.getenv("LLM_STREAM", "true").lower() == "true"
+# Semua panggilan Ollama lewat llm_client.py (satu session + connection pool per proses)
+LLM_CONNECT_TIMEOUT = 10  # Detik untuk membuka koneksi ke Ollama
+LLM_READ_TIMEOUT = int(os.getenv("LLM_READ_TIMEOUT", "300"))  # Detik maks menunggu respons / potongan stream berikutnya
+LLM_POOL_SIZE = 8  # Koneksi HTTP ke Ollama yang disimpan untuk dipakai ulang
+LLM_CONNECT_RETRIES = 2  # Retry hanya jika koneksi gagal dibuka (request belum terkirim)
+# Antrian FIFO ke Ollama: generate yang berjalan bersamaan & yang boleh menunggu.
+# Jika antrian penuh, user langsung dapat pesan "sibuk, posisi N" (bukan timeout)
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", "1"))  # Samakan dengan OLLAMA_NUM_PARALLEL
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "8"))
+# Model tetap dimuat di antara pertanyaan; num_ctx sama di semua request agar tidak reload
+LLM_KEEP_ALIVE = os.getenv("LLM_KEEP_ALIVE", "30m")  # Durasi Ollama ("-1" = selamanya)
+# Panjang konteks model (0 = bawaan Ollama, num_ctx tidak dikirim). Naikkan (mis. 8192)
+# jika konteks RAG + riwayat chat terpotong; makin besar makin banyak RAM/VRAM
+LLM_NUM_CTX = int(os.getenv("LLM_NUM_CTX", "0"))
+# Mode percakapan (/api/chat): riwayat ikut dikirim, prefix yang sama dipakai ulang oleh Ollama
+LLM_CHAT_MODE = os.getenv("LLM_CHAT_MODE", "false").lower() == "true"  # Opt-in
+LLM_CHAT_HISTORY_TOKENS = int(os.getenv("LLM_CHAT_HISTORY_TOKENS", "4096"))  # Riwayat maks sebelum dipangkas
+LLM_SYSTEM_PROMPT = (
+    "Kamu adalah asisten yang menjawab berdasarkan konteks yang diberikan "
+    "(dokumen PDF, memory, knowledge graph). Jika informasinya tidak ada di "
+    "konteks, katakan tidak tahu. Jawab dalam bahasa yang dipakai penanya."
+)
+
 # LLM Config untuk AutoGen
 LLM_CONFIG = {
     "config_list": [{
@@ -62,6 +87,91 @@ BROWSER_VIEWPORT = {"width": 1280, "height": 800}
 # ==============================================================================
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"  # Model untuk embedding (sentence-transformers)
 RAG_TOP_K = 3  # Jumlah dokumen yang diambil saat pencarian
+CHUNK_MAX_TOKENS = 240  # Budget token per chunk (MiniLM maks 256 termasuk [CLS]/[SEP])
+CHUNK_OVERLAP_TOKENS = 40  # Kalimat terakhir yang diulang di chunk berikutnya
+
+# Cache embedding di disk (key: model + sha256 teks), dipakai ulang saat re-ingest/import
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE", "true").lower() == "true"
+EMBEDDING_CACHE_DIR = CODING_OUTPUT_DIR / "embedding_cache"
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))  # ~300MB untuk dim 384
+
+# "local" = tiap script memuat model sendiri, "server" = pakai embedding_server.py (model dimuat sekali)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "local").lower()
+EMBEDDING_SERVER_HOST = os.getenv("EMBEDDING_SERVER_HOST", "127.0.0.1")
+EMBEDDING_SERVER_PORT = int(os.getenv("EMBEDDING_SERVER_PORT", "8765"))
+EMBEDDING_SERVER_MAX_BATCH = 64  # Teks maks per panggilan model
+EMBEDDING_SERVER_MAX_WAIT_MS = 10  # Waktu tunggu untuk menggabungkan request
+
+# "full" = query HNSW ChromaDB (float32), "compact" = index terkuantisasi (compact_index.py)
+VECTOR_SEARCH_MODE = os.getenv("VECTOR_SEARCH_MODE", "full").lower()
+COMPACT_QUANTIZATION = os.getenv("COMPACT_QUANTIZATION", "int8")  # "int8" atau "float16"
+COMPACT_PCA_DIM = int(os.getenv("COMPACT_PCA_DIM", "0"))  # 0 = tanpa PCA, mis. 128 untuk MiniLM (384)
+COMPACT_RESCORE = True  # Hitung ulang kandidat teratas dengan embedding float32 asli
+COMPACT_RESCORE_FACTOR = 4  # Jumlah kandidat rescore = top_k x faktor ini
+COMPACT_INDEX_PATH = CODING_OUTPUT_DIR / "compact_index.npz"
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "256"))  # Hasil query yang di-cache (0 = nonaktif)
+# Versi isi collection, naik setiap simpan/ingest/import/reset (di luar chroma_db agar tidak ikut ter-import)
+COLLECTION_VERSION_PATH = CODING_OUTPUT_DIR / "collection_version"
+
+# Cache jawaban LLM (answer_cache.py): pertanyaan mirip + konteks sama = jawaban dipakai ulang
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "true").lower() == "true"
+ANSWER_CACHE_PATH = CODING_OUTPUT_DIR / "answer_cache.sqlite"
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.92"))  # Cosine minimal antar pertanyaan
+ANSWER_CACHE_TTL_HOURS = float(os.getenv("ANSWER_CACHE_TTL_HOURS", "168"))  # Umur maks jawaban (7 hari)
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000"))
+
+# Collection per sumber (sharded_collection.py): PDF & memory user di collection terpisah
+COLLECTION_NAME = "agent_memory"
+# Opt-in; database lama dipindahkan dengan: python sharded_collection.py migrate
+COLLECTION_SHARDING = os.getenv("COLLECTION_SHARDING", "false").lower() == "true"
+COLLECTION_SHARDS = ("pdf", "memory")  # Nama collection: agent_memory_<shard>; terakhir = default
+
+# Parameter HNSW untuk collection BARU (yang sudah ada tetap; ukur dulu dengan: python hnsw_sweep.py)
+HNSW_SPACE = os.getenv("HNSW_SPACE", "l2")  # "l2", "cosine" atau "ip"
+HNSW_M = int(os.getenv("HNSW_M", "16"))  # Tetangga per node: makin besar makin akurat & besar
+HNSW_CONSTRUCTION_EF = int(os.getenv("HNSW_CONSTRUCTION_EF", "100"))  # Kualitas graph saat build
+HNSW_SEARCH_EF = int(os.getenv("HNSW_SEARCH_EF", "10"))  # Kandidat saat query: recall vs latency
+
+# Hybrid search: BM25 (kata persis, nama model/versi) + vektor, digabung dengan Reciprocal Rank Fusion
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+HYBRID_CANDIDATES = 20  # Kandidat dari tiap sisi sebelum digabung
+RRF_K = 60  # Konstanta RRF (makin besar, makin rata bobot antar peringkat)
+BM25_K1 = 1.5
+BM25_B = 0.75
+BM25_MAX_DF_RATIO = 0.5  # Term yang ada di > 50% dokumen dianggap stopword
+BM25_INDEX_PATH = CODING_OUTPUT_DIR / "bm25_index.sqlite"
+
+# Rerank opsional: ambil banyak kandidat lalu pilih top_k dengan cross-encoder (butuh sentence-transformers)
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = 30  # Kandidat yang dinilai ulang dalam satu batch
+RERANK_TIME_BUDGET_MS = int(os.getenv("RERANK_TIME_BUDGET_MS", "800"))  # Lewat batas ini, pakai urutan vektor
+
+# Penyusunan konteks (context_packer.py): MMR + buang duplikat + batas token prompt
+CONTEXT_PACKING = os.getenv("CONTEXT_PACKING", "true").lower() == "true"
+CONTEXT_CANDIDATES = 12  # Kandidat yang diambil sebelum dipilih MMR
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "1500"))  # Budget konteks (token tokenizer embedding)
+CONTEXT_MAX_DISTANCE = 1.5  # Jarak L2^2 maks (embedding ternormalisasi: 1.5 ~ cosine 0.25; otomatis disesuaikan untuk hnsw:space collection lain)
+CONTEXT_MMR_LAMBDA = 0.7  # 1.0 = relevansi saja, makin kecil makin beragam
+CONTEXT_NEIGHBOR_CHUNKS = int(os.getenv("CONTEXT_NEIGHBOR_CHUNKS", "0"))  # Tambah N chunk PDF sebelum/sesudah hit (0 = nonaktif)
+
+# Timeout per sumber saat ChromaDB & Neo4j dicari paralel (detik); yang lewat batas dilewati
+RETRIEVAL_TIMEOUTS = {
+    "chroma": float(os.getenv("RETRIEVAL_TIMEOUT_CHROMA", "15")),
+    "graph": float(os.getenv("RETRIEVAL_TIMEOUT_GRAPH", "3")),
+    "default": 10.0,
+}
+
+# ==============================================================================
+# INGESTION (PDF -> ChromaDB)
+# ==============================================================================
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "128"))  # Chunks per collection.add (1x encode per batch)
+# Jumlah proses untuk ekstraksi teks PDF (1 = single-process, 0 = otomatis sesuai CPU).
+# Worker dibuat via forkserver/spawn (bukan fork), lihat pdf_ingest.py
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "0"))
+PDF_PARALLEL_MIN_PAGES = 16  # PDF lebih kecil dari ini diekstrak tanpa process pool
+INGEST_MANIFEST_PATH = CHROMA_DB_PATH / "ingest_manifest.json"  # Ikut ter-export bersama database
 
 # ==============================================================================
 # DEBUG
@@ -0,0 +1,233 @@
+"""
+context_packer.py - Menyusun Konteks untuk Prompt LLM
+=====================================================
+Hasil retrieval tidak langsung ditempel ke prompt. Dari kandidat yang
+sudah kembali (beserta embedding-nya):
+- Hit dengan jarak vektor > CONTEXT_MAX_DISTANCE dibuang (hit yang hanya
+  ditemukan BM25 tidak punya jarak dan tetap dipakai)
+- Urutan dipilih dengan MMR (Maximal Marginal Relevance) secara vektor
+  numpy, sehingga chunk yang isinya mirip satu sama lain tidak menumpuk
+- Kalimat yang sudah muncul di passage sebelumnya (overlap antar chunk)
+  tidak diulang
+- Opsional (CONTEXT_NEIGHBOR_CHUNKS = N): hit PDF diperluas dengan N chunk
+  sebelum & sesudahnya (urutan dari manifest ingestion), diambil dengan
+  satu collection.get lalu digabung jadi passage yang bersambung
+- Passage diisi sampai CONTEXT_MAX_TOKENS, jadi jumlah passage (k)
+  menyesuaikan panjangnya dan waktu prefill prompt tetap stabil meski
+  corpus bertambah besar
+"""
+import numpy as np
+
+from chunker import count_tokens, iter_sentences
+from config import (
+    CONTEXT_PACKING, CONTEXT_CANDIDATES, CONTEXT_MAX_TOKENS, CONTEXT_MAX_DISTANCE,
+    CONTEXT_MMR_LAMBDA, CONTEXT_NEIGHBOR_CHUNKS, INGEST_MANIFEST_PATH
+)
+from vector_search import query_collection, select_results
+
+_manifest_cache = {"key": None, "chunk_ids": {}}
+
+
+def mmr_order(query_vector, embeddings, mmr_lambda: float = CONTEXT_MMR_LAMBDA) -> list:
+    """Urutan index kandidat menurut MMR (relevansi vs kemiripan dengan yang sudah dipilih)."""
+    matrix = np.array(embeddings, dtype=np.float32)
+    matrix = matrix / (np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12)
+    query = np.array(query_vector, dtype=np.float32)
+    query = query / (np.linalg.norm(query) + 1e-12)  # Jangan ubah ctx.vector milik pemanggil
+
+    relevance = matrix @ query
+    similarity = matrix @ matrix.T
+    max_similarity = np.full(len(matrix), -np.inf, dtype=np.float32)
+    remaining = np.ones(len(matrix), dtype=bool)
+
+    order = []
+    for _ in range(len(matrix)):
+        redundancy = np.where(np.isinf(max_similarity), 0.0, max_similarity)
+        scores = mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+        scores[~remaining] = -np.inf
+        best = int(np.argmax(scores))
+        order.append(best)
+        remaining[best] = False
+        max_similarity = np.maximum(max_similarity, similarity[:, best])
+    return order
+
+
+def _sentence_key(sentence: str) -> str:
+    return " ".join(sentence.lower().split())
+
+
+def pack_results(query_vector, results: dict, max_tokens: int = CONTEXT_MAX_TOKENS,
+                 max_distance: float = CONTEXT_MAX_DISTANCE,
+                 mmr_lambda: float = CONTEXT_MMR_LAMBDA, space: str = "l2") -> list:
+    """Pilih & rapikan passage dari hasil query (format collection.query, 1 query).
+
+    space: metrik HNSW collection asal hasil query ("hnsw:space").
+    Returns list dict {id, text, metadata, distance, tokens} sesuai urutan MMR.
+    """
+    ids = results["ids"][0]
+    documents = results["documents"][0]
+    metadatas = results.get("metadatas")
+    metadatas = metadatas[0] if metadatas is not None else [None] * len(ids)
+    distances = results.get("distances")
+    distances = distances[0] if distances is not None else [None] * len(ids)
+    embeddings = results.get("embeddings")
+    embeddings = embeddings[0] if embeddings is not None else None
+
+    if space != "l2":
+        max_distance /= 2  # Batas ditulis dalam L2^2; jarak cosine/ip = L2^2 / 2
+    keep = [i for i in range(len(ids))
+            if documents[i] and (distances[i] is None or distances[i] <= max_distance)]
+    if not keep:
+        return []
+    if embeddings is not None and query_vector is not None and len(keep) > 1:
+        order = [keep[i] for i in mmr_order(query_vector, [embeddings[i] for i in keep],
+                                            mmr_lambda)]
+    else:
+        order = keep
+
+    passages, seen, used = [], set(), 0
+    for i in order:
+        parts = []
+        for sentence, para_end, _ in iter_sentences(documents[i]):
+            key = _sentence_key(sentence)
+            if key in seen:
+                continue
+            tokens = count_tokens(sentence)
+            if used + tokens > max_tokens:
+                break
+            seen.add(key)
+            used += tokens
+            parts.append(sentence + ("\n" if para_end else " "))
+        if parts:
+            text = "".join(parts).strip()
+            passages.append({
+                "id": ids[i],
+                "text": text,
+                "metadata": metadatas[i] or {},
+                "distance": distances[i],
+                "tokens": count_tokens(text),
+            })
+        if used >= max_tokens:
+            break
+    return passages
+
+
+def _manifest_chunk_ids() -> dict:
+    """{filename: [id chunk 1, chunk 2, ...]} dari manifest (dibaca ulang jika file berubah)."""
+    try:
+        stat = INGEST_MANIFEST_PATH.stat()
+        key = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return {}
+    if _manifest_cache["key"] != key:
+        from pdf_ingest import load_manifest
+        _manifest_cache["chunk_ids"] = {
+            name: entry["chunk_ids"] for name, entry in load_manifest().items()
+            if entry.get("chunk_ids")
+        }
+        _manifest_cache["key"] = key
+    return _manifest_cache["chunk_ids"]
+
+
+def expand_neighbors(collection, results: dict, window: int = CONTEXT_NEIGHBOR_CHUNKS) -> dict:
+    """Perluas hit PDF dengan `window` chunk di kiri-kanannya.
+
+    Chunk yang bersambung (dari hit berbeda maupun tetangganya) digabung
+    jadi satu passage; passage memakai id/jarak/embedding hit terbaiknya.
+    Hit non-PDF atau file tanpa manifest dibiarkan apa adanya.
+    Returns dict format collection.query (1 query).
+    """
+    if window <= 0 or not results["ids"][0]:
+        return results
+    chunk_ids = _manifest_chunk_ids()
+    metadatas = results["metadatas"][0]
+
+    # Rentang chunk (0-based) yang dibutuhkan per file
+    wanted = {}  # filename -> {posisi: rank hit terdekat}
+    centers = {}  # filename -> {posisi chunk hit: rank}
+    for rank, meta in enumerate(metadatas):
+        meta = meta or {}
+        ids_in_file = chunk_ids.get(meta.get("filename"))
+        if meta.get("source") != "pdf" or not ids_in_file or not meta.get("chunk"):
+            continue
+        center = meta["chunk"] - 1
+        centers.setdefault(meta["filename"], {})[center] = rank
+        positions = wanted.setdefault(meta["filename"], {})
+        for pos in range(max(0, center - window), min(len(ids_in_file), center + window + 1)):
+            positions.setdefault(pos, rank)
+    if not wanted:
+        return results
+
+    fetch = [chunk_ids[name][pos] for name, positions in wanted.items() for pos in positions]
+    stored = collection.get(ids=fetch, include=["documents", "metadatas"])
+    by_id = dict(zip(stored["ids"], zip(stored["documents"], stored["metadatas"])))
+
+    # Gabungkan posisi yang bersambung jadi satu passage, diwakili hit ber-rank terbaik
+    merged = {}  # rank wakil -> (teks, metadata)
+    covered = set()
+    for name, positions in wanted.items():
+        runs = []
+        for pos in sorted(positions):
+            if runs and pos == runs[-1][-1] + 1:
+                runs[-1].append(pos)
+            else:
+                runs.append([pos])
+        for run in runs:
+            parts = [by_id[chunk_ids[name][p]] for p in run if chunk_ids[name][p] in by_id]
+            if not parts:
+                continue
+            rank = min(positions[p] for p in run)
+            meta = dict(metadatas[rank])
+            meta.update({
+                "chunk_start": run[0] + 1,
+                "chunk_end": run[-1] + 1,
+                "page_start": min(m.get("page_start", meta.get("page_start")) for _, m in parts),
+                "page_end": max(m.get("page_end", meta.get("page_end")) for _, m in parts),
+            })
+            merged[rank] = ("\n".join(doc for doc, _ in parts), meta)
+            # Semua hit yang chunk-nya masuk run ini ikut terwakili (termasuk hit
+            # yang semua posisinya sudah diklaim hit lebih baik)
+            covered.update(centers[name][p] for p in run if p in centers[name])
+
+    order = [rank for rank in range(len(metadatas)) if rank in merged or rank not in covered]
+    expanded = select_results(results, order)
+    expanded["documents"] = [[merged[r][0] if r in merged else results["documents"][0][r]
+                              for r in order]]
+    expanded["metadatas"] = [[merged[r][1] if r in merged else metadatas[r] for r in order]]
+    print(f">>> [CONTEXT] {len(metadatas)} hit -> {len(order)} passage bersambung "
+          f"({len(fetch)} chunk diambil)")
+    return expanded
+
+
+def retrieve_passages(collection, embedding_fn, query: str, top_k: int,
+                      where: dict = None, query_vector=None) -> list:
+    """Query + susun konteks. Jika CONTEXT_PACKING nonaktif, top_k hasil apa adanya.
+
+    query_vector: embedding `query` jika sudah dihitung (lihat retrieval.RequestContext).
+    """
+    count = collection.count()
+    if count == 0:
+        return []
+    if query_vector is None:
+        query_vector = embedding_fn([query])[0]
+    if not CONTEXT_PACKING:
+        results = query_collection(collection, embedding_fn, query,
+                                   n_results=min(top_k, count), where=where,
+                                   query_vector=query_vector)
+        return [{"id": doc_id, "text": doc, "metadata": meta or {}, "distance": None,
+                 "tokens": None}
+                for doc_id, doc, meta in zip(results["ids"][0], results["documents"][0],
+                                             results["metadatas"][0])]
+
+    results = query_collection(collection, embedding_fn, query,
+                               n_results=min(max(top_k, CONTEXT_CANDIDATES), count),
+                               where=where, include_embeddings=True,
+                               query_vector=query_vector)
+    if not results["ids"][0]:
+        return []
+    results = expand_neighbors(collection, results)
+    space = (collection.metadata or {}).get("hnsw:space", "l2")
+    passages = pack_results(query_vector, results, space=space)
+    print(f">>> [CONTEXT] {len(results['ids'][0])} kandidat -> {len(passages)} passage, "
+          f"{sum(p['tokens'] for p in passages)} token")
+    return passages
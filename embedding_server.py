@@ -0,0 +1,153 @@
+"""
+embedding_server.py - Server Embedding Lokal (Shared)
+=====================================================
+Memuat EMBEDDING_MODEL satu kali dan melayani semua script (bot_super.py,
+bot_rag.py, web_ui.py) lewat HTTP di localhost, sehingga tiap proses tidak
+perlu memuat model sendiri.
+
+Request dari banyak client digabung (micro-batching): request yang datang
+dalam EMBEDDING_SERVER_MAX_WAIT_MS di-encode dalam satu panggilan model.
+
+Aktifkan di config.py / env:  EMBEDDING_BACKEND=server
+Jalankan:                     python embedding_server.py
+
+Endpoint:
+    GET  /health  -> {"model": ..., "dim": ...}
+    POST /embed   {"texts": [...]} -> {"embeddings": [[...], ...]}
+"""
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from config import (
+    EMBEDDING_MODEL, EMBEDDING_SERVER_HOST, EMBEDDING_SERVER_PORT,
+    EMBEDDING_SERVER_MAX_BATCH, EMBEDDING_SERVER_MAX_WAIT_MS
+)
+
+
+class MicroBatcher:
+    """Gabungkan teks dari banyak request menjadi satu panggilan model."""
+
+    def __init__(self, embed_fn, max_batch: int = EMBEDDING_SERVER_MAX_BATCH,
+                 max_wait_ms: int = EMBEDDING_SERVER_MAX_WAIT_MS):
+        self.embed_fn = embed_fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0, max_wait_ms) / 1000
+        self._queue = queue.Queue()
+        self.batches = 0
+        self.texts = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, texts: list) -> Future:
+        future = Future()
+        self._queue.put((texts, future))
+        return future
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            size = len(pending[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            texts = [t for batch, _ in pending for t in batch]
+            try:
+                vectors = self.embed_fn(texts) if texts else []
+                self.batches += 1
+                self.texts += len(texts)
+                pos = 0
+                for batch, future in pending:
+                    future.set_result(vectors[pos:pos + len(batch)])
+                    pos += len(batch)
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+
+
+def make_handler(batcher: MicroBatcher, dim: int):
+    class EmbeddingHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, payload: dict):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != "/health":
+                self._send_json(404, {"error": "not found"})
+                return
+            self._send_json(200, {
+                "model": EMBEDDING_MODEL,
+                "dim": dim,
+                "batches": batcher.batches,
+                "texts": batcher.texts,
+            })
+
+        def do_POST(self):
+            if self.path != "/embed":
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                texts = json.loads(self.rfile.read(length))["texts"]
+                if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                    raise ValueError("'texts' harus list string")
+            except Exception as e:
+                self._send_json(400, {"error": str(e)})
+                return
+            try:
+                vectors = batcher.submit(texts).result()
+            except Exception as e:
+                self._send_json(500, {"error": str(e)})
+                return
+            self._send_json(200, {
+                "model": EMBEDDING_MODEL,
+                "embeddings": [np.asarray(v, dtype=np.float32).tolist() for v in vectors],
+            })
+
+        def log_message(self, format, *args):
+            pass  # Jangan log setiap request
+
+    return EmbeddingHandler
+
+
+def main():
+    from chromadb.utils import embedding_functions
+
+    print(f"[INFO] Loading embedding model {EMBEDDING_MODEL}...")
+    model_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
+        model_name=EMBEDDING_MODEL
+    )
+    dim = len(model_fn(["warmup"])[0])
+    batcher = MicroBatcher(model_fn)
+
+    server = ThreadingHTTPServer((EMBEDDING_SERVER_HOST, EMBEDDING_SERVER_PORT),
+                                 make_handler(batcher, dim))
+    print(f"[OK] Embedding server siap di http://{EMBEDDING_SERVER_HOST}:{EMBEDDING_SERVER_PORT} "
+          f"(dim {dim}, batch maks {batcher.max_batch}, tunggu {EMBEDDING_SERVER_MAX_WAIT_MS}ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[INFO] Embedding server berhenti.")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
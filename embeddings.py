@@ -0,0 +1,308 @@
+"""
+embeddings.py - Embedding Function + Cache Persisten
+====================================================
+Satu tempat untuk membuat embedding function ChromaDB (bot_super.py,
+bot_rag.py, web_ui.py).
+
+EMBEDDING_BACKEND = "local" memuat model di proses ini, "server" memakai
+embedding_server.py (model dimuat sekali untuk semua script). Jika server
+tidak bisa dihubungi, otomatis kembali ke model lokal.
+
+Cache embedding disimpan di disk, di-key oleh (EMBEDDING_MODEL, sha256(teks)):
+- <model>.f32    : array float32 memory-mapped (satu baris per teks)
+- <model>.sqlite : index key -> slot baris + waktu terakhir dipakai
+Jika jumlah entri mencapai EMBEDDING_CACHE_MAX_ENTRIES, slot yang paling
+lama tidak dipakai (LRU) ditimpa. Teks yang sudah ada di cache tidak
+perlu melewati model sama sekali.
+
+get_embedding_function(background=True) memuat model di thread background
+(lihat warmup.py, komponen "embedding"): script langsung jalan, dan hanya
+teks yang belum ada di cache yang menunggu model siap.
+"""
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import requests
+from chromadb.api.types import EmbeddingFunction
+
+from config import (
+    EMBEDDING_MODEL, EMBEDDING_CACHE_ENABLED, EMBEDDING_CACHE_DIR,
+    EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_BACKEND, EMBEDDING_SERVER_HOST,
+    EMBEDDING_SERVER_PORT
+)
+import warmup
+
+_SQL_BATCH = 500  # Batas jumlah parameter per query SQLite
+
+
+def text_key(text: str) -> str:
+    """Key cache untuk satu teks."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _chroma_wants_numpy() -> bool:
+    """ChromaDB >= 0.5 memakai numpy array, versi lama memakai list."""
+    try:
+        import chromadb
+        major, minor = (int(x) for x in chromadb.__version__.split(".")[:2])
+        return (major, minor) >= (0, 5)
+    except Exception:
+        return True
+
+
+def _format_embeddings(vectors, as_numpy: bool) -> list:
+    """Samakan format output dengan yang diharapkan versi ChromaDB terpasang."""
+    if as_numpy:
+        return [np.asarray(v, dtype=np.float32) for v in vectors]
+    return [np.asarray(v, dtype=np.float32).tolist() for v in vectors]
+
+
+class EmbeddingCache:
+    """Cache embedding di disk (memmap float32 + index SQLite, eviction LRU)."""
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, cache_dir=EMBEDDING_CACHE_DIR,
+                 max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+        self.vectors_path = cache_dir / f"{slug}.f32"
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._capacity = 0
+        self._db = sqlite3.connect(str(cache_dir / f"{slug}.sqlite"),
+                                   timeout=30, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, slot INTEGER NOT NULL UNIQUE, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON entries(last_used)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        row = self._db.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        self.dim = int(row[0]) if row else None
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def _map(self, min_rows: int):
+        """Pastikan memmap mencakup minimal `min_rows` baris (file bisa tumbuh)."""
+        if self._vectors is not None and self._capacity >= min_rows:
+            return
+        row_bytes = self.dim * 4
+        size = self.vectors_path.stat().st_size if self.vectors_path.exists() else 0
+        capacity = size // row_bytes
+        if capacity < min_rows:
+            capacity = min(self.max_entries, max(min_rows, capacity * 2, 1024))
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+",
+                                  shape=(capacity, self.dim))
+        self._capacity = capacity
+
+    def get_many(self, keys: list) -> dict:
+        """Ambil embedding yang ada di cache. Returns {key: np.ndarray}."""
+        if not keys or self.dim is None:
+            return {}
+        found = {}
+        with self._lock:
+            rows = []
+            for i in range(0, len(keys), _SQL_BATCH):
+                batch = keys[i:i + _SQL_BATCH]
+                marks = ",".join("?" * len(batch))
+                rows += self._db.execute(
+                    f"SELECT key, slot FROM entries WHERE key IN ({marks})", batch
+                ).fetchall()
+            if not rows:
+                return {}
+            self._map(max(slot for _, slot in rows) + 1)
+            for key, slot in rows:
+                found[key] = np.array(self._vectors[slot])
+            now = time.time()
+            self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ?",
+                                 [(now, key) for key, _ in rows])
+        return found
+
+    def put_many(self, items: dict):
+        """Simpan {key: vector} ke cache (slot LRU ditimpa jika penuh)."""
+        if not items:
+            return
+        with self._lock:
+            if self.dim is None:
+                self.dim = len(next(iter(items.values())))
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (str(self.dim),))
+
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                keys = list(items)
+                existing = set()
+                for i in range(0, len(keys), _SQL_BATCH):
+                    batch = keys[i:i + _SQL_BATCH]
+                    marks = ",".join("?" * len(batch))
+                    existing.update(k for (k,) in self._db.execute(
+                        f"SELECT key FROM entries WHERE key IN ({marks})", batch))
+                keys = [k for k in keys if k not in existing][:self.max_entries]
+                if not keys:
+                    self._db.execute("COMMIT")
+                    return
+
+                count = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+                n_fresh = min(len(keys), self.max_entries - count)
+                slots = list(range(count, count + n_fresh))
+                n_evict = len(keys) - n_fresh
+                if n_evict:
+                    slots += [s for (s,) in self._db.execute(
+                        "SELECT slot FROM entries ORDER BY last_used LIMIT ?", (n_evict,))]
+
+                self._map(max(slots) + 1)
+                for key, slot in zip(keys, slots):
+                    self._vectors[slot] = np.asarray(items[key], dtype=np.float32)
+                self._vectors.flush()
+
+                now = time.time()
+                if n_evict:
+                    self._db.executemany("DELETE FROM entries WHERE slot = ?",
+                                         [(s,) for s in slots[n_fresh:]])
+                self._db.executemany("INSERT INTO entries VALUES (?, ?, ?)",
+                                     [(k, s, now) for k, s in zip(keys, slots)])
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class CachedEmbeddingFunction(EmbeddingFunction):
+    """Bungkus embedding function: teks yang sudah ada di cache tidak di-encode ulang."""
+
+    def __init__(self, base, cache: EmbeddingCache):
+        self.base = base
+        self.cache = cache
+        self._as_numpy = _chroma_wants_numpy()
+
+    def __call__(self, input):
+        texts = list(input)
+        keys = [text_key(t) for t in texts]
+        found = self.cache.get_many(keys)
+
+        missing = [i for i, k in enumerate(keys) if k not in found]
+        if missing:
+            # Teks duplikat dalam satu batch cukup di-encode sekali
+            unique = {}
+            for i in missing:
+                unique.setdefault(keys[i], texts[i])
+            vectors = self.base(list(unique.values()))
+            computed = {k: np.asarray(v, dtype=np.float32) for k, v in zip(unique, vectors)}
+            self.cache.put_many(computed)
+            found.update(computed)
+
+        self.cache.hits += len(texts) - len(missing)
+        self.cache.misses += len(missing)
+        if len(texts) > 1:
+            print(f">>> [EMBED CACHE] {len(texts) - len(missing)} hit, {len(missing)} miss")
+
+        return _format_embeddings([found[k] for k in keys], self._as_numpy)
+
+
+class RemoteEmbeddingFunction(EmbeddingFunction):
+    """Embedding lewat embedding_server.py (model tidak dimuat di proses ini)."""
+
+    def __init__(self, url: str = None, timeout: int = 120):
+        self.url = url or f"http://{EMBEDDING_SERVER_HOST}:{EMBEDDING_SERVER_PORT}"
+        self.timeout = timeout
+        self._session = requests.Session()
+        self._as_numpy = _chroma_wants_numpy()
+
+    def health(self) -> dict:
+        response = self._session.get(f"{self.url}/health", timeout=2)
+        response.raise_for_status()
+        return response.json()
+
+    def __call__(self, input):
+        texts = list(input)
+        if not texts:
+            return []
+        response = self._session.post(f"{self.url}/embed", json={"texts": texts},
+                                      timeout=self.timeout)
+        response.raise_for_status()
+        return _format_embeddings(response.json()["embeddings"], self._as_numpy)
+
+
+_background = {"base": None}  # Model hasil warmup "embedding", dipakai semua instance
+
+
+def _load_background(loader):
+    start = time.perf_counter()
+    base = loader()
+    base(["warmup"])  # Pastikan model benar-benar termuat
+    _background["base"] = base
+    print(f">>> [EMBED] Model embedding siap ({time.perf_counter() - start:.1f}s)")
+
+
+class BackgroundEmbeddingFunction(EmbeddingFunction):
+    """Embedding function yang modelnya dimuat di background (warmup "embedding").
+
+    Pemanasan berjalan sekali per proses; semua instance memakai model yang sama.
+    """
+
+    def __init__(self, loader):
+        warmup.start("embedding", lambda: _load_background(loader))
+
+    def __call__(self, input):
+        if _background["base"] is None:
+            warmup.wait("embedding")
+            if _background["base"] is None:
+                raise RuntimeError("Model embedding gagal dimuat (lihat log [WARMUP])")
+        return _background["base"](input)
+
+
+def _remote_or_none():
+    """RemoteEmbeddingFunction jika server hidup dan modelnya sama, selain itu None."""
+    remote = RemoteEmbeddingFunction()
+    try:
+        info = remote.health()
+    except Exception as e:
+        print(f">>> [EMBED] Embedding server {remote.url} tidak tersedia ({e}), pakai model lokal")
+        return None
+    if info.get("model") != EMBEDDING_MODEL:
+        print(f">>> [EMBED] Model server ({info.get('model')}) != {EMBEDDING_MODEL}, pakai model lokal")
+        return None
+    print(f">>> [EMBED] Memakai embedding server {remote.url} ({info.get('model')})")
+    return remote
+
+
+def _load_base():
+    base = _remote_or_none() if EMBEDDING_BACKEND == "server" else None
+    if base is None:
+        from chromadb.utils import embedding_functions
+
+        base = embedding_functions.SentenceTransformerEmbeddingFunction(
+            model_name=EMBEDDING_MODEL
+        )
+    return base
+
+
+def get_embedding_function(background: bool = False):
+    """Embedding function untuk collection ChromaDB (dengan cache jika aktif).
+
+    background=True: model dimuat di thread background (tidak memblokir import).
+    """
+    base = BackgroundEmbeddingFunction(_load_base) if background else _load_base()
+    if not EMBEDDING_CACHE_ENABLED:
+        return base
+    return CachedEmbeddingFunction(base, EmbeddingCache(EMBEDDING_MODEL))
@@ -0,0 +1,167 @@
+"""
+hnsw_sweep.py - Uji Parameter HNSW pada Korpus Sendiri
+======================================================
+Untuk setiap kombinasi (M, ef_construction, ef_search), embedding dari
+collection utama disalin ke collection sementara (in-memory) dengan
+parameter tersebut, lalu diukur:
+- recall@k dibanding brute force (numpy, metrik sesuai HNSW_SPACE)
+- latency query p50 / p99
+- waktu build dan perkiraan ukuran index (layout hnswlib level 0)
+
+Embedding tidak dihitung ulang (diambil dari ChromaDB), jadi sweep cukup
+cepat untuk dijalankan di mesin yang sama dengan bot. Hasilnya dipakai
+untuk mengisi HNSW_M / HNSW_CONSTRUCTION_EF / HNSW_SEARCH_EF di config.py.
+
+CLI:
+    python hnsw_sweep.py                      # grid bawaan, 100 query, k=5
+    python hnsw_sweep.py --m 16,32 --ef-search 10,50,100 --queries 200 -k 10
+"""
+import argparse
+import time
+import uuid
+
+import numpy as np
+
+from config import HNSW_SPACE, HNSW_M, HNSW_CONSTRUCTION_EF, HNSW_SEARCH_EF
+from sharded_collection import hnsw_metadata
+
+DEFAULT_M = (8, 16, 32)
+DEFAULT_CONSTRUCTION_EF = (100, 200)
+DEFAULT_SEARCH_EF = (10, 50, 100)
+_PAGE_SIZE = 5000
+
+
+def load_vectors(collection) -> tuple:
+    """(ids, matrix float32, documents) seluruh collection, diambil per halaman."""
+    ids, vectors, documents = [], [], []
+    for offset in range(0, collection.count(), _PAGE_SIZE):
+        page = collection.get(include=["embeddings", "documents"],
+                              limit=_PAGE_SIZE, offset=offset)
+        ids += page["ids"]
+        vectors += list(page["embeddings"])
+        documents += page["documents"]
+    return ids, np.asarray(vectors, dtype=np.float32), documents
+
+
+def brute_force(matrix, queries, k: int, space: str = HNSW_SPACE) -> np.ndarray:
+    """Index top-k exact untuk tiap query (jarak sama seperti ChromaDB)."""
+    if space == "l2":
+        distances = ((queries ** 2).sum(1)[:, None] - 2 * queries @ matrix.T
+                     + (matrix ** 2).sum(1)[None, :])
+    elif space == "cosine":
+        normed = matrix / (np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12)
+        q = queries / (np.linalg.norm(queries, axis=1, keepdims=True) + 1e-12)
+        distances = 1 - q @ normed.T
+    else:  # ip
+        distances = 1 - queries @ matrix.T
+    top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    return top
+
+
+def estimate_index_mb(n: int, dim: int, m: int) -> float:
+    """Perkiraan ukuran index hnswlib: vektor float32 + link level 0 (2*M) + label."""
+    return n * (dim * 4 + (2 * m + 1) * 4 + 8) / 1024 / 1024
+
+
+def run_setting(client, ids, matrix, queries, truth, k: int, space: str,
+                m: int, construction_ef: int, search_ef: int) -> dict:
+    name = f"hnsw_sweep_{uuid.uuid4().hex[:8]}"
+    scratch = client.create_collection(
+        name=name, embedding_function=None,  # Embedding sudah ada, tidak perlu model
+        metadata=hnsw_metadata(space, m, construction_ef, search_ef)
+    )
+    try:
+        start = time.perf_counter()
+        for i in range(0, len(ids), _PAGE_SIZE):
+            scratch.add(ids=ids[i:i + _PAGE_SIZE], embeddings=matrix[i:i + _PAGE_SIZE].tolist())
+        build_s = time.perf_counter() - start
+
+        recalls, latencies = [], []
+        for query, expected in zip(queries, truth):
+            t0 = time.perf_counter()
+            found = scratch.query(query_embeddings=[query.tolist()], n_results=k,
+                                  include=[])["ids"][0]
+            latencies.append((time.perf_counter() - t0) * 1000)
+            expected_ids = {ids[j] for j in expected}
+            recalls.append(len(expected_ids & set(found)) / k)
+    finally:
+        client.delete_collection(name)
+    return {
+        "m": m, "construction_ef": construction_ef, "search_ef": search_ef,
+        "recall": float(np.mean(recalls)),
+        "p50": float(np.percentile(latencies, 50)),
+        "p99": float(np.percentile(latencies, 99)),
+        "build_s": build_s,
+        "size_mb": estimate_index_mb(len(ids), matrix.shape[1], m),
+    }
+
+
+def sweep(collection, embedding_fn, m_values=DEFAULT_M,
+          construction_efs=DEFAULT_CONSTRUCTION_EF, search_efs=DEFAULT_SEARCH_EF,
+          n_queries: int = 100, k: int = 5, space: str = HNSW_SPACE) -> str:
+    """Jalankan sweep dan kembalikan laporan teks."""
+    import chromadb
+
+    ids, matrix, documents = load_vectors(collection)
+    if not ids:
+        return "[ERROR] Collection kosong, tidak ada yang diuji."
+    k = min(k, len(ids))
+    # Query = potongan awal dokumen acak (seperti pertanyaan pendek tentang isinya)
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(ids), size=min(n_queries, len(ids)), replace=False)
+    texts = [" ".join((documents[i] or "").split()[:30]) for i in sample]
+    queries = np.asarray(embedding_fn(texts), dtype=np.float32)
+    truth = brute_force(matrix, queries, k, space)
+
+    client = chromadb.EphemeralClient()
+    rows = []
+    for m in m_values:
+        for construction_ef in construction_efs:
+            for search_ef in search_efs:
+                row = run_setting(client, ids, matrix, queries, truth, k, space,
+                                  m, construction_ef, search_ef)
+                print(f">>> [HNSW] M={m} ef_c={construction_ef} ef_s={search_ef}: "
+                      f"recall {row['recall']:.3f}, p50 {row['p50']:.2f}ms")
+                rows.append(row)
+
+    current = (HNSW_M, HNSW_CONSTRUCTION_EF, HNSW_SEARCH_EF)
+    output = (f"HNSW SWEEP ({len(ids)} vektor, dim {matrix.shape[1]}, space {space}, "
+              f"{len(queries)} query, k={k})\n"
+              f"{'M':>4} {'ef_c':>6} {'ef_s':>6} | {'recall@k':>8} | {'p50 ms':>7} "
+              f"{'p99 ms':>7} | {'build s':>7} | {'~MB':>7}\n")
+    for row in rows:
+        marker = "  <- config" if (row["m"], row["construction_ef"], row["search_ef"]) == current else ""
+        output += (f"{row['m']:>4} {row['construction_ef']:>6} {row['search_ef']:>6} | "
+                   f"{row['recall']:>8.3f} | {row['p50']:>7.2f} {row['p99']:>7.2f} | "
+                   f"{row['build_s']:>7.1f} | {row['size_mb']:>7.1f}{marker}\n")
+    return output
+
+
+def _int_list(text: str) -> tuple:
+    return tuple(int(x) for x in text.split(",") if x.strip())
+
+
+def main():
+    import chromadb
+    from config import CHROMA_DB_PATH
+    from embeddings import get_embedding_function
+    from sharded_collection import open_collection
+
+    parser = argparse.ArgumentParser(description="Sweep parameter HNSW (recall/latency)")
+    parser.add_argument("--m", type=_int_list, default=DEFAULT_M)
+    parser.add_argument("--ef-construction", type=_int_list, default=DEFAULT_CONSTRUCTION_EF)
+    parser.add_argument("--ef-search", type=_int_list, default=DEFAULT_SEARCH_EF)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--space", default=HNSW_SPACE, choices=("l2", "cosine", "ip"))
+    args = parser.parse_args()
+
+    embedding_fn = get_embedding_function()
+    client = chromadb.PersistentClient(path=str(CHROMA_DB_PATH))
+    collection = open_collection(client, embedding_fn)
+    print(sweep(collection, embedding_fn, args.m, args.ef_construction, args.ef_search,
+                args.queries, args.k, args.space))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,530 @@
+"""
+llm_client.py - Satu Klien Ollama untuk Semua Script
+====================================================
+Semua panggilan ke Ollama (bot_super.py, bot_rag.py, neo4j_graph.py,
+web_ui.py) lewat modul ini:
+- Satu requests.Session per proses dengan connection pool (koneksi HTTP
+  dipakai ulang, tidak buka-tutup tiap pertanyaan)
+- Timeout seragam: LLM_CONNECT_TIMEOUT untuk konek, LLM_READ_TIMEOUT
+  untuk menunggu respons / potongan stream berikutnya
+- Retry hanya saat koneksi gagal dibuka (request belum terkirim, aman
+  diulang); generate yang sudah berjalan tidak diulang
+- Metrik per proses (llm_stats): jumlah request, error, rata-rata latency
+  dan waktu sampai token pertama
+- Antrian FIFO berbasis asyncio (LLMQueue): maks LLM_MAX_CONCURRENT
+  generate berjalan bersamaan, maks LLM_MAX_QUEUE menunggu. Jika antrian
+  penuh, pemanggil langsung mendapat LLMBusy (dengan posisinya) alih-alih
+  menunggu sampai timeout
+- Semua request membawa keep_alive (LLM_KEEP_ALIVE) dan num_ctx (LLM_NUM_CTX,
+  jika diisi) yang sama, jadi model tetap dimuat di antara pertanyaan dan
+  tidak di-load ulang karena opsi yang berbeda
+- Single-flight: request yang identik (path + model + prompt/pesan + opsi,
+  di-hash sha256) yang datang saat request yang sama masih berjalan tidak
+  dikirim ulang ke Ollama; pemanggil berikutnya ikut membaca stream token
+  yang sama dan mendapat hasil yang sama (mis. double-submit, dua user
+  bertanya hal yang sama bersamaan)
+- ChatSession: mode percakapan lewat /api/chat (LLM_CHAT_MODE). System
+  prompt tetap dan riwayat disimpan persis seperti yang dikirim, sehingga
+  request berikutnya diawali prefix yang sama dan Ollama cukup memproses
+  token baru (terlihat dari prompt eval per giliran di format_stats)
+
+/api/generate dengan "stream": true mengirim NDJSON: satu objek JSON per
+baris berisi potongan jawaban ("response"); objek terakhir ("done": true)
+berisi statistik dari Ollama. stream_generate() meneruskan potongan itu
+begitu datang dan mencatat ttft_ms (load model + prompt eval) terpisah
+dari total_ms. Keduanya diukur sejak request dikirim ke Ollama, setelah
+giliran antrian didapat (waktu antri tidak termasuk).
+"""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import (
+    OLLAMA_API_URL, OLLAMA_MODEL, LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT,
+    LLM_POOL_SIZE, LLM_CONNECT_RETRIES, LLM_MAX_CONCURRENT, LLM_MAX_QUEUE,
+    LLM_KEEP_ALIVE, LLM_NUM_CTX, LLM_SYSTEM_PROMPT, LLM_CHAT_HISTORY_TOKENS
+)
+
+_session = None
+_session_lock = threading.Lock()
+_metrics_lock = threading.Lock()
+_metrics = {"requests": 0, "errors": 0, "total_ms": 0.0, "ttft_ms": 0.0, "streams": 0,
+            "coalesced": 0}
+_flights = {}  # key request -> _Flight yang sedang berjalan
+_flights_lock = threading.Lock()
+
+
+class LLMError(RuntimeError):
+    """Ollama membalas dengan error (status HTTP != 200 atau field "error")."""
+
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class LLMBusy(LLMError):
+    """Antrian LLM penuh; `position` = posisi yang akan didapat jika ikut antri."""
+
+    def __init__(self, position: int):
+        super().__init__(f"Server LLM sedang sibuk (antrian penuh, posisi {position})")
+        self.position = position
+
+
+class LLMQueue:
+    """Antrian FIFO ke Ollama, dijalankan di event loop asyncio milik sendiri.
+
+    Semua state antrian hanya diubah di thread event loop, jadi urutan
+    giliran adil (siapa datang duluan dilayani duluan) tanpa lock tambahan.
+    Pemanggil memegang giliran lewat slot() selama request berjalan.
+    """
+
+    def __init__(self, max_concurrent: int = LLM_MAX_CONCURRENT,
+                 max_queue: int = LLM_MAX_QUEUE):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self._active = 0
+        self._waiters = deque()
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, daemon=True,
+                         name="llm-queue").start()
+
+    # --- Dijalankan di event loop ---
+
+    async def _enter(self):
+        """Returns (future giliran, posisi). Posisi 0 = langsung jalan."""
+        future = self._loop.create_future()
+        if self._active < self.max_concurrent and not self._waiters:
+            self._active += 1
+            future.set_result(None)
+            return future, 0
+        if len(self._waiters) >= self.max_queue:
+            raise LLMBusy(len(self._waiters) + 1)
+        self._waiters.append(future)
+        return future, len(self._waiters)
+
+    async def _wait(self, future):
+        await future
+
+    def _release(self):
+        # Serahkan slot langsung ke antrian terdepan (jumlah aktif tetap)
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    def _cancel(self, future):
+        if future.done():
+            self._release()  # Giliran sudah didapat tapi tidak dipakai
+        else:
+            future.cancel()
+            if future in self._waiters:
+                self._waiters.remove(future)
+
+    # --- API untuk pemanggil ---
+
+    @contextmanager
+    def slot(self, on_queue=None):
+        """Tunggu giliran (blocking). on_queue(posisi) dipanggil jika harus antri.
+
+        LLMBusy langsung dilempar jika antrian penuh.
+        """
+        future, position = asyncio.run_coroutine_threadsafe(self._enter(), self._loop).result()
+        try:
+            if position:
+                if on_queue is not None:
+                    on_queue(position)
+                asyncio.run_coroutine_threadsafe(self._wait(future), self._loop).result()
+        except BaseException:
+            self._loop.call_soon_threadsafe(self._cancel, future)
+            raise
+        try:
+            yield
+        finally:
+            self._loop.call_soon_threadsafe(self._release)
+
+    def status(self) -> dict:
+        return {"active": self._active, "waiting": len(self._waiters),
+                "max_concurrent": self.max_concurrent, "max_queue": self.max_queue}
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue() -> LLMQueue:
+    """Antrian LLM bersama (dibuat sekali per proses)."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = LLMQueue()
+    return _queue
+
+
+def queue_status() -> dict:
+    """Kedalaman antrian LLM saat ini (aktif / menunggu)."""
+    return get_queue().status()
+
+
+def get_session() -> requests.Session:
+    """Session bersama (dibuat sekali per proses)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                retry = Retry(total=LLM_CONNECT_RETRIES, connect=LLM_CONNECT_RETRIES,
+                              read=0, status=0, other=0, backoff_factor=0.5)
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=LLM_POOL_SIZE,
+                                      max_retries=retry)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def _timeout(read_timeout: float = None) -> tuple:
+    return (LLM_CONNECT_TIMEOUT, read_timeout if read_timeout is not None else LLM_READ_TIMEOUT)
+
+
+def _record(elapsed_ms: float, error: bool = False, ttft_ms: float = None):
+    with _metrics_lock:
+        _metrics["requests"] += 1
+        _metrics["total_ms"] += elapsed_ms
+        if error:
+            _metrics["errors"] += 1
+        if ttft_ms is not None:
+            _metrics["streams"] += 1
+            _metrics["ttft_ms"] += ttft_ms
+
+
+def _payload(model: str, options: dict, **fields) -> dict:
+    """Body request generate/chat dengan keep_alive & num_ctx dari config."""
+    payload = {"model": model, "keep_alive": LLM_KEEP_ALIVE, **fields}
+    model_options = dict(options.pop("options", None) or {})
+    if LLM_NUM_CTX:
+        model_options.setdefault("num_ctx", LLM_NUM_CTX)
+    if model_options:
+        payload["options"] = model_options
+    payload.update(options)
+    return payload
+
+
+def _fill_stats(stats: dict, data: dict):
+    """Statistik dari objek terakhir Ollama ("done": true)."""
+    stats["prompt_tokens"] = data.get("prompt_eval_count", 0)
+    stats["prompt_eval_ms"] = data.get("prompt_eval_duration", 0) / 1e6
+    stats["output_tokens"] = data.get("eval_count", 0)
+
+
+def _token(data: dict) -> str:
+    """Potongan teks dari /api/generate ("response") atau /api/chat ("message")."""
+    if "message" in data:
+        return (data["message"] or {}).get("content", "")
+    return data.get("response", "")
+
+
+def api_get(path: str, base_url: str = OLLAMA_API_URL, timeout: float = 3):
+    """GET ringan ke Ollama (mis. /api/tags). Returns requests.Response."""
+    return get_session().get(f"{base_url}{path}", timeout=_timeout(timeout))
+
+
+def api_post(path: str, payload: dict, base_url: str = OLLAMA_API_URL, timeout: float = 3):
+    """POST ringan ke Ollama (mis. /api/show). Returns requests.Response."""
+    return get_session().post(f"{base_url}{path}", json=payload, timeout=_timeout(timeout))
+
+
+def generate(prompt: str, model: str = OLLAMA_MODEL, base_url: str = OLLAMA_API_URL,
+             timeout: float = None, on_queue=None, **options) -> str:
+    """Jawaban lengkap dari /api/generate, lewat antrian LLM.
+
+    Di bawahnya tetap stream (digabung di sini), jadi bisa berbagi satu
+    generate dengan stream_generate() yang identik. Error dari Ollama
+    dilempar sebagai LLMError (LLMBusy jika antrian penuh); error
+    koneksi/timeout sebagai exception requests.
+    """
+    return "".join(_single_flight("/api/generate", _payload(model, options, prompt=prompt),
+                                  base_url, None, timeout, on_queue))
+
+
+def chat(messages: list, model: str = OLLAMA_MODEL, base_url: str = OLLAMA_API_URL,
+         stats: dict = None, timeout: float = None, on_queue=None, **options) -> str:
+    """Jawaban lengkap dari /api/chat (tanpa stream). Error sama seperti generate()."""
+    return "".join(_single_flight("/api/chat", _payload(model, options, messages=messages),
+                                  base_url, stats, timeout, on_queue))
+
+
+def stream_generate(prompt: str, model: str = OLLAMA_MODEL, base_url: str = OLLAMA_API_URL,
+                    stats: dict = None, timeout: float = None, on_queue=None, **options):
+    """Generator potongan teks jawaban dari /api/generate (stream).
+
+    `stats` (opsional) diisi ttft_ms, total_ms, prompt_tokens, output_tokens
+    setelah stream selesai. Slot antrian dipegang sampai stream selesai
+    (atau generator ditutup). Error sama seperti generate().
+    """
+    yield from _single_flight("/api/generate", _payload(model, options, prompt=prompt),
+                              base_url, stats, timeout, on_queue)
+
+
+def stream_chat(messages: list, model: str = OLLAMA_MODEL, base_url: str = OLLAMA_API_URL,
+                stats: dict = None, timeout: float = None, on_queue=None, **options):
+    """Generator potongan teks jawaban dari /api/chat (stream). Sama seperti stream_generate()."""
+    yield from _single_flight("/api/chat", _payload(model, options, messages=messages),
+                              base_url, stats, timeout, on_queue)
+
+
+class _Flight:
+    """Satu generate yang sedang berjalan; token ditampung untuk semua pemanggil."""
+
+    def __init__(self):
+        self.tokens = []
+        self.stats = {}
+        self.error = None
+        self.done = False
+        self.consumers = 1
+        self.cond = threading.Condition()
+
+
+def _flight_key(path: str, payload: dict, base_url: str) -> str:
+    body = json.dumps({"path": path, "base_url": base_url, **payload},
+                      sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def _single_flight(path: str, payload: dict, base_url: str, stats: dict,
+                   timeout: float, on_queue=None):
+    """Token jawaban untuk payload ini; request identik yang sedang berjalan dipakai bersama.
+
+    Pemanggil pertama menunggu slot antrian (on_queue / LLMBusy di thread
+    pemanggil), lalu generate dijalankan di thread sendiri sehingga tetap
+    selesai untuk pemanggil lain walau pemanggil pertama berhenti membaca.
+    """
+    payload = {**payload, "stream": True}
+    key = _flight_key(path, payload, base_url)
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+        else:
+            with flight.cond:
+                flight.consumers += 1
+    if not leader:
+        with _metrics_lock:
+            _metrics["coalesced"] += 1
+        print(f">>> [LLM] Request identik sedang berjalan, ikut memakai hasilnya")
+        return _follow(flight, stats)
+
+    slot = get_queue().slot(on_queue)
+    try:
+        slot.__enter__()
+    except BaseException as e:
+        _finish(key, flight, e)
+        raise
+    threading.Thread(target=_drive, args=(key, flight, slot, path, payload, base_url, timeout),
+                     daemon=True, name="llm-flight").start()
+    return _follow(flight, stats)
+
+
+def _drive(key: str, flight: _Flight, slot, path: str, payload: dict, base_url: str,
+           timeout: float):
+    """Jalankan stream ke Ollama dan bagikan tokennya (slot antrian dilepas di akhir)."""
+    error = None
+    tokens = _stream(path, payload, base_url, flight.stats, timeout)
+    try:
+        for token in tokens:
+            with flight.cond:
+                flight.tokens.append(token)
+                flight.cond.notify_all()
+                idle = flight.consumers == 0
+            if idle:
+                with _flights_lock, flight.cond:
+                    if flight.consumers == 0:  # Semua pemanggil berhenti membaca
+                        _flights.pop(key, None)
+                        break
+    except Exception as e:
+        error = e
+    finally:
+        tokens.close()
+        slot.__exit__(None, None, None)
+        _finish(key, flight, error)
+
+
+def _finish(key: str, flight: _Flight, error: BaseException = None):
+    # Keluarkan dari daftar dulu: request berikutnya memulai generate baru
+    with _flights_lock:
+        if _flights.get(key) is flight:
+            del _flights[key]
+    with flight.cond:
+        flight.error = error
+        flight.done = True
+        flight.cond.notify_all()
+
+
+def _follow(flight: _Flight, stats: dict):
+    """Generator token dari flight (dari awal), menunggu token berikutnya jika belum ada."""
+    read = 0
+    try:
+        while True:
+            with flight.cond:
+                while read >= len(flight.tokens) and not flight.done:
+                    flight.cond.wait()
+                new = flight.tokens[read:]
+                done = flight.done
+            yield from new
+            read += len(new)
+            if done and read >= len(flight.tokens):
+                break
+        if flight.error is not None:
+            raise flight.error
+        if stats is not None:
+            stats.update(flight.stats)
+    finally:
+        with flight.cond:
+            flight.consumers -= 1
+
+
+def _stream(path: str, payload: dict, base_url: str, stats: dict, timeout: float):
+    stats = stats if stats is not None else {}
+    start = time.perf_counter()
+    try:
+        # Read timeout berlaku per potongan, bukan untuk seluruh jawaban
+        with get_session().post(f"{base_url}{path}", json=payload, stream=True,
+                                timeout=_timeout(timeout)) as response:
+            if response.status_code != 200:
+                raise LLMError(f"Ollama status {response.status_code}: {response.text[:200]}",
+                               response.status_code)
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise LLMError(data["error"])
+                token = _token(data)
+                if token:
+                    if "ttft_ms" not in stats:
+                        stats["ttft_ms"] = (time.perf_counter() - start) * 1000
+                    yield token
+                if data.get("done"):
+                    _fill_stats(stats, data)
+                    break
+    except Exception:
+        _record((time.perf_counter() - start) * 1000, error=True)
+        raise
+    stats["total_ms"] = (time.perf_counter() - start) * 1000
+    stats.setdefault("ttft_ms", stats["total_ms"])
+    _record(stats["total_ms"], ttft_ms=stats["ttft_ms"])
+
+
+def format_stats(stats: dict) -> str:
+    """Ringkasan satu baris untuk log / caption."""
+    if stats.get("cached"):
+        return "jawaban dari cache (tanpa LLM)"
+    if "total_ms" not in stats:
+        return ""
+    text = f"total {stats['total_ms'] / 1000:.1f}s"
+    if "ttft_ms" in stats:  # Hanya untuk stream
+        text = f"token pertama {stats['ttft_ms'] / 1000:.1f}s, " + text
+    if stats.get("output_tokens"):
+        text += f", {stats['output_tokens']} token"
+    if stats.get("prompt_eval_ms"):
+        # Token prompt yang benar-benar diproses; prefix yang ter-cache tidak dihitung
+        text += f", prompt eval {stats['prompt_tokens']} token {stats['prompt_eval_ms']:.0f}ms"
+    return text
+
+
+class ChatSession:
+    """Percakapan multi-giliran lewat /api/chat dengan prefix yang stabil.
+
+    `history` berisi pesan persis seperti yang dikirim (termasuk konteks RAG
+    di pesan user), sehingga request baru = request sebelumnya + jawaban +
+    pesan baru, dan KV cache Ollama untuk prefix itu terpakai. Jika riwayat
+    melebihi max_history_tokens, giliran terlama dibuang sekaligus sampai
+    tersisa separuhnya, jadi prefix hanya berubah sesekali (bukan tiap giliran).
+    """
+
+    def __init__(self, model: str = OLLAMA_MODEL, base_url: str = OLLAMA_API_URL,
+                 system_prompt: str = LLM_SYSTEM_PROMPT,
+                 max_history_tokens: int = LLM_CHAT_HISTORY_TOKENS):
+        self.model = model
+        self.base_url = base_url
+        self.system_prompt = system_prompt
+        self.max_history_tokens = max_history_tokens
+        self.history = []
+        self._lock = threading.Lock()
+
+    def messages(self, content: str) -> list:
+        """Pesan lengkap untuk giliran berikutnya."""
+        with self._lock:
+            history = list(self.history)
+        system = [{"role": "system", "content": self.system_prompt}] if self.system_prompt else []
+        return system + history + [{"role": "user", "content": content}]
+
+    def record(self, content: str, answer: str):
+        """Tambahkan satu giliran (pesan user persis seperti dikirim + jawaban)."""
+        with self._lock:
+            self.history += [{"role": "user", "content": content},
+                             {"role": "assistant", "content": answer}]
+            self._trim()
+
+    def _trim(self):
+        from chunker import count_tokens
+        sizes = [count_tokens(m["content"]) for m in self.history]
+        if sum(sizes) <= self.max_history_tokens:
+            return
+        drop = 0
+        while drop < len(sizes) and sum(sizes[drop:]) > self.max_history_tokens // 2:
+            drop += 2  # Per giliran (user + assistant)
+        self.history = self.history[drop:]
+        print(f">>> [CHAT] Riwayat dipangkas: {drop // 2} giliran terlama dibuang")
+
+    def reset(self):
+        with self._lock:
+            self.history = []
+
+    def turns(self) -> int:
+        return len(self.history) // 2
+
+    def ask(self, content: str, stats: dict = None, on_queue=None) -> str:
+        answer = chat(self.messages(content), self.model, self.base_url,
+                      stats=stats, on_queue=on_queue)
+        if answer:
+            self.record(content, answer)
+        return answer
+
+    def stream(self, content: str, stats: dict = None, on_queue=None):
+        """Generator potongan jawaban; giliran dicatat setelah stream selesai."""
+        parts = []
+        for token in stream_chat(self.messages(content), self.model, self.base_url,
+                                 stats=stats, on_queue=on_queue):
+            parts.append(token)
+            yield token
+        if parts:
+            self.record(content, "".join(parts))
+
+
+def llm_stats() -> dict:
+    """Metrik panggilan LLM di proses ini (termasuk kedalaman antrian).
+
+    coalesced = request yang tidak dikirim ke Ollama karena ikut request identik.
+    """
+    with _metrics_lock:
+        n = _metrics["requests"]
+        stats = {
+            "requests": n,
+            "errors": _metrics["errors"],
+            "avg_ms": _metrics["total_ms"] / n if n else 0.0,
+            "avg_ttft_ms": _metrics["ttft_ms"] / _metrics["streams"] if _metrics["streams"] else 0.0,
+            "coalesced": _metrics["coalesced"],
+        }
+    return {**stats, **queue_status()}
@@ -3,12 +3,12 @@ import json
 import re
 from datetime import datetime
 from pathlib import Path
-import requests
 
 from config import (
     NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD,
-    OLLAMA_API_URL, OLLAMA_MODEL, CODING_OUTPUT_DIR
+    CODING_OUTPUT_DIR
 )
+from llm_client import generate as llm_generate, LLMError
 
 #NEO4J CONNECTION
 
@@ -339,18 +339,12 @@ RELATIONSHIP TYPES: WORKS_AT, LOCATED_IN, PRODUCES, OWNS, PARTNER_WITH, USES, CR
 Jawab HANYA dengan JSON, tanpa penjelasan tambahan."""
 
     try:
-        response = requests.post(
-            f"{OLLAMA_API_URL}/api/generate",
-            json={"model": OLLAMA_MODEL, "prompt": prompt, "stream": False},
-            timeout=120
-        )
-        
-        if response.status_code != 200:
-            print(f">>> [ENTITY] LLM error: {response.status_code}")
+        try:
+            answer = llm_generate(prompt)
+        except LLMError as e:
+            print(f">>> [ENTITY] LLM error: {e.status_code or e}")
             return {"entities": [], "relationships": []}
         
-        answer = response.json().get("response", "")
-        
         # Parse JSON from response
         json_match = re.search(r'\{[\s\S]*\}', answer)
         if json_match:
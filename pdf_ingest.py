@@ -0,0 +1,598 @@
+"""
+pdf_ingest.py - Ingestion Dokumen ke ChromaDB
+=============================================
+Helper bersama untuk bot_super.py dan web_ui.py.
+Chunk disimpan dalam batch: satu kali cek ID untuk semua kandidat,
+lalu collection.add per batch agar embedding model meng-encode banyak
+chunk sekaligus (bukan satu per satu).
+Ekstraksi teks PDF (CPU-bound) dibagi ke process pool per rentang
+halaman atau per file, lalu disusun ulang sesuai urutan halaman.
+ingest_folder() menjalankan ekstraksi, chunking, embedding dan penulisan
+ChromaDB sebagai pipeline untuk satu folder sekaligus.
+
+Process pool selalu memakai "forkserver" (atau "spawn" jika tidak tersedia,
+mis. Windows), tidak pernah "fork": script pemanggil sudah menjalankan thread
+(warm-up, embedding, retrieval) dan fork saat lock dipegang thread lain bisa
+deadlock. Worker spawn/forkserver meng-import ulang script utama sebagai
+"__mp_main__", jadi script yang memakai modul ini (bot_super.py) tidak boleh
+menjalankan inisialisasi berat di level modul untuk nama itu.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+from config import (
+    INGEST_BATCH_SIZE, INGEST_MANIFEST_PATH, PDF_WORKERS, PDF_PARALLEL_MIN_PAGES
+)
+from chunker import iter_chunk_spans, chunker_signature
+from vector_search import record_added, record_deleted, record_updated
+
+
+# --- EKSTRAKSI PDF ---
+
+def pdf_worker_count(workers: int = PDF_WORKERS) -> int:
+    """Jumlah proses ekstraksi efektif (0 = otomatis sesuai CPU)."""
+    if workers and workers > 0:
+        return workers
+    return max(1, min(4, (os.cpu_count() or 1) - 1))
+
+
+def _pool(workers: int) -> ProcessPoolExecutor:
+    """Process pool tanpa fork (lihat docstring modul)."""
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+
+
+def _extract_page_range(path: str, start: int, end: int) -> list:
+    """Worker: ekstrak teks halaman [start, end) dari satu PDF."""
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    end = min(end, len(reader.pages))
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def _extract_all_pages(path: str) -> list:
+    """Worker: ekstrak teks semua halaman dari satu PDF."""
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    return [page.extract_text() or "" for page in reader.pages]
+
+
+def head_text(pages, limit: int = 3000) -> str:
+    """Gabungkan halaman awal sampai `limit` karakter (untuk ekstraksi entitas)."""
+    out = ""
+    for page in pages:
+        out += page + "\n"
+        if len(out) >= limit:
+            break
+    return out[:limit].strip()
+
+
+def extract_pdf_pages(path: str, workers: int = PDF_WORKERS) -> list:
+    """Ekstrak teks per halaman (urutan halaman dipertahankan).
+
+    PDF besar dibagi ke beberapa proses per rentang halaman. Jika pool
+    gagal (mis. lingkungan tanpa dukungan multiprocessing), otomatis
+    kembali ke ekstraksi single-process.
+    """
+    from pypdf import PdfReader
+    path = str(path)
+    total_pages = len(PdfReader(path).pages)
+    workers = min(pdf_worker_count(workers), total_pages)
+
+    if workers <= 1 or total_pages < PDF_PARALLEL_MIN_PAGES:
+        return _extract_all_pages(path)
+
+    step = -(-total_pages // workers)  # ceil
+    ranges = [(s, min(s + step, total_pages)) for s in range(0, total_pages, step)]
+    try:
+        with _pool(workers) as pool:
+            futures = [pool.submit(_extract_page_range, path, s, e) for s, e in ranges]
+            pages = []
+            for future in futures:  # urutan submit = urutan halaman
+                pages.extend(future.result())
+        return pages
+    except Exception as e:
+        print(f">>> [PDF] Process pool gagal ({e}), fallback single-process")
+        return _extract_all_pages(path)
+
+
+def iter_extracted_pdfs(paths: list, workers: int = PDF_WORKERS):
+    """Ekstrak beberapa PDF, satu file per proses.
+
+    Yield (path, list teks per halaman | Exception) begitu file selesai,
+    sehingga tahap berikutnya (chunking/embedding) bisa langsung jalan.
+    """
+    paths = [str(p) for p in paths]
+    workers = min(pdf_worker_count(workers), len(paths))
+
+    if workers > 1:
+        try:
+            pool = _pool(workers)
+        except Exception as e:
+            print(f">>> [PDF] Process pool gagal ({e}), fallback single-process")
+            pool = None
+        if pool is not None:
+            with pool:
+                futures = {pool.submit(_extract_all_pages, path): path for path in paths}
+                for future in as_completed(futures):
+                    try:
+                        yield futures[future], future.result()
+                    except Exception as e:
+                        yield futures[future], e
+            return
+
+    for path in paths:
+        try:
+            yield path, _extract_all_pages(path)
+        except Exception as e:
+            yield path, e
+
+
+# --- MANIFEST (file yang sudah di-ingest) ---
+
+def file_sha256(path) -> str:
+    """Hash sha256 isi file (dibaca per blok)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_manifest() -> dict:
+    """Baca manifest ingestion {filename: info}."""
+    if not INGEST_MANIFEST_PATH.exists():
+        return {}
+    try:
+        with open(INGEST_MANIFEST_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f">>> [INGEST] Manifest rusak, diabaikan: {e}")
+        return {}
+
+
+def save_manifest(manifest: dict):
+    """Tulis manifest secara atomik (tulis ke file sementara lalu rename)."""
+    tmp_path = INGEST_MANIFEST_PATH.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, INGEST_MANIFEST_PATH)
+
+
+def clear_manifest():
+    """Hapus manifest (dipakai saat database di-reset)."""
+    if INGEST_MANIFEST_PATH.exists():
+        INGEST_MANIFEST_PATH.unlink()
+
+
+def is_unchanged(path: Path, manifest: dict) -> bool:
+    """True jika file sudah pernah di-ingest dan isinya tidak berubah.
+
+    Cek cepat via ukuran + mtime; sha256 hanya dihitung jika keduanya beda.
+    Jika isinya ternyata sama (mis. file di-copy ulang / di-touch), ukuran +
+    mtime baru dicatat ke manifest agar cek berikutnya kembali cepat.
+    """
+    entry = manifest.get(path.name)
+    if not entry or "chunk_ids" not in entry:
+        return False
+    if entry.get("chunker") != chunker_signature():
+        return False  # Konfigurasi chunker berubah -> perlu di-chunk ulang
+    stat = path.stat()
+    if entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime:
+        return True
+    if entry.get("sha256") != file_sha256(path):
+        return False
+    entry["size"] = stat.st_size
+    entry["mtime"] = stat.st_mtime
+    save_manifest(manifest)
+    return True
+
+
+def record_ingested(path: Path, chunk_ids: list, chunk_hashes: list, manifest: dict = None):
+    """Catat file + hash tiap chunk ke manifest setelah berhasil di-ingest."""
+    save_now = manifest is None
+    if save_now:
+        manifest = load_manifest()
+    stat = path.stat()
+    manifest[path.name] = {
+        "sha256": file_sha256(path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "chunks": len(chunk_ids),
+        "chunk_ids": list(chunk_ids),
+        "chunk_hashes": list(chunk_hashes),
+        "chunker": chunker_signature(),
+        "ingested_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    if save_now:
+        save_manifest(manifest)
+
+
+# --- PENYIMPANAN KE CHROMADB ---
+
+def chunk_sha256(chunk: str) -> str:
+    """Hash sha256 isi satu chunk."""
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+
+
+# Metadata posisi chunk (berubah tanpa perlu embed ulang)
+POSITION_KEYS = ("chunk", "total_chunks", "page_start", "page_end", "char_start", "char_end")
+
+
+def pdf_chunk_records(filename: str, chunks: list) -> tuple:
+    """Buat (ids, documents, metadatas, hashes) standar untuk chunk PDF.
+
+    `chunks` adalah list dict dari chunker.iter_chunk_spans (text + posisi
+    halaman). ID diturunkan dari hash isi chunk, sehingga chunk yang tidak
+    berubah tetap punya ID yang sama walau posisinya bergeser.
+    """
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    documents = [chunk["text"] for chunk in chunks]
+    hashes = [chunk_sha256(doc) for doc in documents]
+    ids = []
+    seen = {}
+    for h in hashes:
+        n = seen.get(h, 0)
+        seen[h] = n + 1
+        ids.append(f"pdf_{filename}_{h[:16]}" + (f"_{n}" if n else ""))
+    metadatas = [{
+        "source": "pdf",
+        "filename": filename,
+        "chunk": i + 1,
+        "total_chunks": len(chunks),
+        "page_start": chunk["page_start"],
+        "page_end": chunk["page_end"],
+        "char_start": chunk["char_start"],
+        "char_end": chunk["char_end"],
+        "chunk_hash": hashes[i],
+        "timestamp": now
+    } for i, chunk in enumerate(chunks)]
+    return ids, documents, metadatas, hashes
+
+
+def existing_ids(collection, ids: list) -> set:
+    """Cek sekaligus ID mana saja yang sudah ada di collection."""
+    if not ids:
+        return set()
+    found = collection.get(ids=list(ids), include=[])
+    return set(found["ids"])
+
+
+def _add_in_batches(collection, ids: list, documents: list, metadatas: list,
+                    batch_size: int = INGEST_BATCH_SIZE):
+    """collection.add per batch (1x encode embedding per batch)."""
+    batch_size = max(1, batch_size)
+    for i in range(0, len(ids), batch_size):
+        collection.add(
+            ids=ids[i:i + batch_size],
+            documents=documents[i:i + batch_size],
+            metadatas=metadatas[i:i + batch_size]
+        )
+    if ids:
+        record_added(ids, documents, metadatas)
+
+
+def add_chunks_batched(collection, ids: list, documents: list, metadatas: list,
+                       batch_size: int = INGEST_BATCH_SIZE) -> dict:
+    """Simpan chunk baru ke ChromaDB dalam batch, lewati yang sudah ada.
+
+    Returns dict statistik: total, added, skipped, seconds, chunks_per_sec.
+    """
+    start = time.perf_counter()
+    already = existing_ids(collection, ids)
+
+    new_ids, new_docs, new_metas = [], [], []
+    for doc_id, doc, meta in zip(ids, documents, metadatas):
+        if doc_id in already:
+            continue
+        new_ids.append(doc_id)
+        new_docs.append(doc)
+        new_metas.append(meta)
+
+    _add_in_batches(collection, new_ids, new_docs, new_metas, batch_size)
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "total": len(ids),
+        "added": len(new_ids),
+        "skipped": len(ids) - len(new_ids),
+        "seconds": elapsed,
+        "chunks_per_sec": len(new_ids) / elapsed if elapsed > 0 and new_ids else 0.0,
+    }
+    print(f">>> [INGEST] {stats['added']} chunks baru, {stats['skipped']} dilewati "
+          f"({elapsed:.2f}s, {stats['chunks_per_sec']:.1f} chunks/s)")
+    return stats
+
+
+def plan_pdf_sync(collection, filename: str, ids: list, metadatas: list,
+                  manifest: dict) -> dict:
+    """Bandingkan chunk baru dengan yang tersimpan untuk satu file PDF.
+
+    Returns dict:
+        new: index chunk yang perlu di-embed
+        stale: ID lama yang sudah tidak ada di versi baru
+        moved: index chunk lama yang posisinya berubah (cukup update metadata)
+    """
+    entry = manifest.get(filename) or {}
+    old_ids = entry.get("chunk_ids")
+    if old_ids is None:
+        # Belum ada di manifest (mis. hasil ingest versi lama): cari via metadata
+        old_ids = collection.get(
+            where={"$and": [{"source": "pdf"}, {"filename": filename}]},
+            include=[]
+        )["ids"]
+
+    stored = collection.get(ids=list(ids), include=["metadatas"]) if ids else {"ids": [], "metadatas": []}
+    stored_meta = dict(zip(stored["ids"], stored["metadatas"] or [{}] * len(stored["ids"])))
+
+    new_set = set(ids)
+    plan = {"new": [], "stale": [d for d in old_ids if d not in new_set], "moved": []}
+    for i, doc_id in enumerate(ids):
+        if doc_id not in stored_meta:
+            plan["new"].append(i)
+        elif any((stored_meta[doc_id] or {}).get(k) != metadatas[i][k] for k in POSITION_KEYS):
+            plan["moved"].append(i)
+    return plan
+
+
+def delete_stale_chunks(collection, stale: list, batch_size: int = INGEST_BATCH_SIZE):
+    """Hapus chunk basi (ID lama yang tidak ada lagi di versi baru file)."""
+    batch_size = max(1, batch_size)
+    for i in range(0, len(stale), batch_size):
+        collection.delete(ids=stale[i:i + batch_size])
+    if stale:
+        record_deleted(stale)
+
+
+def apply_pdf_removals(collection, ids: list, metadatas: list, plan: dict,
+                       batch_size: int = INGEST_BATCH_SIZE, delete_stale: bool = True):
+    """Update metadata posisi chunk yang bergeser dan (opsional) hapus chunk basi.
+
+    delete_stale=False: chunk basi dihapus belakangan oleh pemanggil
+    (delete_stale_chunks) setelah chunk pengganti berhasil ditulis.
+    """
+    batch_size = max(1, batch_size)
+    if delete_stale:
+        delete_stale_chunks(collection, plan["stale"], batch_size)
+    moved = plan["moved"]
+    for i in range(0, len(moved), batch_size):
+        sel = moved[i:i + batch_size]
+        collection.update(ids=[ids[j] for j in sel], metadatas=[metadatas[j] for j in sel])
+    if moved:
+        record_updated([ids[j] for j in moved], [metadatas[j] for j in moved])
+
+
+def sync_pdf_chunks(collection, path: Path, chunks: list, manifest: dict = None,
+                    batch_size: int = INGEST_BATCH_SIZE) -> dict:
+    """Ingest inkremental satu PDF berdasarkan hash chunk.
+
+    `chunks` adalah list dict dari chunker.iter_chunk_spans.
+
+    Hanya chunk yang berubah yang di-embed, chunk basi dihapus, dan chunk
+    yang cuma bergeser posisi cukup di-update metadatanya.
+
+    Returns dict statistik: total, added, deleted, moved, seconds, chunks_per_sec.
+    """
+    start = time.perf_counter()
+    path = Path(path)
+    save_now = manifest is None
+    if save_now:
+        manifest = load_manifest()
+
+    ids, documents, metadatas, hashes = pdf_chunk_records(path.name, chunks)
+    plan = plan_pdf_sync(collection, path.name, ids, metadatas, manifest)
+    apply_pdf_removals(collection, ids, metadatas, plan, batch_size, delete_stale=False)
+    new = plan["new"]
+    _add_in_batches(collection, [ids[i] for i in new], [documents[i] for i in new],
+                    [metadatas[i] for i in new], batch_size)
+    # Chunk lama baru dihapus setelah penggantinya tersimpan
+    delete_stale_chunks(collection, plan["stale"], batch_size)
+    record_ingested(path, ids, hashes, manifest)
+    if save_now:
+        save_manifest(manifest)
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "total": len(ids),
+        "added": len(new),
+        "deleted": len(plan["stale"]),
+        "moved": len(plan["moved"]),
+        "seconds": elapsed,
+        "chunks_per_sec": len(new) / elapsed if elapsed > 0 and new else 0.0,
+    }
+    print(f">>> [INGEST] {path.name}: {stats['added']} chunks baru, {stats['deleted']} dihapus, "
+          f"{stats['moved']} bergeser ({elapsed:.2f}s, {stats['chunks_per_sec']:.1f} chunks/s)")
+    return stats
+
+
+# --- BULK INGESTION (PIPELINE) ---
+
+_STOP = object()
+
+
+def ingest_folder(collection, folder, chunk_fn=None, embedding_fn=None, entity_fn=None,
+                  workers: int = PDF_WORKERS, batch_size: int = INGEST_BATCH_SIZE,
+                  progress=None) -> dict:
+    """Ingest semua PDF di folder sebagai pipeline.
+
+    Tahapan berjalan bersamaan: ekstraksi (process pool) -> chunking
+    (thread pemanggil) -> embedding (thread) -> tulis ChromaDB (thread).
+    Ekstraksi entitas (LLM) berjalan di thread terpisah dan hanya untuk
+    file yang menghasilkan chunk baru. File yang tercatat di manifest dan
+    tidak berubah dilewati tanpa dibaca ulang; file yang berubah hanya
+    meng-embed chunk yang hash-nya berubah dan menghapus chunk basi.
+    Error satu file dicatat di summary["failed"] tanpa menghentikan file
+    lain; chunk basi file itu baru dihapus setelah semua chunk barunya
+    berhasil ditulis (file yang gagal tetap punya chunk lamanya).
+
+    Args:
+        chunk_fn: fungsi list teks per halaman -> list dict chunk
+            (default chunker.iter_chunk_spans)
+        embedding_fn: embedding function collection; None = biarkan Chroma
+        entity_fn: fungsi teks -> str ringkasan entitas (opsional)
+        progress: callback(selesai, total, filename) dipanggil per file
+    """
+    start = time.perf_counter()
+    chunk_fn = chunk_fn or iter_chunk_spans
+    folder = Path(folder)
+    manifest = load_manifest()
+    pdfs = sorted(folder.glob("*.pdf"))
+
+    summary = {
+        "files": len(pdfs),
+        "ingested": [],
+        "unchanged": [],
+        "failed": {},
+        "chunks_added": 0,
+        "chunks_skipped": 0,
+        "chunks_deleted": 0,
+        "entities": {},
+        "seconds": 0.0,
+        "chunks_per_sec": 0.0,
+    }
+
+    todo = []
+    for pdf in pdfs:
+        if is_unchanged(pdf, manifest):
+            summary["unchanged"].append(pdf.name)
+        else:
+            todo.append(pdf)
+
+    if not todo:
+        summary["seconds"] = time.perf_counter() - start
+        return summary
+
+    embed_q = queue.Queue(maxsize=4)
+    write_q = queue.Queue(maxsize=4)
+    entity_q = queue.Queue()
+    lock = threading.Lock()
+
+    def fail(filename, err):
+        with lock:
+            summary["failed"].setdefault(filename, str(err))
+
+    def embed_worker():
+        while True:
+            item = embed_q.get()
+            if item is _STOP:
+                write_q.put(_STOP)
+                return
+            filename, ids, docs, metas = item
+            try:
+                embeddings = embedding_fn(docs) if embedding_fn else None
+                write_q.put((filename, ids, docs, metas, embeddings))
+            except Exception as e:
+                fail(filename, e)
+
+    def write_worker():
+        while True:
+            item = write_q.get()
+            if item is _STOP:
+                return
+            filename, ids, docs, metas, embeddings = item
+            try:
+                kwargs = {"embeddings": embeddings} if embeddings is not None else {}
+                collection.add(ids=ids, documents=docs, metadatas=metas, **kwargs)
+                record_added(ids, docs, metas)
+                with lock:
+                    summary["chunks_added"] += len(ids)
+            except Exception as e:
+                fail(filename, e)
+
+    def entity_worker():
+        while True:
+            item = entity_q.get()
+            if item is _STOP:
+                return
+            filename, text = item
+            try:
+                summary["entities"][filename] = entity_fn(text)
+            except Exception as e:
+                summary["entities"][filename] = f"gagal: {e}"
+
+    threads = [threading.Thread(target=embed_worker, daemon=True),
+               threading.Thread(target=write_worker, daemon=True)]
+    if entity_fn:
+        threads.append(threading.Thread(target=entity_worker, daemon=True))
+    for t in threads:
+        t.start()
+
+    records = {}
+    done = 0
+    batch_size = max(1, batch_size)
+    try:
+        for path, pages in iter_extracted_pdfs(todo, workers):
+            path = Path(path)
+            done += 1
+            if isinstance(pages, Exception):
+                fail(path.name, pages)
+            elif not any(page.strip() for page in pages):
+                fail(path.name, "PDF kosong atau tidak bisa dibaca teksnya")
+            else:
+                try:
+                    chunks = list(chunk_fn(pages))
+                    ids, docs, metas, hashes = pdf_chunk_records(path.name, chunks)
+                    plan = plan_pdf_sync(collection, path.name, ids, metas, manifest)
+                    apply_pdf_removals(collection, ids, metas, plan, batch_size,
+                                       delete_stale=False)
+                    new = plan["new"]
+                    summary["chunks_skipped"] += len(ids) - len(new)
+                    records[path.name] = (ids, hashes, plan["stale"])
+
+                    for b in range(0, len(new), batch_size):
+                        sel = new[b:b + batch_size]
+                        embed_q.put((path.name, [ids[i] for i in sel],
+                                     [docs[i] for i in sel], [metas[i] for i in sel]))
+                    if new and entity_fn:
+                        entity_q.put((path.name, head_text(pages)))
+                except Exception as e:
+                    fail(path.name, e)
+            if progress:
+                progress(done, len(todo), path.name)
+    finally:
+        embed_q.put(_STOP)
+        entity_q.put(_STOP)
+        for t in threads:
+            t.join()
+
+    for pdf in todo:
+        if pdf.name in records and pdf.name not in summary["failed"]:
+            ids, hashes, stale = records[pdf.name]
+            try:
+                delete_stale_chunks(collection, stale, batch_size)
+            except Exception as e:
+                fail(pdf.name, e)
+                continue
+            summary["chunks_deleted"] += len(stale)
+            record_ingested(pdf, ids, hashes, manifest)
+            summary["ingested"].append(pdf.name)
+    save_manifest(manifest)
+
+    elapsed = time.perf_counter() - start
+    summary["seconds"] = elapsed
+    if elapsed > 0:
+        summary["chunks_per_sec"] = summary["chunks_added"] / elapsed
+    return summary
+
+
+def format_ingest_summary(summary: dict) -> str:
+    """Ringkasan hasil ingest_folder dalam satu teks."""
+    output = f"Load semua PDF selesai ({summary['files']} file, {summary['seconds']:.1f}s)\n"
+    output += f"- Di-ingest: {len(summary['ingested'])} file\n"
+    output += f"- Tidak berubah (dilewati): {len(summary['unchanged'])} file\n"
+    output += f"- Chunks baru: {summary['chunks_added']} ({summary['chunks_per_sec']:.1f} chunks/detik)\n"
+    output += f"- Chunks tidak berubah: {summary['chunks_skipped']}\n"
+    output += f"- Chunks basi dihapus: {summary['chunks_deleted']}"
+    for filename, msg in summary["entities"].items():
+        output += f"\n- Knowledge Graph [{filename}]: {msg}"
+    for filename, err in summary["failed"].items():
+        output += f"\n- GAGAL [{filename}]: {err}"
+    return output
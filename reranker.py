@@ -0,0 +1,98 @@
+"""
+reranker.py - Rerank Kandidat dengan Cross-Encoder (Opsional)
+=============================================================
+Ambil banyak kandidat murah dari pencarian vektor/BM25 (RERANK_CANDIDATES),
+lalu nilai ulang pasangan (pertanyaan, dokumen) dalam SATU batch
+cross-encoder di CPU dan simpan top_k terbaik saja. Prompt ke LLM jadi
+lebih kecil tapi lebih relevan.
+
+- Aktifkan dengan RERANK_ENABLED=true (butuh sentence-transformers)
+- Model dimuat di background saat pertama dipakai; selama belum siap,
+  urutan vektor dipakai apa adanya
+- Jika scoring melebihi RERANK_TIME_BUDGET_MS, kembali ke urutan vektor.
+  Batch yang ditinggalkan tetap berjalan di worker; selama worker masih
+  sibuk, rerank berikutnya langsung memakai urutan vektor (tidak antri)
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from config import RERANK_MODEL, RERANK_TIME_BUDGET_MS
+from vector_search import select_results
+
+_model = None
+_model_state = "idle"  # idle -> loading -> ready / failed
+_model_lock = threading.Lock()
+# Satu worker: model CPU dipakai bergantian, bukan paralel
+_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+_pending = None  # Future scoring terakhir; belum selesai = worker masih sibuk
+_pending_lock = threading.Lock()
+
+
+def _load_model():
+    global _model, _model_state
+    try:
+        from sentence_transformers import CrossEncoder
+        start = time.perf_counter()
+        _model = CrossEncoder(RERANK_MODEL, device="cpu")
+        _model_state = "ready"
+        print(f">>> [RERANK] Model {RERANK_MODEL} siap ({time.perf_counter() - start:.1f}s)")
+    except Exception as e:
+        _model_state = "failed"
+        print(f">>> [RERANK] Model tidak tersedia ({e}), rerank dinonaktifkan")
+
+
+def get_reranker():
+    """Model cross-encoder jika sudah siap, selain itu None (mulai load di background)."""
+    global _model_state
+    if _model_state == "ready":
+        return _model
+    with _model_lock:
+        if _model_state == "idle":
+            _model_state = "loading"
+            threading.Thread(target=_load_model, daemon=True).start()
+    return None
+
+
+def rerank(query: str, results: dict, top_k: int,
+           budget_ms: int = RERANK_TIME_BUDGET_MS) -> tuple:
+    """Urutkan ulang hasil query (format collection.query, 1 query).
+
+    Returns (results, final). final=False berarti urutan vektor dipakai
+    sementara (model masih dimuat / melebihi budget waktu), jadi hasilnya
+    sebaiknya tidak di-cache.
+    """
+    documents = results["documents"][0]
+    if len(documents) <= 1:
+        return _truncate(results, top_k), True
+    model = get_reranker()
+    if model is None:
+        return _truncate(results, top_k), _model_state == "failed"
+
+    global _pending
+    start = time.perf_counter()
+    with _pending_lock:
+        if _pending is not None and not _pending.done():
+            print(">>> [RERANK] Worker masih sibuk (batch sebelumnya), pakai urutan vektor")
+            return _truncate(results, top_k), False
+        future = _pending = _pool.submit(model.predict, [(query, doc) for doc in documents],
+                                         batch_size=len(documents), show_progress_bar=False)
+    try:
+        scores = future.result(timeout=budget_ms / 1000)
+    except TimeoutError:
+        print(f">>> [RERANK] Melebihi budget {budget_ms}ms, pakai urutan vektor")
+        return _truncate(results, top_k), False
+    except Exception as e:
+        print(f">>> [RERANK] Error ({e}), pakai urutan vektor")
+        return _truncate(results, top_k), False
+
+    order = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)[:top_k]
+    reranked = select_results(results, order)
+    reranked["rerank_scores"] = [[float(scores[i]) for i in order]]
+    print(f">>> [RERANK] {len(documents)} -> {len(order)} kandidat "
+          f"({(time.perf_counter() - start) * 1000:.0f}ms)")
+    return reranked, True
+
+
+def _truncate(results: dict, top_k: int) -> dict:
+    return select_results(results, range(min(top_k, len(results["ids"][0]))))
@@ -0,0 +1,87 @@
+"""
+retrieval.py - Retrieval Paralel dari Beberapa Sumber
+=====================================================
+ChromaDB dan Neo4j dicari bersamaan (thread pool), masing-masing dengan
+timeout sendiri. Hasil yang sudah kembali saat deadline tercapai langsung
+dipakai; sumber yang lambat dilewati untuk pertanyaan ini, sehingga satu
+Neo4j yang lambat tidak menunda semua jawaban.
+
+RequestContext membawa satu pertanyaan user melewati semua langkah:
+embedding dihitung sekali lalu dipakai ulang (ChromaDB, cache, klasifikasi),
+dan passage yang ditemukan (beserta metadata-nya) tetap tersedia setelah
+jawaban dibuat, tanpa query ulang.
+
+Dipakai oleh ASK / ASK_PDF / ASK_VISUAL di bot_super.py dan hybrid_search di web_ui.py.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from config import RETRIEVAL_TIMEOUTS
+
+_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retrieval")
+
+
+class RequestContext:
+    """State satu pertanyaan: teks, embedding (lazy, sekali) dan passage hasil retrieval."""
+
+    def __init__(self, text: str, embedding_fn):
+        self.text = text
+        self.embedding_fn = embedding_fn
+        self.passages = []
+        self._vector = None
+        self._lock = threading.Lock()
+
+    @property
+    def vector(self):
+        """Embedding pertanyaan (dihitung sekali, aman dipanggil dari beberapa thread)."""
+        if self._vector is None:
+            with self._lock:
+                if self._vector is None:
+                    self._vector = self.embedding_fn([self.text])[0]
+        return self._vector
+
+    def sources(self) -> set:
+        """Nilai metadata "source" dari passage yang dipakai sebagai konteks."""
+        return {p["metadata"].get("source") for p in self.passages}
+
+    def has_source(self, source: str) -> bool:
+        return source in self.sources()
+
+
+def fan_out(tasks: dict, timeouts: dict = None) -> dict:
+    """Jalankan {nama: fungsi_tanpa_argumen} secara paralel.
+
+    Setiap sumber punya deadline sendiri (detik, dihitung dari awal).
+    Returns {nama: hasil}; sumber yang timeout/error bernilai "".
+    Task yang timeout tetap berjalan di pool sampai selesai, jadi task tidak
+    boleh menulis state bersama (mis. ctx.passages): kembalikan hasilnya dan
+    biarkan pemanggil yang menyimpan.
+    """
+    timeouts = {**RETRIEVAL_TIMEOUTS, **(timeouts or {})}
+    start = time.monotonic()
+    futures = {name: _pool.submit(fn) for name, fn in tasks.items()}
+
+    results = {}
+    for name, future in futures.items():
+        limit = timeouts.get(name, timeouts["default"])
+        try:
+            results[name] = future.result(timeout=max(0.0, start + limit - time.monotonic()))
+        except TimeoutError:
+            print(f">>> [RETRIEVAL] {name} melebihi {limit:.1f}s, dilewati")
+            results[name] = ""
+        except Exception as e:
+            print(f">>> [RETRIEVAL] {name} error: {e}")
+            results[name] = ""
+    print(f">>> [RETRIEVAL] {', '.join(tasks)} selesai dalam "
+          f"{(time.monotonic() - start) * 1000:.0f}ms")
+    return results
+
+
+def search_graph_context(query: str) -> str:
+    """Konteks dari Neo4j (koneksi dipakai ulang jika sudah terhubung)."""
+    from neo4j_graph import get_graph
+    graph = get_graph()
+    if not graph.connected and not graph.connect():
+        return ""
+    return graph.search_graph(query)
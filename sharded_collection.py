@@ -0,0 +1,334 @@
+"""
+sharded_collection.py - Collection ChromaDB per Sumber (Shard)
+==============================================================
+Dokumen disimpan di collection terpisah per sumber (mis. "agent_memory_pdf"
+untuk chunk PDF, "agent_memory_memory" untuk memory user & hasil import),
+di balik router yang punya API sama dengan collection ChromaDB
+(add/get/query/update/delete/count). Script lain tidak perlu tahu.
+
+- Query dengan filter source (mis. where={"source": "pdf"}) hanya mencari
+  di shard itu, jadi graph HNSW yang dijelajahi lebih kecil
+- Query tanpa filter source di-fan-out paralel ke semua shard (query
+  di-embed sekali), lalu hasilnya digabung berdasarkan jarak
+- Satu shard bisa di-reset / dibangun ulang tanpa menyentuh yang lain
+- Database lama (satu collection "agent_memory") TIDAK dipindahkan
+  otomatis; jalankan migrasi secara eksplisit (lihat CLI). Embedding ikut
+  disalin (tanpa embed ulang) dan collection lama baru dihapus setelah
+  semua id-nya terbukti ada di shard
+
+CLI:
+    python sharded_collection.py status     # jumlah dokumen per shard
+    python sharded_collection.py migrate    # pindahkan collection lama ke shard
+
+Pakai open_collection() untuk membuka collection (sharded atau tidak,
+sesuai COLLECTION_SHARDING). Collection baru dibuat dengan parameter HNSW
+dari config.py (HNSW_SPACE, HNSW_M, HNSW_CONSTRUCTION_EF, HNSW_SEARCH_EF);
+collection yang sudah ada tetap memakai parameter saat dibuat.
+"""
+import heapq
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from config import (
+    COLLECTION_NAME, COLLECTION_SHARDING, COLLECTION_SHARDS,
+    HNSW_SPACE, HNSW_M, HNSW_CONSTRUCTION_EF, HNSW_SEARCH_EF
+)
+
+DEFAULT_SHARD = COLLECTION_SHARDS[-1]
+_DEFAULT_INCLUDE = ("metadatas", "documents")
+_MIGRATE_PAGE_SIZE = 1000
+
+# Nilai bawaan ChromaDB untuk collection yang dibuat tanpa metadata HNSW
+_CHROMA_HNSW_DEFAULTS = {"hnsw:space": "l2", "hnsw:M": 16,
+                         "hnsw:construction_ef": 100, "hnsw:search_ef": 10}
+
+_pool = ThreadPoolExecutor(max_workers=len(COLLECTION_SHARDS), thread_name_prefix="shard")
+
+
+def hnsw_metadata(space: str = HNSW_SPACE, m: int = HNSW_M,
+                  construction_ef: int = HNSW_CONSTRUCTION_EF,
+                  search_ef: int = HNSW_SEARCH_EF) -> dict:
+    """Metadata collection ChromaDB untuk parameter HNSW."""
+    return {"hnsw:space": space, "hnsw:M": m,
+            "hnsw:construction_ef": construction_ef, "hnsw:search_ef": search_ef}
+
+
+def get_or_create(client, name: str, embedding_function):
+    """get_or_create_collection dengan parameter HNSW dari config.
+
+    Parameter HNSW tidak bisa diubah setelah collection dibuat; jika
+    collection lama berbeda dari config, tampilkan peringatan saja.
+    """
+    try:
+        collection = client.get_collection(name=name, embedding_function=embedding_function)
+    except Exception:
+        return client.get_or_create_collection(
+            name=name,
+            embedding_function=embedding_function,
+            metadata=hnsw_metadata()
+        )
+    current = {**_CHROMA_HNSW_DEFAULTS, **(collection.metadata or {})}
+    changed = {key: current.get(key) for key, value in hnsw_metadata().items()
+               if current.get(key) != value}
+    if changed:
+        print(f">>> [HNSW] Collection '{name}' masih memakai {changed}; config baru berlaku "
+              f"setelah collection dibuat ulang (export json -> reset db -> import json)")
+    return collection
+
+
+def shard_for(metadata: dict) -> str:
+    """Nama shard untuk satu dokumen (berdasarkan metadata "source")."""
+    source = (metadata or {}).get("source")
+    return source if source in COLLECTION_SHARDS else DEFAULT_SHARD
+
+
+def _where_sources(where: dict):
+    """Nilai "source" yang dikunci oleh filter where, atau None jika tidak dikunci."""
+    if not where:
+        return None
+    if "source" in where:
+        cond = where["source"]
+        if isinstance(cond, dict):
+            if "$eq" in cond:
+                return {cond["$eq"]}
+            if "$in" in cond:
+                return set(cond["$in"])
+            return None
+        return {cond}
+    if "$and" in where:
+        for cond in where["$and"]:
+            sources = _where_sources(cond)
+            if sources is not None:
+                return sources
+    return None
+
+
+class ShardedCollection:
+    """Router ke beberapa collection ChromaDB dengan API seperti satu collection."""
+
+    def __init__(self, client, embedding_function, name: str = COLLECTION_NAME,
+                 shards: tuple = COLLECTION_SHARDS):
+        self.client = client
+        self.name = name
+        self.embedding_function = embedding_function
+        self.shards = {shard: self._open_shard(shard) for shard in shards}
+
+    def _open_shard(self, shard: str):
+        return get_or_create(self.client, f"{self.name}_{shard}", self.embedding_function)
+
+    def _targets(self, where: dict = None) -> list:
+        sources = _where_sources(where)
+        if sources is None:
+            return list(self.shards)
+        return sorted({shard_for({"source": s}) for s in sources})
+
+    # --- API seperti collection ChromaDB ---
+
+    @property
+    def metadata(self) -> dict:
+        """Metadata collection (parameter HNSW); semua shard dibuat dengan config yang sama."""
+        return next(iter(self.shards.values())).metadata
+
+    @property
+    def id(self) -> str:
+        """Gabungan id ChromaDB semua shard (berubah jika shard dibuat ulang)."""
+        return "+".join(str(shard.id) for shard in self.shards.values())
+
+    def count(self) -> int:
+        return sum(shard.count() for shard in self.shards.values())
+
+    def add(self, ids: list, documents: list = None, metadatas: list = None,
+            embeddings: list = None):
+        groups = {}
+        for i, meta in enumerate(metadatas or [None] * len(ids)):
+            groups.setdefault(shard_for(meta), []).append(i)
+        for shard, rows in groups.items():
+            kwargs = {"ids": [ids[i] for i in rows]}
+            if documents is not None:
+                kwargs["documents"] = [documents[i] for i in rows]
+            if metadatas is not None:
+                kwargs["metadatas"] = [metadatas[i] for i in rows]
+            if embeddings is not None:
+                kwargs["embeddings"] = [embeddings[i] for i in rows]
+            self.shards[shard].add(**kwargs)
+
+    def get(self, ids: list = None, where: dict = None, limit: int = None,
+            offset: int = None, include: list = _DEFAULT_INCLUDE) -> dict:
+        include = list(include)
+        merged = {"ids": [], **{key: [] for key in include}}
+        skip, remaining = offset or 0, limit
+        for shard in self._targets(where):
+            collection = self.shards[shard]
+            kwargs = {"include": include}
+            if ids is not None:
+                kwargs["ids"] = list(ids)
+            if where:
+                kwargs["where"] = where
+            if limit is not None or offset:
+                # Paging lintas shard (dipakai tanpa where): lewati shard yang
+                # seluruhnya masih di dalam offset
+                size = collection.count()
+                if skip >= size:
+                    skip -= size
+                    continue
+                if remaining is not None and remaining <= 0:
+                    break
+                kwargs["offset"] = skip
+                if remaining is not None:
+                    kwargs["limit"] = remaining
+                skip = 0
+            page = collection.get(**kwargs)
+            merged["ids"] += page["ids"]
+            for key in include:
+                merged[key] += list(page[key]) if page.get(key) is not None else []
+            if remaining is not None:
+                remaining -= len(page["ids"])
+        return merged
+
+    def query(self, query_texts: list = None, query_embeddings: list = None,
+              n_results: int = 10, where: dict = None,
+              include: list = ("metadatas", "documents", "distances")) -> dict:
+        include = list(include)
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(list(query_texts))
+        targets = [(shard, self.shards[shard].count()) for shard in self._targets(where)]
+        targets = [(shard, size) for shard, size in targets if size > 0]
+
+        def run(shard, size):
+            kwargs = {"query_embeddings": query_embeddings,
+                      "n_results": min(n_results, size),
+                      "include": list(set(include) | {"distances"})}
+            if where:
+                kwargs["where"] = where
+            return self.shards[shard].query(**kwargs)
+
+        if len(targets) == 1:
+            partials = [run(*targets[0])]
+        else:
+            partials = [f.result() for f in [_pool.submit(run, *t) for t in targets]]
+
+        keys = ["ids"] + [key for key in include if key != "distances"]
+        merged = {key: [] for key in keys + ["distances"]}
+        for q in range(len(query_embeddings)):
+            rows = []
+            for part in partials:
+                for i, distance in enumerate(part["distances"][q]):
+                    rows.append((distance, tuple(part[key][q][i] for key in keys)))
+            best = heapq.nsmallest(n_results, rows, key=lambda row: row[0])
+            merged["distances"].append([distance for distance, _ in best])
+            for k, key in enumerate(keys):
+                merged[key].append([values[k] for _, values in best])
+        if "distances" not in include:
+            merged.pop("distances")
+        return merged
+
+    def update(self, ids: list, metadatas: list = None, documents: list = None):
+        position = {doc_id: i for i, doc_id in enumerate(ids)}
+        for collection in self.shards.values():
+            found = collection.get(ids=list(ids), include=[])["ids"]
+            if not found:
+                continue
+            kwargs = {"ids": found}
+            if metadatas is not None:
+                kwargs["metadatas"] = [metadatas[position[doc_id]] for doc_id in found]
+            if documents is not None:
+                kwargs["documents"] = [documents[position[doc_id]] for doc_id in found]
+            collection.update(**kwargs)
+
+    def delete(self, ids: list = None, where: dict = None):
+        for shard in self._targets(where):
+            self.shards[shard].delete(ids=ids, where=where)
+
+    # --- Operasi per shard ---
+
+    def reset(self, shard: str = None):
+        """Kosongkan satu shard (atau semua jika shard=None)."""
+        for name in ([shard] if shard else list(self.shards)):
+            self.client.delete_collection(f"{self.name}_{name}")
+            self.shards[name] = self._open_shard(name)
+
+    def shard_counts(self) -> dict:
+        return {shard: collection.count() for shard, collection in self.shards.items()}
+
+    def migrate_legacy(self) -> str:
+        """Salin isi collection lama (tanpa shard) ke shard.
+
+        Aman diulang: id yang sudah ada di shard dilewati. Collection lama
+        hanya dihapus jika semua id-nya ditemukan di shard; jika tidak (atau
+        error di tengah jalan), collection lama tetap utuh.
+        """
+        legacy = _legacy_collection(self.client, self.embedding_function)
+        if legacy is None:
+            return f"Collection lama '{self.name}' tidak ada, tidak ada yang dipindahkan."
+        total = legacy.count()
+        print(f">>> [SHARD] Memindahkan {total} dokumen dari '{self.name}' ke shard...")
+        found = 0
+        for offset in range(0, total, _MIGRATE_PAGE_SIZE):
+            page = legacy.get(include=["documents", "metadatas", "embeddings"],
+                              limit=_MIGRATE_PAGE_SIZE, offset=offset)
+            present = set(self.get(ids=page["ids"], include=[])["ids"])
+            rows = [i for i, doc_id in enumerate(page["ids"]) if doc_id not in present]
+            if rows:
+                self.add(ids=[page["ids"][i] for i in rows],
+                         documents=[page["documents"][i] for i in rows],
+                         metadatas=[page["metadatas"][i] for i in rows],
+                         embeddings=[page["embeddings"][i] for i in rows])
+            found += len(self.get(ids=page["ids"], include=[])["ids"])
+        if found != total:
+            return (f"[ERROR] Hanya {found}/{total} dokumen ditemukan di shard; collection "
+                    f"lama '{self.name}' tidak dihapus. Jalankan migrasi lagi.")
+        self.client.delete_collection(self.name)
+        return f"[OK] {total} dokumen dipindahkan, collection lama dihapus. Shard: {self.shard_counts()}"
+
+
+def _legacy_collection(client, embedding_function):
+    """Collection lama tanpa shard ("agent_memory"), atau None jika tidak ada."""
+    try:
+        return client.get_collection(COLLECTION_NAME, embedding_function=embedding_function)
+    except Exception:
+        return None
+
+
+def open_collection(client, embedding_function):
+    """Collection utama: ShardedCollection jika COLLECTION_SHARDING aktif."""
+    if not COLLECTION_SHARDING:
+        return get_or_create(client, COLLECTION_NAME, embedding_function)
+    collection = ShardedCollection(client, embedding_function)
+    legacy = _legacy_collection(client, embedding_function)
+    if legacy is not None and legacy.count():
+        print(f">>> [SHARD] Collection lama '{COLLECTION_NAME}' ({legacy.count()} dokumen) belum "
+              f"dipindahkan ke shard. Jalankan: python sharded_collection.py migrate")
+    return collection
+
+
+def reset_collection(client, embedding_function, shard: str = None):
+    """Kosongkan collection utama (atau satu shard). Returns collection baru."""
+    if not COLLECTION_SHARDING:
+        client.delete_collection(COLLECTION_NAME)
+        return open_collection(client, embedding_function)
+    collection = ShardedCollection(client, embedding_function)
+    collection.reset(shard)
+    return collection
+
+
+def main():
+    import chromadb
+    from config import CHROMA_DB_PATH
+    from embeddings import get_embedding_function
+
+    client = chromadb.PersistentClient(path=str(CHROMA_DB_PATH))
+    collection = ShardedCollection(client, get_embedding_function())
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    if command == "migrate":
+        print(collection.migrate_legacy())
+    elif command == "status":
+        legacy = _legacy_collection(client, collection.embedding_function)
+        print(f"Shard: {collection.shard_counts()}")
+        print(f"Collection lama '{COLLECTION_NAME}': "
+              f"{f'{legacy.count()} dokumen' if legacy is not None else 'tidak ada'}")
+    else:
+        print(__doc__)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+vector_search.py - Satu Pintu Query Vektor
+==========================================
+Dipakai oleh cari_memory / cari_pdf_only (bot_super.py), cari (bot_rag.py)
+dan hybrid_search (web_ui.py), sehingga mode pencarian (HNSW penuh
+atau index ringkas) cukup diatur di config.py.
+
+Jika HYBRID_SEARCH aktif, query vektor dan BM25 (bm25_index.py) berjalan
+paralel lalu digabung dengan Reciprocal Rank Fusion. Jika RERANK_ENABLED,
+RERANK_CANDIDATES kandidat dinilai ulang oleh cross-encoder (reranker.py)
+sebelum diambil top_k.
+
+Hasil query di-cache (LRU) per (query ternormalisasi, filter, top_k).
+Setiap perubahan isi collection (simpan, ingest PDF, import, reset)
+menaikkan versi collection yang disimpan di file, sehingga cache lama
+di semua proses otomatis tidak dipakai lagi. Perubahan dilaporkan lewat
+record_added / record_deleted / record_updated / record_replaced, yang
+sekaligus meng-update index BM25 dan membuang jawaban di answer_cache.py
+yang memakai chunk tersebut.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from config import (
+    VECTOR_SEARCH_MODE, QUERY_CACHE_SIZE, COLLECTION_VERSION_PATH,
+    HYBRID_SEARCH, HYBRID_CANDIDATES, RRF_K, RERANK_ENABLED, RERANK_CANDIDATES
+)
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="search")
+
+# Key hasil query (format collection.query) yang ikut diurutkan/dipotong bersama
+RESULT_KEYS = ("ids", "documents", "metadatas", "distances", "embeddings",
+               "scores", "rerank_scores")
+
+
+def matches_where(meta: dict, where: dict) -> bool:
+    """Evaluasi filter `where` gaya ChromaDB terhadap satu metadata."""
+    if not where:
+        return True
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(matches_where(meta, c) for c in cond):
+                return False
+        elif key == "$or":
+            if not any(matches_where(meta, c) for c in cond):
+                return False
+        elif isinstance(cond, dict):
+            value = meta.get(key)
+            for op, target in cond.items():
+                if op == "$eq" and value != target:
+                    return False
+                if op == "$ne" and value == target:
+                    return False
+                if op == "$in" and value not in target:
+                    return False
+                if op == "$nin" and value in target:
+                    return False
+                if op in ("$gt", "$gte", "$lt", "$lte"):
+                    if value is None:
+                        return False
+                    if op == "$gt" and not value > target:
+                        return False
+                    if op == "$gte" and not value >= target:
+                        return False
+                    if op == "$lt" and not value < target:
+                        return False
+                    if op == "$lte" and not value <= target:
+                        return False
+        elif meta.get(key) != cond:
+            return False
+    return True
+
+
+# --- VERSI COLLECTION ---
+
+def collection_version() -> int:
+    """Versi isi collection saat ini (naik setiap ada perubahan)."""
+    try:
+        return int(COLLECTION_VERSION_PATH.read_text().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def bump_collection_version() -> int:
+    """Tandai collection berubah. Panggil setelah add/delete/update/reset/import."""
+    with _cache_lock:
+        version = collection_version() + 1
+        tmp = COLLECTION_VERSION_PATH.with_name(COLLECTION_VERSION_PATH.name + ".tmp")
+        tmp.write_text(str(version))
+        os.replace(tmp, COLLECTION_VERSION_PATH)
+        _cache.clear()
+    return version
+
+
+def _update_bm25(action: str, *args):
+    try:
+        import bm25_index
+        getattr(bm25_index, action)(*args)
+    except Exception as e:
+        print(f">>> [BM25] Gagal update index ({e}), akan dibangun ulang saat query")
+
+
+def _invalidate_answers(chunk_ids: list = None):
+    """chunk_ids=None: kosongkan seluruh cache jawaban."""
+    try:
+        import answer_cache
+        if chunk_ids is None:
+            answer_cache.clear()
+        else:
+            answer_cache.invalidate_chunks(chunk_ids)
+    except Exception as e:
+        print(f">>> [ANSWER CACHE] Gagal invalidasi ({e})")
+
+
+def record_added(ids: list, documents: list, metadatas: list = None):
+    """Panggil setelah collection.add."""
+    _update_bm25("add_documents", ids, documents, metadatas)
+    bump_collection_version()
+
+
+def record_deleted(ids: list):
+    """Panggil setelah collection.delete."""
+    _update_bm25("remove_documents", ids)
+    _invalidate_answers(ids)
+    bump_collection_version()
+
+
+def record_updated(ids: list, metadatas: list):
+    """Panggil setelah collection.update (metadata saja)."""
+    _update_bm25("update_metadatas", ids, metadatas)
+    _invalidate_answers(ids)
+    bump_collection_version()
+
+
+def record_replaced():
+    """Panggil setelah reset/import database (collection diganti seluruhnya)."""
+    _update_bm25("clear")
+    _invalidate_answers()
+    bump_collection_version()
+
+
+# --- QUERY CACHE ---
+
+def _cache_key(collection, query: str, n_results: int, where: dict) -> tuple:
+    normalized = " ".join(query.lower().split())
+    # Nama + id ChromaDB: collection lain (bot_rag, hnsw_sweep, ...) tidak berbagi entri
+    identity = (getattr(collection, "name", None), str(getattr(collection, "id", id(collection))))
+    return identity + (normalized, n_results, json.dumps(where, sort_keys=True),
+                       VECTOR_SEARCH_MODE, HYBRID_SEARCH, RERANK_ENABLED)
+
+
+def query_cache_stats() -> dict:
+    """Statistik cache hasil query (proses ini)."""
+    with _cache_lock:
+        total = _stats["hits"] + _stats["misses"]
+        return {
+            "hits": _stats["hits"],
+            "misses": _stats["misses"],
+            "hit_rate": _stats["hits"] / total if total else 0.0,
+            "size": len(_cache),
+            "max_size": QUERY_CACHE_SIZE,
+            "version": collection_version(),
+        }
+
+
+def query_collection(collection, embedding_fn, query: str, n_results: int,
+                     where: dict = None, include_embeddings: bool = False,
+                     query_vector=None) -> dict:
+    """Query satu teks ke collection. Returns dict format collection.query.
+
+    include_embeddings=True ikut mengembalikan embedding tiap hasil
+    (dipakai context_packer untuk MMR tanpa query ulang). query_vector
+    (embedding `query` yang sudah dihitung) dipakai langsung tanpa embed ulang.
+    """
+    key = _cache_key(collection, query, n_results, where) + (include_embeddings,)
+    version = collection_version()
+    if QUERY_CACHE_SIZE > 0:
+        with _cache_lock:
+            cached = _cache.get(key)
+            if cached is not None and cached[0] == version:
+                _cache.move_to_end(key)
+                _stats["hits"] += 1
+                return cached[1]
+            _stats["misses"] += 1
+
+    n_fetch = n_results
+    if RERANK_ENABLED:
+        n_fetch = max(n_results, min(RERANK_CANDIDATES, collection.count()))
+    if HYBRID_SEARCH:
+        results = _run_hybrid(collection, embedding_fn, query, n_fetch, where,
+                              include_embeddings, query_vector)
+    else:
+        results = _run_query(collection, embedding_fn, query, n_fetch, where,
+                             include_embeddings, query_vector)
+
+    cacheable = True
+    if RERANK_ENABLED:
+        from reranker import rerank
+        results, cacheable = rerank(query, results, n_results)
+
+    if QUERY_CACHE_SIZE > 0 and cacheable:
+        with _cache_lock:
+            _cache[key] = (version, results)
+            _cache.move_to_end(key)
+            while len(_cache) > QUERY_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return results
+
+
+def select_results(results: dict, order) -> dict:
+    """Ambil baris `order` (list index) dari hasil query format collection.query."""
+    selected = {}
+    for key in RESULT_KEYS:
+        values = results.get(key)
+        if values is None or values[0] is None:
+            continue
+        selected[key] = [[values[0][i] for i in order]]
+    return selected
+
+
+def _run_query(collection, embedding_fn, query: str, n_results: int,
+               where: dict = None, include_embeddings: bool = False,
+               query_vector=None) -> dict:
+    if VECTOR_SEARCH_MODE == "compact":
+        from compact_index import query_compact
+        try:
+            results = query_compact(collection, embedding_fn, query, n_results, where,
+                                    include_embeddings, query_vector)
+            if results is not None:
+                return results
+        except Exception as e:
+            print(f">>> [COMPACT] Error ({e}), pakai query ChromaDB biasa")
+
+    if query_vector is not None:
+        kwargs = {"query_embeddings": [query_vector], "n_results": n_results}
+    else:
+        kwargs = {"query_texts": [query], "n_results": n_results}
+    if where:
+        kwargs["where"] = where
+    if include_embeddings:
+        kwargs["include"] = ["documents", "metadatas", "distances", "embeddings"]
+    return collection.query(**kwargs)
+
+
+# --- HYBRID (VEKTOR + BM25) ---
+
+def rrf_merge(rankings: list, k: int = RRF_K) -> list:
+    """Reciprocal Rank Fusion. rankings = list of list ID. Returns [(id, skor)]."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def _lexical_ids(collection, query: str, n_results: int, where: dict) -> list:
+    import bm25_index
+    bm25_index.ensure_synced(collection)
+    return [doc_id for doc_id, _ in bm25_index.search(query, n_results, where)]
+
+
+def _run_hybrid(collection, embedding_fn, query: str, n_results: int,
+                where: dict = None, include_embeddings: bool = False,
+                query_vector=None) -> dict:
+    n_candidates = max(1, min(max(n_results, HYBRID_CANDIDATES), collection.count()))
+    # Vektor di thread pool, BM25 (milidetik) di thread ini
+    vector_future = _pool.submit(_run_query, collection, embedding_fn, query,
+                                 n_candidates, where, include_embeddings, query_vector)
+    try:
+        lexical = _lexical_ids(collection, query, n_candidates, where)
+    except Exception as e:
+        print(f">>> [BM25] Error ({e}), pakai hasil vektor saja")
+        lexical = []
+    vector = vector_future.result()
+    if not lexical:
+        return select_results(vector, range(min(n_results, len(vector["ids"][0]))))
+
+    fused = rrf_merge([vector["ids"][0], lexical])[:n_results]
+    rows = {}
+    for i, doc_id in enumerate(vector["ids"][0]):
+        rows[doc_id] = {
+            "documents": vector["documents"][0][i],
+            "metadatas": vector["metadatas"][0][i],
+            "distances": vector["distances"][0][i] if vector.get("distances") else None,
+            "embeddings": vector["embeddings"][0][i] if include_embeddings else None,
+        }
+    missing = [doc_id for doc_id, _ in fused if doc_id not in rows]
+    if missing:
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        stored = collection.get(ids=missing, include=include)
+        for i, doc_id in enumerate(stored["ids"]):
+            rows[doc_id] = {
+                "documents": stored["documents"][i],
+                "metadatas": stored["metadatas"][i],
+                "distances": None,  # Hanya ditemukan BM25: tanpa jarak vektor
+                "embeddings": stored["embeddings"][i] if include_embeddings else None,
+            }
+
+    fused = [(doc_id, score) for doc_id, score in fused if doc_id in rows]
+    results = {"ids": [[doc_id for doc_id, _ in fused]],
+               "scores": [[score for _, score in fused]]}
+    for key in ("documents", "metadatas", "distances", "embeddings"):
+        if key != "embeddings" or include_embeddings:
+            results[key] = [[rows[doc_id][key] for doc_id, _ in fused]]
+    return results
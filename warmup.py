@@ -0,0 +1,83 @@
+"""
+warmup.py - Pemanasan Model di Background + Gerbang Kesiapan
+============================================================
+Memuat model (Ollama, embedding) bisa makan waktu menit. Pemanasan
+dijalankan di thread background per komponen sehingga script langsung
+siap menerima perintah; status tiap komponen bisa dicek kapan saja.
+
+- start(nama, fungsi): jalankan pemanasan sekali per proses (dipanggil
+  ulang tidak memulai thread baru)
+- state(nama): "idle" (belum dimulai), "pending", "ready" atau "failed"
+- wait(nama): tunggu sampai pemanasan selesai. Hanya perintah yang butuh
+  komponen itu yang menunggu (mis. tanya LLM), perintah lain (list pdf,
+  export db, show graph) langsung jalan
+- status() / format_status(): ringkasan untuk CLI & web UI
+
+Komponen yang gagal dipanaskan tetap dipakai seperti biasa (request
+pertama mungkin lambat / error seperti tanpa pemanasan).
+"""
+import threading
+import time
+
+_lock = threading.Lock()
+_components = {}  # nama -> {"state", "event", "started", "seconds", "detail"}
+
+
+def start(name: str, fn):
+    """Jalankan fn() di background. Sukses jika fn tidak error dan tidak mengembalikan False."""
+    with _lock:
+        if name in _components:
+            return
+        component = {"state": "pending", "event": threading.Event(),
+                     "started": time.monotonic(), "seconds": None, "detail": ""}
+        _components[name] = component
+
+    def run():
+        try:
+            ok = fn() is not False
+            component["state"] = "ready" if ok else "failed"
+        except Exception as e:
+            component["state"] = "failed"
+            component["detail"] = str(e)
+            print(f">>> [WARMUP] {name} gagal: {e}")
+        component["seconds"] = time.monotonic() - component["started"]
+        component["event"].set()
+
+    threading.Thread(target=run, daemon=True, name=f"warmup-{name}").start()
+
+
+def state(name: str) -> str:
+    component = _components.get(name)
+    return component["state"] if component else "idle"
+
+
+def wait(name: str, timeout: float = None) -> str:
+    """Tunggu pemanasan `name` selesai (atau timeout). Returns state terakhir."""
+    component = _components.get(name)
+    if component is None:
+        return "idle"
+    if not component["event"].is_set():
+        print(f">>> [WARMUP] Menunggu {name} siap...")
+        component["event"].wait(timeout)
+    return component["state"]
+
+
+def status() -> dict:
+    """{nama: {"state", "seconds", "detail"}}; seconds = lama pemanasan (atau sejauh ini)."""
+    now = time.monotonic()
+    return {
+        name: {
+            "state": c["state"],
+            "seconds": c["seconds"] if c["seconds"] is not None else now - c["started"],
+            "detail": c["detail"],
+        }
+        for name, c in list(_components.items())
+    }
+
+
+def format_status() -> str:
+    icons = {"pending": "⏳", "ready": "✓", "failed": "✗"}
+    lines = [f"{icons.get(info['state'], '?')} {name}: {info['state']} ({info['seconds']:.1f}s)"
+             + (f" - {info['detail']}" if info["detail"] else "")
+             for name, info in status().items()]
+    return "STATUS MODEL:\n" + ("\n".join(lines) if lines else "(belum ada pemanasan)")
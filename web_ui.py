@@ -102,21 +102,17 @@ st.markdown("""
 def init_bot():
     """Initialize bot components (cached)."""
     import chromadb
-    from chromadb.utils import embedding_functions
+    from embeddings import get_embedding_function
+    from sharded_collection import open_collection
     from config import (
-        OLLAMA_API_URL, OLLAMA_MODEL, CHROMA_DB_PATH, EMBEDDING_MODEL, RAG_TOP_K,
+        OLLAMA_API_URL, OLLAMA_MODEL, CHROMA_DB_PATH, RAG_TOP_K,
         CODING_OUTPUT_DIR
     )
     
     #Setup ChromaDB
-    embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name=EMBEDDING_MODEL
-    )
+    embedding_fn = get_embedding_function(background=True)
     chroma_client = chromadb.PersistentClient(path=str(CHROMA_DB_PATH))
-    collection = chroma_client.get_or_create_collection(
-        name="agent_memory",
-        embedding_function=embedding_fn
-    )
+    collection = open_collection(chroma_client, embedding_fn)
     
     # Neo4j
     neo4j_available = False
@@ -141,9 +137,9 @@ def init_bot():
 
 def check_ollama(url):
     """Cek apakah Ollama berjalan."""
-    import requests
+    from llm_client import api_get
     try:
-        r = requests.get(f"{url}/api/tags", timeout=3)
+        r = api_get("/api/tags", base_url=url, timeout=3)
         return r.status_code == 200
     except:
         return False
@@ -161,18 +157,14 @@ def check_neo4j():
 
 
 def warmup_ollama(url, model):
-    """Pemanasan model (load ke RAM)."""
-    import requests
+    """Pemanasan model (load ke RAM). Dijalankan di background lewat warmup.start."""
+    from llm_client import api_post, generate
     try:
         # Cek apakah model sudah loaded
-        r = requests.post(f"{url}/api/show", json={"name": model}, timeout=3)
+        r = api_post("/api/show", {"name": model}, base_url=url, timeout=3)
         if r.status_code == 200:
-            # Kirim empty request untuk trigger load
-            requests.post(
-                f"{url}/api/generate",
-                json={"model": model, "prompt": "hi", "stream": False},
-                timeout=5
-            )
+            # Kirim request kecil untuk trigger load
+            generate("hi", model=model, base_url=url, timeout=120)
             return True
     except:
         pass
@@ -180,44 +172,116 @@ def warmup_ollama(url, model):
 
 
 
-def tanya_llm_web(prompt, context, bot):
-    """Kirim ke Ollama LLM."""
-    import requests
-    full_prompt = prompt
+def wait_for_llm():
+    """Tunggu warm-up model selesai (hanya sebelum memanggil LLM)."""
+    import warmup
+    if warmup.state("llm") == "pending":
+        with st.spinner("🔥 Model masih dimuat, sebentar..."):
+            warmup.wait("llm")
+
+
+def tanya_llm_web(prompt, context, bot, ctx=None, chat=None, stats=None):
+    """Kirim ke Ollama LLM (jawaban pertanyaan mirip diambil dari answer_cache).
+
+    chat: ChatSession percakapan ini; jika diberikan, riwayat ikut dikirim
+    lewat /api/chat dan cache jawaban hanya dipakai untuk giliran pertama.
+    stats (opsional) diisi statistik Ollama (lihat llm_client.format_stats).
+    """
+    from answer_cache import lookup, store
+    from config import ANSWER_CACHE_ENABLED
+    full_prompt = _full_prompt(prompt, context)
+    if not ANSWER_CACHE_ENABLED or (chat is not None and chat.turns()):
+        return _tanya_llm_web(full_prompt, bot, chat, stats)
+    vector = ctx.vector if ctx else bot["embedding_fn"]([prompt])[0]
+    cached = lookup(vector, context, bot['ollama_model'])
+    if cached is not None:
+        if chat is not None:
+            chat.record(full_prompt, cached)
+        if stats is not None:
+            stats["cached"] = True
+        return cached
+    answer = _tanya_llm_web(full_prompt, bot, chat, stats)
+    store(prompt, vector, context, bot['ollama_model'], answer,
+          [p["id"] for p in ctx.passages] if ctx else None)
+    return answer
+
+
+def _full_prompt(prompt, context):
     if context:
-        full_prompt = f"{context}\n\nBerdasarkan informasi di atas, jawab:\n{prompt}"
-    
+        return f"{context}\n\nBerdasarkan informasi di atas, jawab:\n{prompt}"
+    return prompt
+
+
+def _tanya_llm_web(full_prompt, bot, chat=None, stats=None):
+    from llm_client import generate, LLMError, LLMBusy
     try:
-        response = requests.post(
-            f"{bot['ollama_url']}/api/generate",
-            json={"model": bot['ollama_model'], "prompt": full_prompt, "stream": False},
-            timeout=300  # Timeout 5 menit
-        )
-        if response.status_code == 200:
-            return response.json().get("response", "[No response]")
-        return f"[ERROR] LLM status: {response.status_code}"
+        if chat is not None:
+            return chat.ask(full_prompt, stats=stats) or "[No response]"
+        return generate(full_prompt, model=bot['ollama_model'],
+                        base_url=bot['ollama_url']) or "[No response]"
+    except LLMBusy as e:
+        return f"⏳ Server sedang sibuk (antrian penuh, posisi {e.position}). Coba lagi sebentar."
+    except LLMError as e:
+        return f"[ERROR] LLM status: {e.status_code or e}"
     except Exception as e:
         return f"[ERROR] LLM: {e}"
 
 
-def cari_memory_web(query, bot):
-    """Cari konteks dari ChromaDB."""
-    collection = bot["collection"]
-    if collection.count() == 0:
-        return ""
-    
-    results = collection.query(
-        query_texts=[query],
-        n_results=min(bot["top_k"], collection.count())
-    )
-    
-    if not results['ids'][0]:
+def tanya_llm_web_stream(prompt, context, bot, stats, on_queue=None, ctx=None, chat=None):
+    """Stream jawaban Ollama per potongan teks. Error dikembalikan sebagai potongan [ERROR].
+
+    on_queue(posisi) dipanggil jika harus menunggu giliran di antrian LLM.
+    Jawaban dari answer_cache dikirim sebagai satu potongan (stats["cached"]).
+    chat: sama seperti tanya_llm_web.
+    """
+    from answer_cache import lookup, store
+    from config import ANSWER_CACHE_ENABLED
+    from llm_client import stream_generate, LLMBusy
+    full_prompt = _full_prompt(prompt, context)
+    
+    vector = None
+    if ANSWER_CACHE_ENABLED and (chat is None or not chat.turns()):
+        vector = ctx.vector if ctx else bot["embedding_fn"]([prompt])[0]
+        cached = lookup(vector, context, bot['ollama_model'])
+        if cached is not None:
+            if chat is not None:
+                chat.record(full_prompt, cached)
+            stats["cached"] = True
+            yield cached
+            return
+    
+    if chat is not None:
+        tokens = chat.stream(full_prompt, stats=stats, on_queue=on_queue)
+    else:
+        tokens = stream_generate(full_prompt, model=bot['ollama_model'],
+                                 base_url=bot['ollama_url'], stats=stats, on_queue=on_queue)
+    parts = []
+    try:
+        for token in tokens:
+            parts.append(token)
+            yield token
+    except LLMBusy as e:
+        yield f"⏳ Server sedang sibuk (antrian penuh, posisi {e.position}). Coba lagi sebentar."
+    except Exception as e:
+        yield f"\n[ERROR] LLM: {e}"
+    else:
+        if vector is not None:
+            store(prompt, vector, context, bot['ollama_model'], "".join(parts),
+                  [p["id"] for p in ctx.passages] if ctx else None)
+
+
+def format_memory_web(passages):
+    """Teks konteks (dengan label sumber) dari passage hasil retrieve_passages."""
+    if not passages:
         return ""
     
     context = "KONTEKS DARI MEMORY:\n"
-    for doc, meta in zip(results['documents'][0], results['metadatas'][0]):
+    for passage in passages:
+        meta = passage["metadata"]
         source = meta.get('source', 'manual')
-        context += f"\n[{source}] {doc}\n"
+        if meta.get('page_start'):
+            source += f": {meta.get('filename', '?')} hal. {meta['page_start']}"
+        context += f"\n[{source}] {passage['text']}\n"
     
     return context
 
@@ -225,24 +289,29 @@ def cari_memory_web(query, bot):
 def cari_graph_web(query):
     """Cari konteks dari Neo4j."""
     try:
-        from neo4j_graph import get_graph
-        graph = get_graph()
-        if graph.connect():
-            return graph.search_graph(query)
+        from retrieval import search_graph_context
+        return search_graph_context(query)
     except:
         pass
     return ""
 
 
-def hybrid_search(query, bot):
-    """Gabungkan ChromaDB + Neo4j search."""
-    # ChromaDB
-    chroma_context = cari_memory_web(query, bot)
-    
-    # Neo4j
-    graph_context = ""
+def hybrid_search(query, bot, ctx=None):
+    """Gabungkan ChromaDB + Neo4j search (paralel, timeout per sumber)."""
+    import warmup
+    from context_packer import retrieve_passages
+    from retrieval import RequestContext, fan_out
+    warmup.wait("embedding")  # Memuat model tidak boleh memakan deadline chroma
+    ctx = ctx or RequestContext(query, bot["embedding_fn"])
+    tasks = {"chroma": lambda: retrieve_passages(bot["collection"], bot["embedding_fn"], query,
+                                                 bot["top_k"], query_vector=ctx.vector)}
     if bot["neo4j_available"]:
-        graph_context = cari_graph_web(query)
+        tasks["graph"] = lambda: cari_graph_web(query)
+    found = fan_out(tasks)
+    # Hanya passage yang tiba sebelum deadline yang dicatat di ctx (task telat tidak menulis)
+    ctx.passages = found["chroma"] or []
+    chroma_context = format_memory_web(ctx.passages)
+    graph_context = found.get("graph", "")
     
     full_context = ""
     if chroma_context:
@@ -259,10 +328,25 @@ def hybrid_search(query, bot):
     return full_context, sources
 
 
+def extract_entities_web(text):
+    """Ekstrak entitas dari teks PDF ke Neo4j."""
+    try:
+        from neo4j_graph import get_graph, extract_entities_with_llm, save_entities_to_graph
+        graph = get_graph()
+        if graph.connect():
+            extracted = extract_entities_with_llm(text[:3000])
+            return save_entities_to_graph(graph, extracted)
+    except:
+        return "Entity extraction gagal"
+    return ""
+
+
 def load_pdf_web(filepath, bot):
     """Load PDF ke ChromaDB."""
-    from pypdf import PdfReader
-    from config import CODING_OUTPUT_DIR
+    from pdf_ingest import (
+        extract_pdf_pages, sync_pdf_chunks, load_manifest, is_unchanged, head_text
+    )
+    from chunker import iter_chunk_spans
     
     path = Path(filepath)
     if not path.exists():
@@ -271,58 +355,35 @@ def load_pdf_web(filepath, bot):
     if not path.exists():
         return f"File tidak ditemukan: {filepath}"
     
+    manifest = load_manifest()
+    if is_unchanged(path, manifest):
+        return f"✅ **{path.name}** tidak berubah sejak terakhir dimuat ({manifest[path.name]['chunks']} chunks)."
+    
     try:
-        reader = PdfReader(str(path))
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() or ""
+        page_texts = extract_pdf_pages(path)
         
-        if not text.strip():
+        if not any(page.strip() for page in page_texts):
             return "PDF kosong atau tidak bisa dibaca."
         
-        # Chunk text
-        words = text.split()
-        chunks = []
-        for i in range(0, len(words), 350):
-            chunk = " ".join(words[i:i+400])
-            if chunk:
-                chunks.append(chunk)
+        # Chunk text (batas kalimat, budget token embedding)
+        chunks = list(iter_chunk_spans(page_texts))
         
-        collection = bot["collection"]
-        saved = 0
-        for i, chunk in enumerate(chunks):
-            doc_id = f"pdf_{path.name}_{i+1}"
-            existing = collection.get(ids=[doc_id])
-            if existing['ids']:
-                continue
-            collection.add(
-                documents=[chunk],
-                ids=[doc_id],
-                metadatas=[{
-                    "source": "pdf",
-                    "filename": path.name,
-                    "chunk": i + 1,
-                    "total_chunks": len(chunks),
-                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                }]
-            )
-            saved += 1
+        # Sinkron berdasarkan hash chunk: embed yang berubah saja, hapus yang basi
+        stats = sync_pdf_chunks(bot["collection"], path, chunks)
+        saved = stats["added"]
         
-        # Extract entities ke Neo4j
+        # Extract entities ke Neo4j (hanya jika ada chunk baru)
         entity_msg = ""
-        if bot["neo4j_available"]:
-            try:
-                from neo4j_graph import get_graph, extract_entities_with_llm, save_entities_to_graph
-                graph = get_graph()
-                if graph.connect():
-                    extracted = extract_entities_with_llm(text[:3000])
-                    entity_msg = save_entities_to_graph(graph, extracted)
-            except:
-                entity_msg = "Entity extraction gagal"
+        if bot["neo4j_available"] and saved:
+            entity_msg = extract_entities_web(head_text(page_texts))
         
         result = f"✅ **{path.name}** berhasil dimuat!\n"
-        result += f"- 📄 {len(reader.pages)} halaman\n"
+        result += f"- 📄 {len(page_texts)} halaman\n"
         result += f"- 📦 {len(chunks)} chunks ({saved} baru)\n"
+        if stats["deleted"]:
+            result += f"- 🧹 {stats['deleted']} chunks lama dihapus\n"
+        if saved:
+            result += f"- ⚡ {stats['chunks_per_sec']:.1f} chunks/detik\n"
         if entity_msg:
             result += f"- 🔗 {entity_msg}"
         
@@ -331,6 +392,19 @@ def load_pdf_web(filepath, bot):
         return f"❌ Error: {e}"
 
 
+def load_all_pdfs_web(bot, progress=None):
+    """Load semua PDF di folder documents/ sekaligus (pipeline)."""
+    from pdf_ingest import ingest_folder, format_ingest_summary
+    
+    summary = ingest_folder(
+        bot["collection"], Path("documents"),
+        embedding_fn=bot["embedding_fn"],
+        entity_fn=extract_entities_web if bot["neo4j_available"] else None,
+        progress=progress
+    )
+    return format_ingest_summary(summary)
+
+
 def get_graph_summary_web():
     """Get graph summary."""
     try:
@@ -372,6 +446,12 @@ bot = init_bot()
 # Session state
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "chat" not in st.session_state:
+    # Riwayat yang dikirim ke /api/chat (pesan user lengkap dengan konteks RAG)
+    from config import LLM_CHAT_MODE
+    from llm_client import ChatSession
+    st.session_state.chat = (ChatSession(model=bot["ollama_model"], base_url=bot["ollama_url"])
+                             if LLM_CHAT_MODE else None)
 
 
 # ============================
@@ -394,12 +474,15 @@ with st.sidebar:
     with col1:
         if ollama_ok:
             st.markdown("🟢 **Ollama**")
-            # Auto-warmup di background jika belum
-            if "model_warmed_up" not in st.session_state:
-                with st.spinner("🔥 Warming up..."):
-                    if warmup_ollama(bot["ollama_url"], bot["ollama_model"]):
-                        st.session_state.model_warmed_up = True
-                        st.toast(f"Model {bot['ollama_model']} siap!", icon="🔥")
+            # Auto-warmup di background (sekali per proses, halaman tidak menunggu)
+            import warmup
+            warmup.start("llm", lambda: warmup_ollama(bot["ollama_url"], bot["ollama_model"]))
+            llm_state = warmup.state("llm")
+            if llm_state == "pending":
+                st.caption("🔥 Memuat model...")
+            elif llm_state == "ready" and "model_warmed_up" not in st.session_state:
+                st.session_state.model_warmed_up = True
+                st.toast(f"Model {bot['ollama_model']} siap!", icon="🔥")
         else:
             st.markdown("🔴 **Ollama**")
     
@@ -422,6 +505,19 @@ with st.sidebar:
     pdf_count = len(list(Path("documents").glob("*.pdf")))
     m2.metric("PDF Files", pdf_count)
     
+    from vector_search import query_cache_stats
+    cache = query_cache_stats()
+    st.caption(f"⚡ Cache query: {cache['hits']} hit / {cache['misses']} miss "
+               f"({cache['hit_rate']:.0%}), {cache['size']} entri")
+    from answer_cache import answer_cache_stats
+    answers = answer_cache_stats()
+    st.caption(f"💾 Cache jawaban: {answers['hits']} hit / {answers['misses']} miss "
+               f"({answers['hit_rate']:.0%}), {answers['entries']} entri")
+    from llm_client import queue_status
+    queue = queue_status()
+    st.caption(f"🧵 Antrian LLM: {queue['active']}/{queue['max_concurrent']} berjalan, "
+               f"{queue['waiting']}/{queue['max_queue']} menunggu")
+    
     st.divider()
     
     # --- UPLOAD PDF ---
@@ -448,6 +544,18 @@ with st.sidebar:
     # List PDFs with titles
     docs_path = Path("documents")
     pdfs = list(docs_path.glob("*.pdf"))
+    
+    if pdfs and st.button("📚 Load Semua PDF", use_container_width=True,
+                          help="Muat semua PDF di folder documents/ (file yang tidak berubah dilewati)"):
+        bar = st.progress(0.0, text="Memuat PDF...")
+        
+        def update_progress(done, total, filename):
+            bar.progress(done / total, text=f"({done}/{total}) {filename}")
+        
+        result = load_all_pdfs_web(bot, progress=update_progress)
+        bar.empty()
+        st.success(result)
+    
     if pdfs:
         with st.expander(f"📚 PDF Files ({len(pdfs)})", expanded=False):
             for pdf in pdfs:
@@ -540,6 +648,8 @@ with st.sidebar:
     with col_b:
         if st.button("🗑️ Clear Chat", use_container_width=True):
             st.session_state.messages = []
+            if st.session_state.chat is not None:
+                st.session_state.chat.reset()
             st.rerun()
     
     # --- IMPORT ---
@@ -564,8 +674,9 @@ with st.sidebar:
                     import json
                     import zipfile
                     import chromadb
-                    from chromadb.utils import embedding_functions
-                    from config import CHROMA_DB_PATH, EMBEDDING_MODEL
+                    from config import CHROMA_DB_PATH
+                    from vector_search import record_replaced
+                    from sharded_collection import open_collection
                     
                     results = []
                     
@@ -583,10 +694,10 @@ with st.sidebar:
                             
                             # Reload client
                             new_client = chromadb.PersistentClient(path=str(CHROMA_DB_PATH))
-                            new_embedding = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=EMBEDDING_MODEL)
-                            new_collection = new_client.get_or_create_collection(name="agent_memory", embedding_function=new_embedding)
+                            new_collection = open_collection(new_client, bot["embedding_fn"])
                             bot["collection"] = new_collection
                             bot["chroma_client"] = new_client
+                            record_replaced()
                             
                             results.append(f"✓ ChromaDB: {new_collection.count()} docs restored")
                         except Exception as e:
@@ -664,6 +775,8 @@ with tab_chat:
             if msg.get("sources"):
                 src_text = " + ".join(msg["sources"])
                 st.caption(f"📍 Sumber: {src_text}")
+            if msg.get("timing"):
+                st.caption(f"⏱️ {msg['timing']}")
     
     # Chat input
     if prompt := st.chat_input("Ketik pertanyaan..."):
@@ -675,24 +788,53 @@ with tab_chat:
         
         # Generate response
         with st.chat_message("assistant", avatar="🤖"):
-            with st.spinner(f"⏳ Sedang berpikir... (Model: {bot['ollama_model']})"):
-                # Hybrid search
-                context, sources = hybrid_search(prompt, bot)
+            import time
+            from config import LLM_STREAM
+            from llm_client import format_stats
+            from retrieval import RequestContext
+            stats = {}
+            ctx = RequestContext(prompt, bot["embedding_fn"])
+            if LLM_STREAM:
+                with st.spinner("🔍 Mencari konteks..."):
+                    context, sources = hybrid_search(prompt, bot, ctx)
+                wait_for_llm()
                 
-                # Tanya LLM
-                answer = tanya_llm_web(prompt, context, bot)
-            
-            st.markdown(answer)
+                # Tampilkan jawaban sambil ditulis (update dibatasi ~20x per detik)
+                placeholder = st.empty()
+                answer = ""
+                last_update = 0.0
+                on_queue = lambda pos: placeholder.caption(f"⏳ Menunggu giliran LLM (antrian ke-{pos})...")
+                for token in tanya_llm_web_stream(prompt, context, bot, stats, on_queue, ctx,
+                                                  st.session_state.chat):
+                    answer += token
+                    if time.monotonic() - last_update > 0.05:
+                        placeholder.markdown(answer + "▌")
+                        last_update = time.monotonic()
+                answer = answer or "[No response]"
+                placeholder.markdown(answer)
+            else:
+                with st.spinner(f"⏳ Sedang berpikir... (Model: {bot['ollama_model']})"):
+                    # Hybrid search
+                    context, sources = hybrid_search(prompt, bot, ctx)
+                    
+                    # Tanya LLM (atau jawaban dari cache)
+                    wait_for_llm()
+                    answer = tanya_llm_web(prompt, context, bot, ctx, st.session_state.chat, stats)
+                
+                st.markdown(answer)
             
             if sources:
                 src_text = " + ".join(sources)
                 st.caption(f"📍 Sumber: {src_text}")
+            if stats:
+                st.caption(f"⏱️ {format_stats(stats)}")
         
         # Save to history
         st.session_state.messages.append({
             "role": "assistant",
             "content": answer,
-            "sources": sources
+            "sources": sources,
+            "timing": format_stats(stats)
         })
 
 # ============================